@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark Embedding Backends on CPU
+
+Single-query latency (the live call path) and batched throughput
+(ingestion) for each EMBED_BACKEND option.
+
+Usage:
+    python3 bench_embedding_backend.py [backend ...]   (default: torch torch-int8 onnx)
+"""
+
+import statistics
+import sys
+import time
+
+import torch
+
+from embedding_backend import load_embedder
+
+EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+QUERY = "What services do you provide for managed IT?"
+CHUNK = " ".join(["Technology Mindz provides Salesforce, AI, Managed IT and Cybersecurity services."] * 20)
+QUERY_RUNS = 200
+BATCH = 64
+BATCH_RUNS = 5
+
+
+def main():
+    backends = sys.argv[1:] or ["torch", "torch-int8", "onnx"]
+    print(f"torch threads={torch.get_num_threads()}\n")
+    print(f"{'backend':<12} {'query p50':>10} {'query p95':>10} {'chunks/s':>10}")
+
+    for backend in backends:
+        model, device, _ = load_embedder(EMBED_MODEL, "cpu", backend)
+
+        def encode(texts, batch_size):
+            with torch.no_grad():
+                return model.encode(texts, device=device, convert_to_numpy=True, normalize_embeddings=True,
+                                    show_progress_bar=False, batch_size=batch_size)
+
+        encode([QUERY], 1)
+        latencies = []
+        for _ in range(QUERY_RUNS):
+            start = time.perf_counter()
+            encode([QUERY], 1)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+
+        start = time.perf_counter()
+        for _ in range(BATCH_RUNS):
+            encode([CHUNK] * BATCH, BATCH)
+        throughput = BATCH * BATCH_RUNS / (time.perf_counter() - start)
+
+        print(f"{backend:<12} {statistics.median(latencies):>8.2f}ms "
+              f"{latencies[int(len(latencies) * 0.95) - 1]:>8.2f}ms {throughput:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark Embedding Micro-Batching
+
+Simulates many concurrent calls each embedding one question, and compares
+per-request batch-size-1 encodes on a thread pool (the previous behaviour)
+against the coalescing EmbeddingService. Runs on CPU.
+
+Usage:
+    python3 bench_embeddings.py [concurrency] [rounds]
+"""
+
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+from sentence_transformers import SentenceTransformer
+
+from embeddings import EmbeddingService
+from utils import EMBED_MODEL, EMBED_BATCH_WINDOW_MS, EMBED_MAX_BATCH
+
+QUESTIONS = [
+    "What services do you provide?",
+    "How much does managed IT cost per month?",
+    "Do you work with Salesforce?",
+    "Can I talk to someone in sales?",
+    "What are your business hours?",
+    "Do you offer cybersecurity audits?",
+    "How long does a CRM implementation take?",
+    "Where is your office located?",
+    "Do you build AI chatbots?",
+    "What industries do you work with?",
+]
+
+
+def encode_single(model, question):
+    with torch.no_grad():
+        return model.encode(
+            [question],
+            device="cpu",
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            batch_size=1
+        )[0]
+
+
+def run(label, fn, concurrency, rounds):
+    latencies = []
+
+    def one(i):
+        start = time.perf_counter()
+        fn(QUESTIONS[i % len(QUESTIONS)])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            list(pool.map(one, range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    total = concurrency * rounds
+    latencies.sort()
+    print(f"{label:<28} {total / elapsed:8.1f} q/s   "
+          f"p50 {statistics.median(latencies):7.1f}ms   "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1]:7.1f}ms")
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    model = SentenceTransformer(EMBED_MODEL, device="cpu")
+    model.eval()
+    encode_single(model, "warmup")
+
+    service = EmbeddingService(model, device="cpu")
+    service.encode(["warmup"])
+
+    print(f"{concurrency} concurrent queries x {rounds} rounds, "
+          f"window={EMBED_BATCH_WINDOW_MS}ms max_batch={EMBED_MAX_BATCH}\n")
+    run("batch-size-1 per request", lambda q: encode_single(model, q), concurrency, rounds)
+    run("EmbeddingService", lambda q: service.encode([q]), concurrency, rounds)
+    service.stop()
+
+
+if __name__ == "__main__":
+    main()
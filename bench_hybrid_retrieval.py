@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark Hybrid Retrieval
+
+Compares vector-only, BM25-only and hybrid (reciprocal rank fusion)
+retrieval on a collection from our ChromaDB. Queries are generated from the
+KB itself: a short verbatim span of a chunk (what a caller repeats from a
+brochure) and, when the chunk has one, an identifier such as a SKU or phone
+number. A query counts as recalled if its source chunk is in the top k.
+
+Usage:
+    python3 bench_hybrid_retrieval.py [collection] [chroma_path] [queries]
+"""
+
+import random
+import statistics
+import sys
+import time
+
+import chromadb
+import numpy as np
+
+from embedding_backend import load_embedder
+from lexical_index import BM25Index, is_identifier, reciprocal_rank_fusion, tokenize
+from vector_index import ExactIndex
+
+EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+K = 3
+SPAN_WORDS = 6
+
+
+def make_queries(documents, n, rng):
+    queries = []
+    for pos in rng.sample(range(len(documents)), min(n, len(documents))):
+        words = documents[pos].split()
+        if len(words) > SPAN_WORDS:
+            start = rng.randrange(len(words) - SPAN_WORDS)
+            queries.append(("span", " ".join(words[start:start + SPAN_WORDS]), pos))
+        identifiers = [t for t in tokenize(documents[pos]) if is_identifier(t)]
+        if identifiers:
+            queries.append(("identifier", f"what about {rng.choice(identifiers)}", pos))
+    return queries
+
+
+def main():
+    name = sys.argv[1] if len(sys.argv) > 1 else "docs"
+    path = sys.argv[2] if len(sys.argv) > 2 else "./chroma_db"
+    n = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    rng = random.Random(3)
+
+    collection = chromadb.PersistentClient(path=path).get_collection(name)
+    data = collection.get(include=["embeddings", "documents"])
+    documents = data["documents"]
+    labels = [str(i) for i in range(len(documents))]  # Chunk text may repeat; compare by position
+    exact = ExactIndex(labels, labels, np.asarray(data["embeddings"], dtype=np.float32))
+    bm25 = BM25Index()
+    bm25.add(labels, documents)
+
+    model, device, _ = load_embedder(EMBED_MODEL, "cpu")
+    queries = make_queries(documents, n, rng)
+    embeddings = model.encode([q for _, q, _ in queries], device=device, convert_to_numpy=True,
+                              normalize_embeddings=True, show_progress_bar=False)
+
+    methods = {
+        "vector": lambda q, e: exact.search(e, K),
+        "bm25": lambda q, e: bm25.search(q, K)[0],
+        "hybrid": lambda q, e: reciprocal_rank_fusion(exact.search(e, K * 2), bm25.search(q, K * 2)[0])[:K],
+    }
+
+    print(f"{name}: {len(documents)} chunks, {len(queries)} queries, recall@{K}\n")
+    print(f"{'method':<8} {'span':>7} {'ident':>7} {'all':>7} {'p50 ms':>8}")
+    for method, search in methods.items():
+        found = {"span": [], "identifier": []}
+        latencies = []
+        for (kind, query, pos), embedding in zip(queries, embeddings):
+            start = time.perf_counter()
+            ranked = [label for label, _ in search(query, embedding)]
+            latencies.append((time.perf_counter() - start) * 1000)
+            found[kind].append(str(pos) in ranked)
+
+        def rate(values):
+            return f"{statistics.mean(values):.3f}" if values else "-"
+        print(f"{method:<8} {rate(found['span']):>7} {rate(found['identifier']):>7} "
+              f"{rate(found['span'] + found['identifier']):>7} {statistics.median(latencies):>8.3f}")
+
+    print("\n(latencies exclude the query embedding, which only vector/hybrid need)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Report int8 Quantization Savings
+
+For every collection in a Chroma database, compares the float32 ExactIndex
+with the int8 QuantizedIndex: resident memory, and recall@k of the
+quantized index with and without full-precision rescoring. Queries are
+stored chunk embeddings with a little noise added (so each query is a
+realistic paraphrase of something in the KB).
+
+Usage:
+    python3 bench_quantization.py [chroma_path] [k] [queries_per_collection]
+"""
+
+import statistics
+import sys
+
+import chromadb
+import numpy as np
+
+from vector_index import ExactIndex, QuantizedIndex
+
+RESCORE_FACTOR = 4
+NOISE = 0.05
+
+
+def recall_at_k(exact, candidate, queries, k):
+    scores = []
+    for q in queries:
+        truth = {doc for doc, _ in exact.search(q, k)}
+        found = {doc for doc, _ in candidate(q)}
+        scores.append(len(truth & found) / len(truth))
+    return statistics.mean(scores)
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "./chroma_db"
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    n_queries = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    rng = np.random.default_rng(11)
+    client = chromadb.PersistentClient(path=path)
+
+    print(f"{path}  k={k}  rescore_factor={RESCORE_FACTOR}\n")
+    print(f"{'collection':<34} {'chunks':>7} {'float32':>10} {'int8':>10} {'saved':>6} "
+          f"{'recall':>7} {'+rescore':>9}")
+
+    total_f32 = total_i8 = 0
+    for entry in client.list_collections():
+        name = entry if isinstance(entry, str) else entry.name
+        exact = ExactIndex.from_collection(client.get_collection(name))
+        if len(exact) <= k:
+            continue
+        ids = [f"{i}" for i in range(len(exact))]
+        exact = ExactIndex(ids, ids, exact.matrix)  # Chunk text may repeat; compare by position
+        quantized = QuantizedIndex.from_exact(exact, RESCORE_FACTOR,
+                                              fetch_full=lambda wanted: exact.matrix[[int(i) for i in wanted]])
+
+        sample = exact.matrix[rng.choice(len(exact), min(n_queries, len(exact)), replace=False)]
+        queries = sample + NOISE * rng.normal(size=sample.shape).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        plain = recall_at_k(exact, lambda q: quantized.search(q, k, rescore=False), queries, k)
+        rescored = recall_at_k(exact, lambda q: quantized.search(q, k), queries, k)
+
+        total_f32 += exact.nbytes
+        total_i8 += quantized.nbytes
+        print(f"{name[:34]:<34} {len(exact):>7} {exact.nbytes / 1024:>8.0f}KB {quantized.nbytes / 1024:>8.0f}KB "
+              f"{1 - quantized.nbytes / exact.nbytes:>6.0%} {plain:>7.3f} {rescored:>9.3f}")
+
+    if total_f32:
+        print(f"\n{'total':<34} {'':>7} {total_f32 / 1024:>8.0f}KB {total_i8 / 1024:>8.0f}KB "
+              f"{1 - total_i8 / total_f32:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
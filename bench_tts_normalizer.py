@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark TTS Text Normalization
+
+Compares the single-pass tts_normalizer against the previous multi-regex
+clean_markdown_for_tts on a corpus of LLM phone-call responses.
+
+Usage:
+    python3 bench_tts_normalizer.py [server.log]
+
+If a server log is given, sentences logged as "🎯 Sentence N: '...'" are
+added to the corpus.
+"""
+
+import re
+import sys
+import time
+
+from tts_normalizer import get_normalizer
+
+# Responses captured from agent calls (Technology Mindz demo agent + SDR agents)
+CORPUS = [
+    "Yeah, got it.",
+    "Makes sense.",
+    "Technology Mindz provides Salesforce, AI, Managed IT, Cybersecurity, and Microsoft Dynamics 365 services.",
+    "**Great question!** We offer *Staff Augmentation* and CRM Consulting for mid-size teams.",
+    "Our managed IT plans start at $1,250 per month, and most clients see a 30% reduction in downtime.",
+    "Sure, I can book that for you on 2024-11-05 at 3:30 PM Eastern.",
+    "You can reach our sales team at (555) 123-4567 or visit https://www.technologymindz.com/contact.",
+    "Um, well, we've helped over 1,200 companies since 2015.",
+    "1. Salesforce implementation\n2. AI chatbots\n3. Cybersecurity audits",
+    "- Web Development\n- Mobile App Development\n- CRM Consulting",
+    "## Pricing\nThe starter package is $499 and the enterprise tier is about $2.5M over three years.",
+    "I'm not sure about that, but let me connect you with someone who can help.",
+    "Oh interesting, so you're on Dynamics 365 today? We migrated 3 clients like that last quarter.",
+    "Just to confirm, that's Tuesday, 03/12/2025 at 10:00 AM, right?",
+    "Perfect, I'll send the details to john.doe@example.com right away.",
+    "Your ticket number is 48213377, and someone will call you within 24 hours.",
+    "Take your time.",
+    "Absolutely, our AI team builds custom `LLM` assistants and [voice agents](https://example.com/voice).",
+    "Right, so the 2nd option includes 24/7 monitoring and a 99.9% uptime SLA.",
+    "Thanks for your time. Have a great day. [TOOL:end_call]",
+]
+
+_LOG_SENTENCE = re.compile(r"🎯 (?:Sentence \d+|Final): '(.*)'$")
+
+
+def legacy_clean_markdown_for_tts(text: str) -> str:
+    """Previous utils.clean_markdown_for_tts (kept verbatim as the baseline)"""
+    text = re.sub(r'\*\*(.+?)\*\*', r'\1', text)
+    text = re.sub(r'__(.+?)__', r'\1', text)
+    text = re.sub(r'\*(.+?)\*', r'\1', text)
+    text = re.sub(r'_(.+?)_', r'\1', text)
+    text = re.sub(r'~~(.+?)~~', r'\1', text)
+    text = re.sub(r'```[\s\S]*?```', '', text)
+    text = re.sub(r'`(.+?)`', r'\1', text)
+    text = re.sub(r'\[(.+?)\]\(.+?\)', r'\1', text)
+    text = re.sub(r'^#{1,6}\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^[\-\*]\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\d+\.\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+
+def load_log_corpus(path: str) -> list:
+    sentences = []
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            m = _LOG_SENTENCE.search(line.rstrip())
+            if m:
+                sentences.append(m.group(1))
+    return sentences
+
+
+def bench(fn, corpus, rounds: int) -> float:
+    """Return mean microseconds per sentence"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for sentence in corpus:
+            fn(sentence)
+    elapsed = time.perf_counter() - start
+    return elapsed / (rounds * len(corpus)) * 1e6
+
+
+def main():
+    corpus = list(CORPUS)
+    if len(sys.argv) > 1:
+        corpus.extend(load_log_corpus(sys.argv[1]))
+
+    normalizer = get_normalizer("aura-2-thalia-en")
+    rounds = max(1, 20000 // len(corpus))
+
+    print("=" * 70)
+    print("🧪 TTS NORMALIZER BENCHMARK")
+    print("=" * 70)
+    print(f"📊 Corpus: {len(corpus)} sentences, {rounds} rounds")
+
+    # Warm up caches and compiled patterns
+    bench(legacy_clean_markdown_for_tts, corpus, 1)
+    bench(normalizer.normalize, corpus, 1)
+
+    legacy_us = bench(legacy_clean_markdown_for_tts, corpus, rounds)
+    single_us = bench(normalizer.normalize, corpus, rounds)
+
+    print(f"\n⏱️ legacy clean_markdown_for_tts: {legacy_us:8.2f} µs/sentence")
+    print(f"⏱️ single-pass normalizer:       {single_us:8.2f} µs/sentence")
+    print(f"   speedup: {legacy_us / single_us:.2f}x")
+
+    # Plain sentences (no markdown or numerics) are the common case on calls
+    plain = [s for s in corpus if legacy_clean_markdown_for_tts(s) == normalizer.normalize(s)]
+    rich = [s for s in corpus if s not in plain]
+    for label, subset in (("plain", plain), ("markdown/numeric", rich)):
+        if subset:
+            rounds_subset = max(1, 20000 // len(subset))
+            old_us = bench(legacy_clean_markdown_for_tts, subset, rounds_subset)
+            new_us = bench(normalizer.normalize, subset, rounds_subset)
+            print(f"   {label:17} ({len(subset):3d}): legacy {old_us:7.2f} µs  new {new_us:7.2f} µs")
+
+    print("\n🔍 Output comparison (first 10 that differ):")
+    print("-" * 70)
+    shown = 0
+    for sentence in corpus:
+        old, new = legacy_clean_markdown_for_tts(sentence), normalizer.normalize(sentence)
+        if old != new and shown < 10:
+            print(f"   legacy: {old}")
+            print(f"   new:    {new}\n")
+            shown += 1
+
+    print("=" * 70)
+    print("✅ BENCHMARK COMPLETE")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
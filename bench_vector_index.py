@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark Vector Index Selection
+
+Compares the in-process ExactIndex against Chroma HNSW (at several
+search_ef settings) on synthetic clustered embeddings at different KB
+sizes, reporting p50/p95 query latency and recall@k against exact search.
+Use the crossover to pick RAG_EXACT_INDEX_MAX_CHUNKS and CHROMA_HNSW_*.
+
+Usage:
+    python3 bench_vector_index.py [dim] [queries]
+"""
+
+import statistics
+import sys
+import time
+
+import chromadb
+import numpy as np
+
+from vector_index import ExactIndex
+
+SIZES = [200, 1000, 5000, 20000]
+SEARCH_EFS = [10, 64, 128]
+TOP_K = 6  # retrieval asks for top_k * 2 with TOP_K=3
+CHROMA_MAX_ADD = 5000
+
+
+def clustered_embeddings(n, dim, rng, clusters=50):
+    """Normalized vectors around a few topic centroids, like chunked documents"""
+    centroids = rng.normal(size=(clusters, dim))
+    points = centroids[rng.integers(0, clusters, n)] + 0.6 * rng.normal(size=(n, dim))
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+    return points.astype(np.float32)
+
+
+def timed(fn, queries):
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(fn(q))
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return results, statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def recall(truth, found):
+    return statistics.mean(len(set(t) & set(f)) / len(t) for t, f in zip(truth, found))
+
+
+def main():
+    dim = int(sys.argv[1]) if len(sys.argv) > 1 else 384
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = np.random.default_rng(7)
+    client = chromadb.EphemeralClient()
+
+    print(f"dim={dim} queries={n_queries} k={TOP_K}\n")
+    print(f"{'chunks':>7} {'index':<16} {'p50 ms':>8} {'p95 ms':>8} {'recall':>7}")
+
+    for size in SIZES:
+        vectors = clustered_embeddings(size, dim, rng)
+        ids = [f"c{i}" for i in range(size)]
+        queries = clustered_embeddings(n_queries, dim, rng)
+
+        exact = ExactIndex(ids, ids, vectors)
+        truth, p50, p95 = timed(lambda q: [d for d, _ in exact.search(q, TOP_K)], queries)
+        print(f"{size:>7} {'exact':<16} {p50:>8.3f} {p95:>8.3f} {1.0:>7.3f}")
+
+        for ef in SEARCH_EFS:
+            name = f"bench_{size}_{ef}"
+            collection = client.create_collection(name, metadata={
+                "hnsw:space": "l2", "hnsw:M": 16, "hnsw:construction_ef": 200, "hnsw:search_ef": ef
+            })
+            for i in range(0, size, CHROMA_MAX_ADD):
+                collection.add(ids=ids[i:i + CHROMA_MAX_ADD], embeddings=vectors[i:i + CHROMA_MAX_ADD].tolist())
+
+            def query(q):
+                return collection.query(query_embeddings=[q.tolist()], n_results=TOP_K)["ids"][0]
+
+            found, p50, p95 = timed(query, queries)
+            print(f"{size:>7} {f'hnsw ef={ef}':<16} {p50:>8.3f} {p95:>8.3f} {recall(truth, found):>7.3f}")
+            client.delete_collection(name)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Chunking Module
+
+The one chunker used by every ingestion path (add-knowledge API, ingestion
+jobs, load_knowledge_base.py). Text is split into paragraphs (blank lines)
+and sentences, and sentences are packed into chunks under a token budget
+that matches the embedding model's max sequence length, so nothing is
+silently truncated by the model and no chunk cuts a word or sentence in
+half (only sentences, then single words, longer than the whole budget are
+split). A chunk closes early at a paragraph end once it is half full, and
+the last sentences of a chunk (up to overlap_tokens) are repeated at the
+start of the next.
+
+Chunker.stream() takes text in pieces (e.g. lines of a file) and yields
+chunks as it goes, holding at most one paragraph plus one chunk in memory.
+"""
+
+import copy
+import re
+import threading
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+_SENTENCE_END = re.compile(r"(?:(?<=[.!?])|(?<=[.!?][\"')\]]))\s+(?=[\"'(\[]?[A-Z0-9])")
+_ABBREVIATION = re.compile(r"\b(?:Mr|Mrs|Ms|Dr|Prof|St|Jr|Sr|Inc|Ltd|Co|No|vs|etc|e\.g|i\.e|approx)\.$", re.IGNORECASE)
+_ROUGH_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+# A paragraph with no blank line for this long is split early (keeps memory bounded)
+_MAX_PARAGRAPH_CHARS = 64 * 1024
+
+
+def estimate_tokens(text: str) -> int:
+    """Word-piece count estimate when no tokenizer is available (~1.3 pieces per word)"""
+    return int(len(_ROUGH_TOKEN.findall(text)) * 1.3) + 1
+
+
+def token_counter(embedder) -> Callable[[str], int]:
+    """Exact token counts from the embedder's tokenizer, falling back to estimate_tokens"""
+    tokenizer = getattr(embedder, "tokenizer", None)
+    if tokenizer is None:
+        return estimate_tokens
+    # Own copy: the model reconfigures truncation on its tokenizer while encoding
+    tokenizer = copy.deepcopy(tokenizer)
+    lock = threading.Lock()
+
+    def count(text: str) -> int:
+        with lock:
+            return len(tokenizer.encode(text, add_special_tokens=False, verbose=False))
+    return count
+
+
+def model_token_budget(embedder, default: int = 256) -> int:
+    """Max sequence length of the embedder minus the [CLS]/[SEP] tokens"""
+    return (getattr(embedder, "max_seq_length", None) or default) - 2
+
+
+def split_sentences(paragraph: str) -> List[str]:
+    sentences: List[str] = []
+    for part in _SENTENCE_END.split(paragraph):
+        part = part.strip()
+        if not part:
+            continue
+        if sentences and _ABBREVIATION.search(sentences[-1]):
+            sentences[-1] += " " + part
+        else:
+            sentences.append(part)
+    return sentences
+
+
+class Chunker:
+    """Sentence-aware packing of text into chunks of at most max_tokens"""
+
+    def __init__(self, max_tokens: int = 254, overlap_tokens: int = 32,
+                 count_tokens: Optional[Callable[[str], int]] = None):
+        self.max_tokens = max(8, max_tokens)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+        self.count_tokens = count_tokens or estimate_tokens
+
+    def split(self, text: str) -> List[str]:
+        return list(self.stream([text]))
+
+    def stream(self, pieces: Iterable[str]) -> Iterator[str]:
+        """Chunks of the concatenation of `pieces`, yielded as soon as they are complete"""
+        packer = _Packer(self)
+        paragraph: List[str] = []
+        paragraph_chars = 0
+        partial = ""
+        for piece in pieces:
+            lines = (partial + piece).split("\n")
+            partial = lines.pop()
+            for line in lines:
+                if line.strip():
+                    paragraph.append(line.strip())
+                    paragraph_chars += len(line)
+                    if paragraph_chars > _MAX_PARAGRAPH_CHARS:
+                        sentences = split_sentences(" ".join(paragraph))
+                        # Keep the last (possibly unfinished) sentence, unless it is all there is:
+                        # text with no sentence ends is word-windowed by the packer instead
+                        paragraph = [sentences.pop()] if len(sentences) > 1 else []
+                        paragraph_chars = len(paragraph[0]) if paragraph else 0
+                        yield from packer.add(sentences, paragraph_end=False)
+                elif paragraph:
+                    yield from packer.add(split_sentences(" ".join(paragraph)), paragraph_end=True)
+                    paragraph, paragraph_chars = [], 0
+        if partial.strip():
+            paragraph.append(partial.strip())
+        if paragraph:
+            yield from packer.add(split_sentences(" ".join(paragraph)), paragraph_end=True)
+        yield from packer.flush()
+
+
+class _Packer:
+    """Accumulates (sentence, tokens, starts_paragraph) up to the budget"""
+
+    def __init__(self, chunker: Chunker):
+        self.chunker = chunker
+        self.sentences: List[Tuple[str, int, bool]] = []
+        self.tokens = 0
+        self.fresh = 0  # Sentences not carried over as overlap
+        self.new_paragraph = True
+
+    def add(self, sentences: List[str], paragraph_end: bool) -> Iterator[str]:
+        budget = self.chunker.max_tokens
+        for sentence in sentences:
+            for part, tokens in self._fit(sentence):
+                if self.tokens + tokens > budget:
+                    if self.fresh:
+                        yield self._emit()
+                    if self.tokens + tokens > budget:
+                        # The carried-over overlap does not fit alongside this sentence
+                        self.sentences, self.tokens = [], 0
+                self.sentences.append((part, tokens, self.new_paragraph))
+                self.tokens += tokens
+                self.fresh += 1
+                self.new_paragraph = False
+        if paragraph_end:
+            self.new_paragraph = True
+            if self.fresh and self.tokens >= budget // 2:
+                yield self._emit()
+
+    def flush(self) -> Iterator[str]:
+        if self.fresh:
+            yield self._emit(keep_overlap=False)
+
+    def _fit(self, sentence: str) -> Iterator[Tuple[str, int]]:
+        """
+        The sentence, or word windows of it if it alone exceeds the budget; a
+        single over-budget word (URL, base64, PDF table cell) is cut by characters
+        """
+        budget = self.chunker.max_tokens
+        tokens = self.chunker.count_tokens(sentence)
+        if tokens <= budget:
+            yield sentence, tokens
+            return
+        words = sentence.split()
+        if len(words) == 1:
+            yield from self._fit_chars(words[0], tokens)
+            return
+        per_window = max(1, int(len(words) * budget / tokens * 0.9))
+        for start in range(0, len(words), per_window):
+            yield from self._fit(" ".join(words[start:start + per_window]))
+
+    def _fit_chars(self, word: str, tokens: int) -> Iterator[Tuple[str, int]]:
+        budget = self.chunker.max_tokens
+        size = max(1, int(len(word) * budget / tokens * 0.9))
+        start = 0
+        while start < len(word):
+            piece = word[start:start + size]
+            piece_tokens = self.chunker.count_tokens(piece)
+            while piece_tokens > budget and len(piece) > 1:
+                piece = piece[:max(1, len(piece) * budget // piece_tokens)]
+                piece_tokens = self.chunker.count_tokens(piece)
+            yield piece, piece_tokens
+            start += len(piece)
+
+    def _emit(self, keep_overlap: bool = True) -> str:
+        text = ""
+        for sentence, _, starts_paragraph in self.sentences:
+            text += ("\n" if starts_paragraph else " ") + sentence if text else sentence
+
+        carried: List[Tuple[str, int, bool]] = []
+        carried_tokens = 0
+        if keep_overlap:
+            for entry in reversed(self.sentences[1:]):
+                if carried_tokens + entry[1] > self.chunker.overlap_tokens:
+                    break
+                carried.insert(0, entry)
+                carried_tokens += entry[1]
+        self.sentences = carried
+        self.tokens = carried_tokens
+        self.fresh = 0
+        return text
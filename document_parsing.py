@@ -0,0 +1,227 @@
+"""
+Document Parsing Module
+
+Text extraction for knowledge-base uploads: PDF, HTML, DOCX, Markdown, CSV
+and plain text. Every parser is a generator of text pieces (pages,
+paragraphs, rows) with blank lines between paragraphs, so the output feeds
+straight into Chunker.stream() without holding a whole document.
+
+The server runs extract_to_file() in a process pool (ingestion.py), so
+CPU-heavy extraction such as PDF layout analysis never runs on the event
+loop or competes for the GIL with live calls. This module only imports the
+standard library at load time; PDF and DOCX need pypdf and python-docx.
+"""
+
+import csv
+import os
+import re
+import time
+from html.parser import HTMLParser
+from typing import Dict, Iterator, Optional
+
+FORMATS = {
+    ".txt": "text",
+    ".text": "text",
+    ".md": "markdown",
+    ".markdown": "markdown",
+    ".html": "html",
+    ".htm": "html",
+    ".csv": "csv",
+    ".pdf": "pdf",
+    ".docx": "docx",
+}
+
+_CONTENT_TYPES = {
+    "text/plain": "text",
+    "text/markdown": "markdown",
+    "text/html": "html",
+    "text/csv": "csv",
+    "application/pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+}
+
+_READ_BLOCK = 64 * 1024
+
+
+class UnsupportedFormat(ValueError):
+    pass
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str] = None) -> str:
+    """Parser name for an upload, by extension and then by content type"""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext in FORMATS:
+        return FORMATS[ext]
+    fmt = _CONTENT_TYPES.get((content_type or "").split(";")[0].strip().lower())
+    if fmt:
+        return fmt
+    raise UnsupportedFormat(f"Unsupported document type '{ext or content_type}' "
+                            f"(supported: {', '.join(sorted(FORMATS))})")
+
+
+# ================================
+# PARSERS
+# ================================
+
+def _parse_text(path: str) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        yield from f
+
+
+_MD_FENCE = re.compile(r"^\s*(```|~~~)")
+_MD_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+")
+_MD_PREFIX = re.compile(r"^\s*(?:>\s*)+|^\s*(?:[-*+]|\d+[.)])\s+")
+_MD_IMAGE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_MD_LINK = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_MD_EMPHASIS = re.compile(r"(\*\*|\*|`)(?=\S)(.+?)(?<=\S)\1")
+_MD_UNDERSCORE = re.compile(r"(?<!\w)(__|_)(?=\S)(.+?)(?<=\S)\1(?!\w)")  # Leaves snake_case alone
+_MD_RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_HTML_TAG = re.compile(r"<[^>]+>")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _parse_markdown(path: str) -> Iterator[str]:
+    """Markdown as plain prose: syntax removed, headings and list items as their own lines"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if _MD_FENCE.match(line) or _MD_RULE.match(line):
+                yield "\n"
+                continue
+            heading = _MD_HEADING.match(line)
+            line = _MD_PREFIX.sub("", _MD_HEADING.sub("", line))
+            line = _MD_IMAGE.sub(r"\1", line)
+            line = _MD_LINK.sub(r"\1", line)
+            line = _MD_UNDERSCORE.sub(r"\2", _MD_EMPHASIS.sub(r"\2", line))
+            line = _HTML_TAG.sub("", line)
+            # A heading is a paragraph of its own
+            yield f"\n{line.strip()}\n\n" if heading else line
+
+
+class _HTMLText(HTMLParser):
+    _SKIP = {"script", "style", "noscript", "template", "svg", "head"}
+    _BLOCK = {"p", "div", "section", "article", "li", "ul", "ol", "table", "tr", "br", "hr",
+              "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "header", "footer",
+              "main", "nav", "aside", "dd", "dt", "figcaption"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skipping += 1
+        elif tag in self._BLOCK:
+            self.parts.append("\n\n")
+        elif tag in ("td", "th"):
+            self.parts.append(" | ")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in self._BLOCK:
+            self.parts.append("\n\n")
+
+    def handle_data(self, data):
+        if not self._skipping:
+            # Collapse whitespace but keep it at the edges: "Our <b>Premium</b> plan" needs both spaces
+            self.parts.append(_WHITESPACE.sub(" ", data))
+
+    def take(self) -> str:
+        text = "".join(self.parts)
+        self.parts = []
+        return text
+
+
+def _parse_html(path: str) -> Iterator[str]:
+    parser = _HTMLText()
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        while True:
+            block = f.read(_READ_BLOCK)
+            if not block:
+                break
+            parser.feed(block)
+            yield parser.take()
+    parser.close()
+    yield parser.take()
+
+
+def _parse_csv(path: str) -> Iterator[str]:
+    """
+    One paragraph per row, "column: value. column: value.", so each row reads
+    as a fact. The first row is taken as the header.
+    """
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        sample = f.read(_READ_BLOCK)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+        header = [h.strip() for h in next(reader, [])]
+        for row in reader:
+            fields = [f"{h}: {c.strip()}" if h else c.strip() for h, c in zip(header, row) if c.strip()]
+            if fields:
+                yield ". ".join(field.rstrip(".") for field in fields) + ".\n\n"
+
+
+def _parse_pdf(path: str) -> Iterator[str]:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise RuntimeError("PDF support needs pypdf (pip install pypdf)")
+    for page in PdfReader(path).pages:
+        text = page.extract_text() or ""
+        # Re-join words hyphenated across line breaks
+        yield re.sub(r"(\w)-\n(\w)", r"\1\2", text) + "\n\n"
+
+
+def _parse_docx(path: str) -> Iterator[str]:
+    try:
+        import docx
+    except ImportError:
+        raise RuntimeError("DOCX support needs python-docx (pip install python-docx)")
+    document = docx.Document(path)
+    for paragraph in document.paragraphs:
+        if paragraph.text.strip():
+            yield paragraph.text.strip() + "\n\n"
+    for table in document.tables:
+        for row in table.rows:
+            cells = [cell.text.strip() for cell in row.cells if cell.text.strip()]
+            if cells:
+                yield " | ".join(cells) + "\n\n"
+
+
+PARSERS = {
+    "text": _parse_text,
+    "markdown": _parse_markdown,
+    "html": _parse_html,
+    "csv": _parse_csv,
+    "pdf": _parse_pdf,
+    "docx": _parse_docx,
+}
+
+
+def iter_text(path: str, fmt: str) -> Iterator[str]:
+    """Extracted text of a document, in pieces"""
+    return PARSERS[fmt](path)
+
+
+def extract_to_file(path: str, fmt: str, out_path: str) -> Dict:
+    """
+    Write the extracted text of `path` to `out_path` (UTF-8). Runs in a
+    worker process; returns parse statistics.
+    """
+    start = time.perf_counter()
+    chars = 0
+    with open(out_path, "w", encoding="utf-8") as out:
+        for piece in iter_text(path, fmt):
+            out.write(piece)
+            chars += len(piece)
+    return {
+        "format": fmt,
+        "bytes": os.path.getsize(path),
+        "chars": chars,
+        "parse_ms": (time.perf_counter() - start) * 1000,
+    }
@@ -0,0 +1,79 @@
+"""
+Embedding Backend Module
+
+Builds the SentenceTransformer embedder for the configured inference
+backend (EMBED_BACKEND), shared by the server (utils.embedder) and
+load_knowledge_base.py so queries and stored chunks always come from the
+same model variant:
+
+- "torch"       fp32 PyTorch (fp16 on CUDA) - the default
+- "torch-int8"  PyTorch dynamic int8 quantization of the Linear layers (CPU)
+- "onnx"        ONNX Runtime; EMBED_ONNX_FILE picks the exported file, e.g.
+                "onnx/model_qint8_avx2.onnx" for the int8-quantized export
+                (needs sentence-transformers>=3.2 with optimum[onnxruntime])
+
+Unavailable backends fall back to "torch" with a warning; load_embedder
+returns the backend actually loaded, so model_key() names the vectors the
+model really produces.
+"""
+
+import logging
+import os
+from typing import Optional, Tuple
+
+import torch
+from sentence_transformers import SentenceTransformer
+
+BACKENDS = ("torch", "torch-int8", "onnx")
+
+_logger = logging.getLogger("new")
+
+
+def model_key(model_name: str, backend: Optional[str] = None, onnx_file: Optional[str] = None) -> str:
+    """Identifies the vectors a model variant produces (stored embeddings are only reused under the same key)"""
+    backend = (backend or os.getenv("EMBED_BACKEND", "torch")).lower()
+    onnx_file = onnx_file if onnx_file is not None else os.getenv("EMBED_ONNX_FILE", "")
+    if backend == "onnx" and onnx_file:
+        return f"{model_name}:onnx:{onnx_file}"
+    return f"{model_name}:{backend}"
+
+
+def load_embedder(model_name: str, device: str, backend: Optional[str] = None,
+                  onnx_file: Optional[str] = None) -> Tuple[SentenceTransformer, str, str]:
+    """
+    (SentenceTransformer in eval mode, device to pass to encode(), backend
+    actually loaded) for `backend` (defaults to $EMBED_BACKEND). Quantized
+    backends run on CPU.
+    """
+    backend = (backend or os.getenv("EMBED_BACKEND", "torch")).lower()
+    onnx_file = onnx_file if onnx_file is not None else os.getenv("EMBED_ONNX_FILE", "")
+    if backend not in BACKENDS:
+        _logger.warning(f"⚠️ Unknown EMBED_BACKEND '{backend}', using torch")
+        backend = "torch"
+
+    if backend == "onnx":
+        try:
+            model_kwargs = {"file_name": onnx_file} if onnx_file else None
+            embedder = SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+            _logger.info(f"✅ ONNX Runtime embedder ({onnx_file or 'onnx/model.onnx'})")
+            return embedder.eval(), "cpu", backend
+        except Exception as e:
+            _logger.warning(f"⚠️ ONNX backend unavailable ({e}), using torch")
+            backend = "torch"
+
+    if backend == "torch-int8":
+        embedder = SentenceTransformer(model_name, device="cpu")
+        embedder.eval()
+        embedder = torch.quantization.quantize_dynamic(embedder, {torch.nn.Linear}, dtype=torch.qint8)
+        _logger.info("✅ Dynamic int8 quantization enabled (CPU)")
+        return embedder, "cpu", backend
+
+    embedder = SentenceTransformer(model_name, device=device)
+    embedder.eval()
+    if device == "cuda":
+        try:
+            embedder.half()
+            _logger.info("✅ FP16 precision enabled")
+        except Exception as e:
+            _logger.warning(f"⚠️ Could not enable FP16: {e}")
+    return embedder, device, backend
@@ -0,0 +1,98 @@
+"""
+Embedding Store Module
+
+Content-addressed cache of chunk embeddings in the chunk_embeddings table,
+keyed by (model key, sha256 of the chunk text). Both the server's
+ingestion path and load_knowledge_base.py look chunks up here before
+encoding, so re-ingesting unchanged content embeds nothing, and the same
+paragraph uploaded for several agents is embedded once.
+
+Chunk ids derived from the hash (chunk_id) let a re-ingest diff the chunks
+already in a collection against the new ones: only new chunks are written
+and only chunks that disappeared are deleted.
+"""
+
+import hashlib
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+
+from models import ChunkEmbedding, SessionLocal
+
+_LOOKUP_BATCH = 500  # Hashes per IN (...) query, below SQLite's bound-parameter limit
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(prefix: str, digest: str) -> str:
+    """Collection id for a chunk: stable across re-ingests of the same content"""
+    return f"{prefix}_{digest[:24]}"
+
+
+class EmbeddingStore:
+    """Lookup / insert of stored embeddings for one model key"""
+
+    def __init__(self, model: str, session_factory=SessionLocal):
+        self.model = model
+        self.session_factory = session_factory
+
+    def get_many(self, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        wanted = list(dict.fromkeys(hashes))
+        db = self.session_factory()
+        try:
+            for start in range(0, len(wanted), _LOOKUP_BATCH):
+                rows = db.query(ChunkEmbedding.chunk_hash, ChunkEmbedding.embedding).filter(
+                    ChunkEmbedding.model == self.model,
+                    ChunkEmbedding.chunk_hash.in_(wanted[start:start + _LOOKUP_BATCH])
+                ).all()
+                for digest, blob in rows:
+                    found[digest] = np.frombuffer(blob, dtype=np.float32)
+        finally:
+            db.close()
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        if not items:
+            return
+        rows = [
+            ChunkEmbedding(model=self.model, chunk_hash=digest, dim=int(vector.shape[-1]),
+                           embedding=np.asarray(vector, dtype=np.float32).tobytes())
+            for digest, vector in items.items()
+        ]
+        db = self.session_factory()
+        try:
+            db.add_all(rows)
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another writer stored some of them first; keep theirs
+                db.rollback()
+                for row in rows:
+                    db.merge(row)
+                db.commit()
+        finally:
+            db.close()
+
+    def embed(self, texts: Sequence[str], encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Embeddings for `texts` (float32, one row each): stored vectors where
+        available, `encode` for the rest, which are then stored.
+        """
+        hashes = [chunk_hash(t) for t in texts]
+        vectors, missing = self.resolve(hashes)
+        if missing:
+            text_of = dict(zip(hashes, texts))
+            fresh = dict(zip(missing, encode([text_of[d] for d in missing])))
+            self.put_many(fresh)
+            vectors.update(fresh)
+        return np.stack([vectors[d] for d in hashes]) if hashes else np.zeros((0, 0), dtype=np.float32)
+
+    def resolve(self, hashes: Sequence[str]):
+        """(stored vectors by hash, distinct hashes that still need encoding)"""
+        vectors = self.get_many(hashes)
+        missing = [d for d in dict.fromkeys(hashes) if d not in vectors]
+        return vectors, missing
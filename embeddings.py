@@ -0,0 +1,160 @@
+"""
+Embedding Service Module
+
+Micro-batching front end for the SentenceTransformer model. Encode requests
+from live calls (query embeddings) and from knowledge ingestion are queued,
+collected for a few milliseconds, and run through the model as one batched
+forward pass on a single worker thread; each caller gets its own slice of
+the result back through a future.
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional
+
+import numpy as np
+import torch
+
+import metrics
+from utils import _logger, EMBED_DEVICE, EMBED_BATCH_WINDOW_MS, EMBED_MAX_BATCH, embedder
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+_STOP = object()
+
+
+class _EncodeRequest:
+    __slots__ = ("texts", "future", "enqueued_at")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class EmbeddingService:
+    """
+    Coalesces concurrent encode requests into batched forward passes.
+
+    A request is never split: one with more than `max_batch` texts (bulk
+    ingestion) runs on its own, and the model's own batching handles it.
+    """
+
+    def __init__(self, model, device: str = EMBED_DEVICE,
+                 window_ms: float = EMBED_BATCH_WINDOW_MS, max_batch: int = EMBED_MAX_BATCH):
+        self.model = model
+        self.device = device
+        self.window_secs = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    # ---------- public API ----------
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queue texts for encoding; the future resolves to a (len(texts), dim) float32 array"""
+        request = _EncodeRequest(list(texts))
+        if not request.texts:
+            request.future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return request.future
+        self.start()
+        self._queue.put(request)
+        return request.future
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Blocking encode of normalized embeddings (safe to call from any thread)"""
+        return self.submit(texts).result()
+
+    async def encode_async(self, texts: List[str]) -> np.ndarray:
+        """Awaitable encode for code running on the event loop"""
+        return await asyncio.wrap_future(self.submit(texts))
+
+    # ---------- worker ----------
+
+    def _collect(self, first: _EncodeRequest):
+        """
+        Gather requests arriving within the batching window, up to max_batch
+        texts. Returns (batch, request that did not fit or None).
+        """
+        batch = [first]
+        size = len(first.texts)
+        deadline = time.perf_counter() + self.window_secs
+        while size < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is _STOP:
+                self._queue.put(_STOP)
+                break
+            if size + len(request.texts) > self.max_batch:
+                return batch, request
+            batch.append(request)
+            size += len(request.texts)
+        return batch, None
+
+    def _run(self):
+        leftover = None
+        while True:
+            first = leftover or self._queue.get()
+            if first is _STOP:
+                return
+            batch, leftover = self._collect(first)
+
+            started = time.perf_counter()
+            texts = [t for request in batch for t in request.texts]
+            for request in batch:
+                metrics.histogram("embed_queue_ms").observe((started - request.enqueued_at) * 1000)
+            metrics.histogram("embed_batch_size", buckets=BATCH_SIZE_BUCKETS).observe(len(texts))
+
+            try:
+                with torch.no_grad():
+                    vectors = self.model.encode(
+                        texts,
+                        device=self.device,
+                        show_progress_bar=False,
+                        convert_to_numpy=True,
+                        normalize_embeddings=True,
+                        batch_size=min(len(texts), self.max_batch)
+                    )
+            except Exception as e:
+                _logger.error(f"❌ Embedding batch of {len(texts)} failed: {e}")
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            metrics.histogram("embed_forward_ms").observe((time.perf_counter() - started) * 1000)
+            offset = 0
+            for request in batch:
+                request.future.set_result(vectors[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+
+    def status(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "running": self._thread is not None and self._thread.is_alive(),
+            "window_ms": self.window_secs * 1000,
+            "max_batch": self.max_batch
+        }
+
+
+embedding_service = EmbeddingService(embedder)
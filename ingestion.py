@@ -0,0 +1,436 @@
+"""
+Ingestion Module
+
+Knowledge-base indexing off the request path. Uploaded documents (PDF,
+HTML, DOCX, Markdown, CSV, text) are spooled to INGEST_SPOOL_DIR and
+recorded as an ingestion_jobs row. A background worker has their text
+extracted in a process pool (document_parsing.py), streams it through the
+chunker, embeds INGEST_BATCH_SIZE chunks at a time through the shared
+embedding service, and writes each batch to the agent's Chroma collection
+in a thread while the next batch is being embedded.
+
+Chunks are content-addressed (embedding_store.py): vectors are reused from
+the shared embedding store, and re-ingesting a document only writes the
+chunks that changed and deletes the ones that went away.
+
+Progress is persisted per batch, so the status endpoint can report it and
+jobs interrupted by a restart are resumed (chunk ids are deterministic and
+written with upsert, so re-processing a document is harmless).
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime as dt
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+from embeddings import embedding_service
+from document_parsing import extract_to_file
+from embedding_store import EmbeddingStore, chunk_hash, chunk_id
+from models import IngestionJob, KnowledgeBase, SessionLocal
+from retrieval import collections, agent_collection_name
+from utils import (
+    _logger, EMBED_MODEL_KEY, INGEST_SPOOL_DIR, INGEST_BATCH_SIZE, INGEST_PARSE_WORKERS, chunker
+)
+
+embedding_store = EmbeddingStore(EMBED_MODEL_KEY)
+
+_parse_totals: Dict[str, List[float]] = {}  # format -> [documents, bytes, chars, parse seconds]
+_parse_lock = threading.Lock()
+
+
+def record_parse(stats: Dict):
+    fmt = stats["format"]
+    metrics.histogram("ingest_parse_ms", format=fmt).observe(stats["parse_ms"])
+    metrics.counter("ingest_parsed_bytes", format=fmt).inc(stats["bytes"])
+    with _parse_lock:
+        totals = _parse_totals.setdefault(fmt, [0, 0, 0, 0.0])
+        totals[0] += 1
+        totals[1] += stats["bytes"]
+        totals[2] += stats["chars"]
+        totals[3] += stats["parse_ms"] / 1000
+
+
+def parse_stats() -> Dict:
+    """Per-format parse throughput since startup"""
+    with _parse_lock:
+        return {
+            fmt: {
+                "documents": int(docs),
+                "mb": round(size / 1024 / 1024, 2),
+                "mb_per_sec": round(size / 1024 / 1024 / secs, 2) if secs > 0 else None,
+                "chars_per_sec": round(chars / secs) if secs > 0 else None,
+            }
+            for fmt, (docs, size, chars, secs) in _parse_totals.items()
+        }
+
+
+def generate_job_id() -> str:
+    return f"job_{uuid.uuid4().hex[:16]}"
+
+
+def generate_document_id() -> str:
+    return f"doc_{uuid.uuid4().hex[:16]}"
+
+
+async def _embed(texts: List[str]) -> np.ndarray:
+    """Stored embeddings where available; only unseen chunk texts are encoded (and stored)"""
+    hashes = [chunk_hash(t) for t in texts]
+    vectors, missing = await asyncio.to_thread(embedding_store.resolve, hashes)
+    if missing:
+        text_of = dict(zip(hashes, texts))
+        fresh = dict(zip(missing, await embedding_service.encode_async([text_of[d] for d in missing])))
+        await asyncio.to_thread(embedding_store.put_many, fresh)
+        vectors.update(fresh)
+    metrics.counter("ingest_chunks_embedded").inc(len(missing))
+    metrics.counter("ingest_chunks_reused").inc(len(texts) - len(missing))
+    return np.stack([vectors[d] for d in hashes])
+
+
+async def index_chunks(agent_id: str, doc_id: str, chunks: Iterable[str],
+                       batch_size: int = INGEST_BATCH_SIZE, on_batch=None) -> Dict[str, int]:
+    """
+    Bring a document's chunks in the agent's collection up to date. Chunk ids
+    are content-addressed, so on re-ingest only new chunks are embedded and
+    written and only chunks no longer in the document are deleted.
+
+    `chunks` may be a lazy iterator (e.g. Chunker.stream over a file); it is
+    consumed a batch at a time in a worker thread, and the Chroma write of
+    batch n overlaps the embedding of batch n + 1. `on_batch(chunks_done,
+    chunks_seen)` is awaited after every write. Duplicate chunk texts are
+    stored once.
+    """
+    name = agent_collection_name(agent_id)
+    collection = await asyncio.to_thread(collections.get, name, True)
+    existing = await asyncio.to_thread(collection.get, where={"doc_id": doc_id}, include=[])
+    existing_ids = set(existing.get("ids") or [])
+
+    source = iter(chunks)
+    seen = set()
+    unchanged = 0
+
+    def next_batch() -> List[Tuple[str, str]]:
+        nonlocal unchanged
+        batch = []
+        for chunk in source:
+            cid = chunk_id(doc_id, chunk_hash(chunk))
+            if cid in seen:
+                continue
+            seen.add(cid)
+            if cid in existing_ids:
+                unchanged += 1
+                continue
+            batch.append((cid, chunk))
+            if len(batch) >= batch_size:
+                break
+        return batch
+
+    def write(ids: List[str], documents: List[str], embeddings):
+        collection.upsert(
+            ids=ids,
+            documents=documents,
+            embeddings=embeddings.tolist(),
+            metadatas=[{"agent_id": agent_id, "doc_id": doc_id} for _ in ids]
+        )
+
+    added = 0
+    pending: Optional[Tuple[asyncio.Future, List[str], List[str]]] = None
+    while True:
+        batch = await asyncio.to_thread(next_batch)
+        if not batch:
+            break
+        ids = [cid for cid, _ in batch]
+        documents = [chunk for _, chunk in batch]
+        embeddings = await _embed(documents)
+        if pending is not None:
+            added += await _finish_write(name, *pending)
+            if on_batch is not None:
+                await on_batch(unchanged + added, len(seen))
+        pending = (asyncio.ensure_future(asyncio.to_thread(write, ids, documents, embeddings)), ids, documents)
+
+    if pending is not None:
+        added += await _finish_write(name, *pending)
+    stale_ids = list(existing_ids - seen)
+    if stale_ids:
+        await asyncio.to_thread(collection.delete, ids=stale_ids)
+        collections.modified(name, removed=stale_ids)
+    if on_batch is not None:
+        await on_batch(unchanged + added, len(seen))
+    return {"chunks": len(seen), "added": added, "removed": len(stale_ids)}
+
+
+async def _finish_write(name: str, task: asyncio.Future, ids: List[str], documents: List[str]) -> int:
+    await task
+    collections.modified(name, added=(ids, documents))
+    return len(ids)
+
+
+class IngestionWorker:
+    """Processes ingestion jobs one at a time in the background"""
+
+    def __init__(self, spool_dir: str = INGEST_SPOOL_DIR, parse_workers: int = INGEST_PARSE_WORKERS):
+        self.spool_dir = spool_dir
+        self.parse_workers = parse_workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+
+    # ---------- lifecycle ----------
+
+    async def start(self):
+        if self._task is not None:
+            return
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._queue = asyncio.Queue()
+        # spawn: workers must not inherit the server's threads, CUDA context or model. They
+        # re-import __main__, which is cheap when the server is started with the uvicorn CLI
+        self._parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers,
+                                               mp_context=multiprocessing.get_context("spawn"))
+        for job_id in await asyncio.to_thread(self._unfinished_jobs):
+            self._queue.put_nowait(job_id)
+        if self._queue.qsize():
+            _logger.info(f"📚 Resuming {self._queue.qsize()} unfinished ingestion jobs")
+        self._task = asyncio.create_task(self._run())
+        _logger.info(f"📚 Ingestion worker started ({self.parse_workers} parser processes)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._parse_pool.shutdown(wait=False, cancel_futures=True)
+        self._parse_pool = None
+        # A job cut off mid-way stays "running" and is resumed on next start
+
+    def spool_path(self, job_id: str, index: int, filename: str) -> str:
+        safe_name = os.path.basename(filename or "document").replace(" ", "_")
+        return os.path.join(self.spool_dir, f"{job_id}_{index}_{safe_name}")
+
+    def create_job(self, job_id: str, agent_id: str, documents: List[Dict]) -> IngestionJob:
+        """Record a job for already-spooled documents and queue it"""
+        db = SessionLocal()
+        try:
+            job = IngestionJob(
+                id=job_id,
+                agent_id=agent_id,
+                status="queued",
+                documents=documents,
+                documents_total=len(documents)
+            )
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            db.expunge(job)
+        finally:
+            db.close()
+        self._queue.put_nowait(job_id)
+        metrics.counter("ingest_jobs", status="queued").inc()
+        return job
+
+    # ---------- job state (run in a thread, off the event loop) ----------
+
+    @staticmethod
+    def _unfinished_jobs() -> List[str]:
+        db = SessionLocal()
+        try:
+            rows = db.query(IngestionJob.id).filter(
+                IngestionJob.status.in_(("queued", "running"))
+            ).order_by(IngestionJob.created_at).all()
+            return [row[0] for row in rows]
+        finally:
+            db.close()
+
+    @staticmethod
+    def _load(job_id: str) -> Optional[Dict]:
+        db = SessionLocal()
+        try:
+            job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+            if job is None:
+                return None
+            if job.status == "queued":
+                job.status = "running"
+                job.started_at = dt.utcnow()
+                db.commit()
+            return {"agent_id": job.agent_id, "documents": [dict(d) for d in job.documents]}
+        finally:
+            db.close()
+
+    @staticmethod
+    def _save(job_id: str, **fields):
+        db = SessionLocal()
+        try:
+            db.query(IngestionJob).filter(IngestionJob.id == job_id).update(fields, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _store_document(agent_id: str, entry: Dict, content: str):
+        db = SessionLocal()
+        try:
+            exists = db.query(KnowledgeBase.id).filter(
+                KnowledgeBase.agent_id == agent_id,
+                KnowledgeBase.document_id == entry["document_id"]
+            ).first()
+            kb_metadata = {**(entry.get("metadata") or {}), "filename": entry["filename"]}
+            if exists:
+                # Re-ingest of a document uploaded earlier
+                db.query(KnowledgeBase).filter(KnowledgeBase.id == exists[0]).update(
+                    {"content": content, "kb_metadata": kb_metadata}, synchronize_session=False
+                )
+            else:
+                db.add(KnowledgeBase(
+                    agent_id=agent_id,
+                    document_id=entry["document_id"],
+                    content=content,
+                    kb_metadata=kb_metadata
+                ))
+            db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _read(path: str) -> str:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+
+    @staticmethod
+    def _remove(*paths: str):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # ---------- processing ----------
+
+    async def _run(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                _logger.error(f"❌ Ingestion job {job_id} failed: {e}")
+                metrics.counter("ingest_jobs", status="failed").inc()
+                await asyncio.to_thread(self._save, job_id, status="failed",
+                                        error=f"{type(e).__name__}: {e}", finished_at=dt.utcnow())
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job_id: str):
+        job = await asyncio.to_thread(self._load, job_id)
+        if job is None:
+            return
+        agent_id = job["agent_id"]
+        documents = job["documents"]
+        started = time.perf_counter()
+        _logger.info(f"📚 Ingestion job {job_id}: {len(documents)} documents for agent {agent_id}")
+
+        # All documents are parsed in parallel (bounded by the pool) while earlier ones are embedded
+        loop = asyncio.get_running_loop()
+        parsing = {
+            index: loop.run_in_executor(self._parse_pool, extract_to_file, entry["path"],
+                                        entry.get("format") or "text", f"{entry['path']}.txt")
+            for index, entry in enumerate(documents) if not entry.get("done")
+        }
+        try:
+            for index, entry in enumerate(documents):
+                if entry.get("done"):
+                    continue
+                try:
+                    parsed = await parsing[index]
+                except Exception as e:
+                    # One unreadable document does not fail the rest of the upload
+                    entry.update(error=f"{type(e).__name__}: {e}", chunks=0, done=True)
+                    _logger.warning(f"⚠️ Could not parse {entry['filename']}: {e}")
+                    await asyncio.to_thread(self._save, job_id, documents=documents,
+                                            documents_done=sum(1 for d in documents if d.get("done")))
+                    await asyncio.to_thread(self._remove, entry["path"], f"{entry['path']}.txt")
+                    continue
+                await self._index_document(job_id, agent_id, documents, entry, parsed)
+        finally:
+            for future in parsing.values():
+                future.cancel()
+
+        chunks_done = sum(d.get("chunks") or 0 for d in documents)
+        failed = [d for d in documents if d.get("error")]
+        status = "failed" if failed and len(failed) == len(documents) else "completed"
+        error = "; ".join(f"{d['filename']}: {d['error']}" for d in failed) or None
+        elapsed = time.perf_counter() - started
+        metrics.counter("ingest_jobs", status=status).inc()
+        metrics.counter("ingest_chunks").inc(chunks_done)
+        await asyncio.to_thread(self._save, job_id, status=status, error=error, finished_at=dt.utcnow())
+        _logger.info(f"✅ Ingestion job {job_id} {status}: {chunks_done} chunks in {elapsed:.1f}s"
+                     + (f", {len(failed)} documents failed" if failed else ""))
+
+    async def _index_document(self, job_id: str, agent_id: str, documents: List[Dict], entry: Dict, parsed: Dict):
+        record_parse(parsed)
+        entry["parse_ms"] = round(parsed["parse_ms"], 1)
+        entry["chars"] = parsed["chars"]
+        text_path = f"{entry['path']}.txt"
+
+        # Partial progress of an interrupted document is redone from its first chunk
+        base = sum(d.get("chunks") or 0 for d in documents if d.get("done"))
+
+        async def progress(chunks_done: int, chunks_seen: int):
+            await asyncio.to_thread(self._save, job_id, chunks_done=base + chunks_done,
+                                    chunks_total=base + chunks_seen)
+
+        with open(text_path, "r", encoding="utf-8") as text:
+            result = await index_chunks(agent_id, entry["document_id"], chunker.stream(text), on_batch=progress)
+        content = await asyncio.to_thread(self._read, text_path)
+        await asyncio.to_thread(self._store_document, agent_id, entry, content)
+
+        entry.update(chunks=result["chunks"], added=result["added"], removed=result["removed"], done=True)
+        await asyncio.to_thread(
+            self._save, job_id, documents=documents,
+            chunks_done=base + result["chunks"], chunks_total=base + result["chunks"],
+            documents_done=sum(1 for d in documents if d.get("done"))
+        )
+        await asyncio.to_thread(self._remove, entry["path"], text_path)
+        _logger.info(f"📄 {entry['filename']} ({parsed['format']}, parsed in {parsed['parse_ms']:.0f}ms): "
+                     f"{result['chunks']} chunks, {result['added']} new, {result['removed']} removed")
+
+    # ---------- reporting ----------
+
+    @staticmethod
+    def describe(job: IngestionJob) -> Dict:
+        """Status payload with progress and chunks/sec throughput"""
+        end = job.finished_at or dt.utcnow()
+        elapsed = (end - job.started_at).total_seconds() if job.started_at else 0.0
+        return {
+            "job_id": job.id,
+            "agent_id": job.agent_id,
+            "status": job.status,
+            "documents": [
+                {"filename": d["filename"], "document_id": d["document_id"], "format": d.get("format", "text"),
+                 "bytes": d.get("bytes"), "parse_ms": d.get("parse_ms"), "chunks": d.get("chunks"),
+                 "chunks_added": d.get("added"), "chunks_removed": d.get("removed"), "done": bool(d.get("done")),
+                 "error": d.get("error")}
+                for d in job.documents
+            ],
+            "progress": {
+                "documents_done": job.documents_done or 0,
+                "documents_total": job.documents_total or 0,
+                "chunks_done": job.chunks_done or 0,
+                "chunks_total": job.chunks_total or 0,
+            },
+            "throughput_chunks_per_sec": round((job.chunks_done or 0) / elapsed, 2) if elapsed > 0 else None,
+            "error": job.error,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
+
+
+ingestion_worker = IngestionWorker()
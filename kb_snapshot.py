@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Knowledge-Base Snapshots
+
+Portable per-collection snapshots, so a new node can load every agent's
+knowledge base without the embedding model and without copying the opaque
+chroma_db directory. A snapshot is a directory per collection:
+
+    <root>/<collection>/manifest.json    model key, dimension, chunk count, collection metadata
+    <root>/<collection>/chunks.jsonl     {"id", "document", "metadata"} per chunk
+    <root>/<collection>/embeddings.npy   float32 (chunks, dim), row i = line i of chunks.jsonl
+    <root>/<collection>/documents.jsonl  knowledge_bases rows of the agent (agent collections)
+
+embeddings.npy is memory-mapped on import and written to Chroma in batches,
+so importing costs only the Chroma writes. Import also seeds the shared
+embedding store (later re-ingests of the same content embed nothing) and,
+with an index directory, the exact-index files the server memory-maps on
+first query. Snapshots are refused on a node whose embedding model key
+differs from the exporter's.
+
+Usage:
+    python3 kb_snapshot.py export <root> [--collection NAME ...]
+    python3 kb_snapshot.py import <root> [--collection NAME ...] [--index-dir DIR]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from embedding_store import EmbeddingStore, chunk_hash
+from models import KnowledgeBase, SessionLocal
+from vector_index import fingerprint
+
+FORMAT_VERSION = 1
+AGENT_PREFIX = "agent_"
+PAGE_SIZE = 2000  # Chunks per Chroma get/upsert
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def collection_names(client) -> List[str]:
+    # Chroma < 0.6 returns Collection objects, later versions return names
+    return sorted(c if isinstance(c, str) else c.name for c in client.list_collections())
+
+
+def snapshot_names(root: str) -> List[str]:
+    if not os.path.isdir(root):
+        return []
+    return sorted(n for n in os.listdir(root) if os.path.exists(os.path.join(root, n, "manifest.json")))
+
+
+def _agent_id(name: str) -> Optional[str]:
+    return name[len(AGENT_PREFIX):] if name.startswith(AGENT_PREFIX) else None
+
+
+# ================================
+# EXPORT
+# ================================
+
+def export_collection(collection, root: str, model: str) -> Dict:
+    """Write a snapshot of `collection` to <root>/<name>, replacing any previous one"""
+    start = time.perf_counter()
+    name = collection.name
+    final_dir = os.path.join(root, name)
+    tmp_dir = f"{final_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    total = collection.count()
+    matrix = None
+    written = 0
+    with open(os.path.join(tmp_dir, "chunks.jsonl"), "w", encoding="utf-8") as chunks:
+        while written < total:
+            page = collection.get(include=["documents", "metadatas", "embeddings"],
+                                  limit=PAGE_SIZE, offset=written)
+            if not page["ids"]:
+                break
+            embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+            if matrix is None:
+                matrix = np.lib.format.open_memmap(os.path.join(tmp_dir, "embeddings.npy"), mode="w+",
+                                                   dtype=np.float32, shape=(total, embeddings.shape[1]))
+            if written + len(page["ids"]) > total:
+                break
+            matrix[written:written + len(page["ids"])] = embeddings
+            for cid, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                chunks.write(json.dumps({"id": cid, "document": document, "metadata": metadata}) + "\n")
+            written += len(page["ids"])
+    if written != total:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise SnapshotError(f"'{name}' changed during export ({written} of {total} chunks read), retry")
+    if matrix is None:
+        np.save(os.path.join(tmp_dir, "embeddings.npy"), np.zeros((0, 0), dtype=np.float32))
+    else:
+        matrix.flush()
+        del matrix
+
+    documents = 0
+    agent_id = _agent_id(name)
+    if agent_id:
+        documents = _export_documents(agent_id, os.path.join(tmp_dir, "documents.jsonl"))
+
+    dim = int(np.load(os.path.join(tmp_dir, "embeddings.npy"), mmap_mode="r").shape[1])
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "collection": name,
+        "agent_id": agent_id,
+        "model": model,
+        "dim": dim,
+        "chunks": total,
+        "documents": documents,
+        "metadata": dict(collection.metadata or {}),
+        "exported_at": datetime.utcnow().isoformat(),
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.replace(tmp_dir, final_dir)
+    return {**manifest, "bytes": _dir_bytes(final_dir), "seconds": round(time.perf_counter() - start, 3)}
+
+
+def _export_documents(agent_id: str, path: str) -> int:
+    db = SessionLocal()
+    try:
+        rows = db.query(KnowledgeBase).filter(KnowledgeBase.agent_id == agent_id).yield_per(200)
+        count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps({
+                    "document_id": row.document_id,
+                    "content": row.content,
+                    "metadata": row.kb_metadata,
+                    "created_at": row.created_at.isoformat() if row.created_at else None,
+                }) + "\n")
+                count += 1
+        return count
+    finally:
+        db.close()
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, n)) for n in os.listdir(path))
+
+
+# ================================
+# IMPORT
+# ================================
+
+def read_manifest(snapshot_dir: str) -> Dict:
+    path = os.path.join(snapshot_dir, "manifest.json")
+    if not os.path.exists(path):
+        raise SnapshotError(f"No snapshot at {snapshot_dir}")
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format {manifest.get('format_version')} in {snapshot_dir}")
+    return manifest
+
+
+def import_collection(client, snapshot_dir: str, model: str, force: bool = False, prune: bool = True,
+                      index_dir: Optional[str] = None, hnsw_metadata: Optional[Dict] = None) -> Dict:
+    """
+    Load a snapshot into Chroma with its stored embeddings. With prune, chunks
+    not in the snapshot are deleted so the collection matches it exactly.
+    """
+    start = time.perf_counter()
+    manifest = read_manifest(snapshot_dir)
+    name = manifest["collection"]
+    if manifest["model"] != model and not force:
+        raise SnapshotError(f"Snapshot of '{name}' was embedded with {manifest['model']}, "
+                            f"this node uses {model}")
+
+    embeddings = np.load(os.path.join(snapshot_dir, "embeddings.npy"), mmap_mode="r")
+    if embeddings.shape[0] != manifest["chunks"]:
+        raise SnapshotError(f"Snapshot of '{name}' is incomplete: {embeddings.shape[0]} embeddings, "
+                            f"{manifest['chunks']} chunks")
+
+    collection = client.get_or_create_collection(name, metadata=manifest["metadata"] or hnsw_metadata or None)
+    store = EmbeddingStore(manifest["model"])
+    ids: List[str] = []
+    all_ids = set()
+    row = 0
+
+    def flush(batch_ids, documents, metadatas):
+        vectors = embeddings[row - len(batch_ids):row]
+        collection.upsert(
+            ids=batch_ids,
+            documents=documents,
+            embeddings=vectors.tolist(),
+            metadatas=metadatas if any(metadatas) else None
+        )
+        hashes = [chunk_hash(d) for d in documents]
+        _, missing = store.resolve(hashes)
+        if missing:
+            by_hash = dict(zip(hashes, vectors))
+            store.put_many({d: np.array(by_hash[d]) for d in missing})
+
+    documents: List[str] = []
+    metadatas: List[Optional[Dict]] = []
+    with open(os.path.join(snapshot_dir, "chunks.jsonl"), encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            ids.append(entry["id"])
+            documents.append(entry["document"])
+            metadatas.append(entry.get("metadata"))
+            row += 1
+            if len(ids) >= PAGE_SIZE:
+                flush(ids, documents, metadatas)
+                all_ids.update(ids)
+                ids, documents, metadatas = [], [], []
+    if ids:
+        flush(ids, documents, metadatas)
+        all_ids.update(ids)
+    if row != manifest["chunks"]:
+        raise SnapshotError(f"Snapshot of '{name}' is incomplete: {row} of {manifest['chunks']} chunks")
+
+    removed = _prune(collection, all_ids) if prune else 0
+    documents_imported = 0
+    if manifest.get("agent_id") and os.path.exists(os.path.join(snapshot_dir, "documents.jsonl")):
+        documents_imported = _import_documents(manifest["agent_id"], os.path.join(snapshot_dir, "documents.jsonl"), prune)
+
+    if index_dir and prune:
+        _seed_exact_index(snapshot_dir, os.path.join(index_dir, name))
+
+    elapsed = time.perf_counter() - start
+    return {
+        "collection": name,
+        "agent_id": manifest.get("agent_id"),
+        "chunks": row,
+        "removed": removed,
+        "documents": documents_imported,
+        "seconds": round(elapsed, 3),
+        "chunks_per_sec": round(row / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def _prune(collection, keep_ids, page: int = 5000) -> int:
+    stale = []
+    offset = 0
+    while True:
+        ids = collection.get(include=[], limit=page, offset=offset)["ids"]
+        if not ids:
+            break
+        stale += [cid for cid in ids if cid not in keep_ids]
+        offset += len(ids)
+    for i in range(0, len(stale), page):
+        collection.delete(ids=stale[i:i + page])
+    return len(stale)
+
+
+def _import_documents(agent_id: str, path: str, replace: bool) -> int:
+    with open(path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    db = SessionLocal()
+    try:
+        query = db.query(KnowledgeBase).filter(KnowledgeBase.agent_id == agent_id)
+        if not replace:
+            query = query.filter(KnowledgeBase.document_id.in_([e["document_id"] for e in entries]))
+        query.delete(synchronize_session=False)
+        for entry in entries:
+            row = KnowledgeBase(
+                agent_id=agent_id,
+                document_id=entry["document_id"],
+                content=entry["content"],
+                kb_metadata=entry.get("metadata")
+            )
+            if entry.get("created_at"):
+                row.created_at = datetime.fromisoformat(entry["created_at"])
+            db.add(row)
+        db.commit()
+        return len(entries)
+    finally:
+        db.close()
+
+
+def _seed_exact_index(snapshot_dir: str, path_prefix: str):
+    """Write the <prefix>.npy / <prefix>.json pair ExactIndex.load() memory-maps"""
+    os.makedirs(os.path.dirname(path_prefix) or ".", exist_ok=True)
+    ids, documents = [], []
+    with open(os.path.join(snapshot_dir, "chunks.jsonl"), encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            ids.append(entry["id"])
+            documents.append(entry["document"])
+    shutil.copyfile(os.path.join(snapshot_dir, "embeddings.npy"), f"{path_prefix}.npy")
+    with open(f"{path_prefix}.json", "w", encoding="utf-8") as f:
+        json.dump({"ids": ids, "documents": documents, "fingerprint": fingerprint(ids, documents)}, f)
+
+
+# ================================
+# MAIN
+# ================================
+
+def main():
+    import chromadb
+    from embedding_backend import model_key
+
+    parser = argparse.ArgumentParser(description="Export or import knowledge-base snapshots")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("root", help="snapshot directory (one sub-directory per collection)")
+    parser.add_argument("--collection", action="append", help="collection to export/import (default: all)")
+    parser.add_argument("--chroma-path", default=os.getenv("CHROMA_PATH", "./chroma_db"))
+    parser.add_argument("--index-dir", default=os.getenv("RAG_INDEX_DIR", ""),
+                        help="also write exact-index files here for the server to memory-map")
+    parser.add_argument("--no-prune", action="store_true", help="import: keep chunks that are not in the snapshot")
+    parser.add_argument("--force", action="store_true", help="import: ignore an embedding model mismatch")
+    args = parser.parse_args()
+
+    model = model_key(os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    client = chromadb.PersistentClient(path=args.chroma_path)
+    start = time.time()
+
+    if args.command == "export":
+        os.makedirs(args.root, exist_ok=True)
+        names = args.collection or collection_names(client)
+        print(f"📦 Exporting {len(names)} collections from {args.chroma_path} to {args.root}")
+        for name in names:
+            result = export_collection(client.get_collection(name), args.root, model)
+            print(f"   ✅ {name}: {result['chunks']:,} chunks, {result['bytes'] / 1024 / 1024:.1f} MB "
+                  f"in {result['seconds']:.1f}s")
+    else:
+        names = args.collection or snapshot_names(args.root)
+        print(f"📥 Importing {len(names)} collections from {args.root} into {args.chroma_path}")
+        failed = 0
+        for name in names:
+            try:
+                result = import_collection(client, os.path.join(args.root, name), model, force=args.force,
+                                           prune=not args.no_prune, index_dir=args.index_dir or None)
+            except SnapshotError as e:
+                failed += 1
+                print(f"   ❌ {e}")
+                continue
+            print(f"   ✅ {name}: {result['chunks']:,} chunks ({result['removed']:,} removed) "
+                  f"in {result['seconds']:.1f}s")
+        if failed:
+            raise SystemExit(1)
+
+    print(f"\n✅ Done in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
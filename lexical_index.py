@@ -0,0 +1,161 @@
+"""
+Lexical Index Module
+
+Per-collection BM25 inverted index over knowledge-base chunks. It catches
+what embeddings blur: product names, SKUs, order numbers and phone numbers
+that callers say verbatim. Identifier-like tokens (anything with a digit)
+are also indexed in joined form, so "(555) 123-4567", "555 123 4567" and
+"5551234567" all match, as do "AB-1234" and "ab1234".
+"""
+
+import math
+import re
+import threading
+from collections import Counter as TermCounter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_PHONE = re.compile(r"\+?\d[\d\s().-]{5,}\d")
+_COMPOUND = re.compile(r"[a-z0-9]+(?:[-_/.][a-z0-9]+)+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can could do does for from have how i i'm in is it its me my
+of on or our please so that the their them then there they this to us was we what when where
+which who why will with would you your yes no okay ok hi hello um uh like just about tell know
+""".split())
+
+# Fusion constant from the reciprocal rank fusion paper; larger flattens rank differences
+RRF_K = 60
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens without stopwords, plus joined forms of numbers and codes"""
+    text = text.lower()
+    tokens = [t for t in _TOKEN.findall(text) if t not in STOPWORDS]
+    for match in _PHONE.findall(text):
+        tokens.append(re.sub(r"\D", "", match))
+    for match in _COMPOUND.findall(text):
+        if any(ch.isdigit() for ch in match):
+            tokens.append(re.sub(r"[-_/.]", "", match))
+    return tokens
+
+
+def is_identifier(token: str) -> bool:
+    """
+    SKU / order number / phone-like token: letters mixed with digits
+    ("ab1234"), or a long digit string (phone and order numbers). Plain
+    numbers such as years or prices ("2024", "100") are not identifiers.
+    """
+    has_digit = any(ch.isdigit() for ch in token)
+    if token.isdigit():
+        return len(token) >= 7
+    return len(token) >= 3 and has_digit and any(ch.isalpha() for ch in token)
+
+
+class BM25Index:
+    """Okapi BM25 over chunks; incremental add/remove, safe across threads"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}  # term -> {slot: term frequency}
+        self._lengths: Dict[int, int] = {}
+        self._documents: Dict[int, str] = {}
+        self._slots: Dict[str, int] = {}  # chunk id -> slot
+        self._next_slot = 0
+        self._total_length = 0
+        self._approx_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate resident size: chunk texts plus per-posting and per-chunk overhead"""
+        return self._approx_bytes
+
+    @staticmethod
+    def _footprint(document: str, distinct_terms: int) -> int:
+        return len(document) + 72 * distinct_terms + 256
+
+    def add(self, ids: Sequence[str], documents: Sequence[str]):
+        with self._lock:
+            for chunk_id, document in zip(ids, documents):
+                self._remove_locked(chunk_id)
+                slot = self._next_slot
+                self._next_slot += 1
+                terms = TermCounter(tokenize(document))
+                for term, tf in terms.items():
+                    self._postings.setdefault(term, {})[slot] = tf
+                length = sum(terms.values())
+                self._slots[chunk_id] = slot
+                self._documents[slot] = document
+                self._lengths[slot] = length
+                self._total_length += length
+                self._approx_bytes += self._footprint(document, len(terms))
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for chunk_id in ids:
+                self._remove_locked(chunk_id)
+
+    def _remove_locked(self, chunk_id: str):
+        slot = self._slots.pop(chunk_id, None)
+        if slot is None:
+            return
+        terms = set(tokenize(self._documents[slot]))
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(slot, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(slot)
+        self._approx_bytes -= self._footprint(self._documents.pop(slot), len(terms))
+
+    def vocabulary_overlap(self, query: str) -> float:
+        """Share of the query's content tokens that occur anywhere in the index"""
+        terms = set(tokenize(query))
+        if not terms:
+            return 0.0
+        return sum(1 for term in terms if term in self._postings) / len(terms)
+
+    def search(self, query: str, k: int) -> Tuple[List[Tuple[str, float]], bool]:
+        """
+        ([(document, bm25 score)] best first, exact_hit). exact_hit is True
+        when the query contains an identifier that occurs in at most k chunks;
+        the result is then limited to the chunks containing one.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._documents)
+            if n == 0 or not terms:
+                return [], False
+            avg_length = self._total_length / n
+            scores: Dict[int, float] = {}
+            identifier_slots = set()
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                if is_identifier(term) and len(postings) <= k:
+                    identifier_slots.update(postings)
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for slot, tf in postings.items():
+                    norm = tf + self.k1 * (1 - self.b + self.b * self._lengths[slot] / avg_length)
+                    scores[slot] = scores.get(slot, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+            if identifier_slots:
+                scores = {slot: score for slot, score in scores.items() if slot in identifier_slots}
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(self._documents[slot], score) for slot, score in ranked], bool(identifier_slots)
+
+
+def reciprocal_rank_fusion(*rankings: Sequence[Tuple[str, float]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Fuse ranked (document, score) lists by 1 / (k + rank); returns (document, fused score)"""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, (document, _) in enumerate(ranking, start=1):
+            fused[document] = fused.get(document, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
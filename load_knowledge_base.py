@@ -2,139 +2,379 @@
 """
 Load Knowledge Base Data into ChromaDB
 
-This script loads your data file into the RAG vector database.
-Run this ONCE before starting your server.
+This script loads your data files into the RAG vector database. Re-running
+it after the files change is incremental: chunks are content-addressed, so
+only new chunks are embedded and written (vectors already in the shared
+embedding store are reused) and only chunks no longer in the files are
+deleted.
+
+Files are streamed, never read whole, through a bounded three-stage
+pipeline - read/chunk → embed → Chroma write - with each stage on its own
+thread, so a multi-gigabyte corpus loads in bounded memory with the GPU
+kept busy while Chroma writes. Progress is checkpointed after every batch;
+an interrupted run picks up where it stopped when started again.
+
+Usage:
+    python3 load_knowledge_base.py [paths ...] [--collection docs] [--restart]
+
+Paths may be files or directories (every PDF, HTML, DOCX, Markdown, CSV and
+text file inside is loaded); the default is ./data/data.txt.
 """
 
+import argparse
+import json
 import os
+import queue
+import threading
+import time
+
 import torch
-from sentence_transformers import SentenceTransformer
 import chromadb
 from tqdm import tqdm
 
+from chunking import Chunker, model_token_budget, token_counter
+from document_parsing import FORMATS, detect_format, iter_text, UnsupportedFormat
+from embedding_backend import load_embedder, model_key
+from embedding_store import EmbeddingStore, chunk_hash, chunk_id
+
 # Configuration
 DATA_FILE = "./data/data.txt"
 CHROMA_PATH = "./chroma_db"
 EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
-CHUNK_SIZE = 384
-BATCH_SIZE = 32
-
-print("=" * 70)
-print("📚 LOADING KNOWLEDGE BASE INTO RAG SYSTEM")
-print("=" * 70)
-
-# Check if data file exists
-if not os.path.exists(DATA_FILE):
-    print(f"\n❌ ERROR: Data file not found at {DATA_FILE}")
-    print("Please ensure your data file exists at this location.")
-    exit(1)
-
-# Detect GPU
-if torch.cuda.is_available():
-    device = 'cuda'
-    print(f"✅ GPU: {torch.cuda.get_device_name(0)}")
-elif torch.backends.mps.is_available():
-    device = 'mps'
-    print("✅ Apple Silicon GPU detected")
-else:
-    device = 'cpu'
-    print("⚠️ Using CPU (slower)")
-
-# Load embedding model
-print(f"\n📦 Loading embedding model...")
-embedder = SentenceTransformer(EMBED_MODEL, device=device)
-embedder.eval()
-
-if device == 'cuda':
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")  # Must match the server's backend
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "0"))  # Must match the server; 0 = embedding model max
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+BATCH_SIZE = 64
+QUEUE_DEPTH = 4  # Batches buffered between stages (bounds memory)
+CHECKPOINT_INTERVAL_SECS = 2.0
+
+_DONE = object()
+
+
+# ================================
+# INPUT
+# ================================
+
+def list_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, n) for n in sorted(names)
+                          if os.path.splitext(n)[1].lower() in FORMATS]
+        elif os.path.exists(path):
+            files.append(path)
+        else:
+            print(f"⚠️ Skipping missing path: {path}")
+    return files
+
+
+def iter_chunks(path, chunker):
+    """Chunks of a file's extracted text, parsed as a stream"""
     try:
-        embedder.half()
-        print("✅ FP16 enabled")
-    except:
-        pass
-
-# Connect to ChromaDB
-print(f"\n🔗 Connecting to ChromaDB: {CHROMA_PATH}")
-chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
-collection = chroma_client.get_or_create_collection("docs")
-
-# Check existing data
-existing_count = collection.count()
-print(f"📊 Current documents: {existing_count}")
-
-if existing_count > 0:
-    response = input(f"\n⚠️ Found {existing_count} existing documents. Delete and reload? (yes/no): ")
-    if response.lower() in ['yes', 'y']:
-        print("🗑️ Deleting collection...")
-        chroma_client.delete_collection("docs")
-        collection = chroma_client.get_or_create_collection("docs")
-        print("✅ Cleared")
+        fmt = detect_format(path)
+    except UnsupportedFormat:
+        fmt = "text"  # Named explicitly on the command line
+    yield from chunker.stream(iter_text(path, fmt))
+
+
+# ================================
+# CHECKPOINT
+# ================================
+
+class Checkpoint:
+    """Per-file count of chunks already written, invalidated when the file changes"""
+
+    def __init__(self, path, restart=False):
+        self.path = path
+        self.files = {}
+        if not restart and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+        self._saved_at = 0.0
+
+    def resume_from(self, file_path):
+        """Chunks of file_path to skip (0 if new or modified since the checkpoint)"""
+        stat = os.stat(file_path)
+        entry = self.files.get(file_path)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry["chunks_done"]
+        self.files[file_path] = {"size": stat.st_size, "mtime": stat.st_mtime, "chunks_done": 0, "done": False}
+        return 0
+
+    def advance(self, file_path, chunks_done, done=False):
+        self.files[file_path].update(chunks_done=chunks_done, done=done)
+        if done or time.monotonic() - self._saved_at >= CHECKPOINT_INTERVAL_SECS:
+            self.save()
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f)
+        os.replace(tmp, self.path)
+        self._saved_at = time.monotonic()
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# ================================
+# PIPELINE STAGES
+# ================================
+
+class Pipeline:
+    """read/chunk → embed → write, connected by bounded queues"""
+
+    def __init__(self, files, collection, embedder, device, store, checkpoint, batch_size, chunker):
+        self.files = files
+        self.chunker = chunker
+        self.collection = collection
+        self.embedder = embedder
+        self.device = device
+        self.store = store
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.to_embed = queue.Queue(maxsize=QUEUE_DEPTH)
+        self.to_write = queue.Queue(maxsize=QUEUE_DEPTH)
+        self.failed = threading.Event()
+        self.error = None
+        self.seen_ids = set()
+        self.resumed = False
+        self.stats = {"files": 0, "chunks": 0, "skipped": 0, "unchanged": 0, "added": 0}
+
+    def _put(self, q, item):
+        while not self.failed.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fail(self, stage, e):
+        self.error = f"{stage}: {type(e).__name__}: {e}"
+        self.failed.set()
+
+    def read(self):
+        try:
+            for path in self.files:
+                skip = self.checkpoint.resume_from(path)
+                if skip:
+                    self.resumed = True
+                batch = []
+                count = 0
+                for chunk in iter_chunks(path, self.chunker):
+                    count += 1
+                    # Chunks before the checkpoint are still hashed, for pruning
+                    self.seen_ids.add(chunk_id("kb", chunk_hash(chunk)))
+                    if count <= skip:
+                        self.stats["skipped"] += 1
+                        continue
+                    batch.append(chunk)
+                    if len(batch) >= self.batch_size:
+                        if not self._put(self.to_embed, (path, count, batch, False)):
+                            return
+                        batch = []
+                if not self._put(self.to_embed, (path, count, batch, True)):
+                    return
+        except Exception as e:
+            self._fail("read", e)
+        finally:
+            self._put(self.to_embed, _DONE)
+
+    def encode(self, texts):
+        with torch.no_grad():
+            return self.embedder.encode(
+                texts,
+                device=self.device,
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                batch_size=self.batch_size
+            )
+
+    def embed(self):
+        try:
+            while not self.failed.is_set():
+                try:
+                    item = self.to_embed.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                path, chunks_done, chunks, last = item
+                wanted = {}
+                for chunk in chunks:
+                    wanted.setdefault(chunk_id("kb", chunk_hash(chunk)), chunk)
+                present = set(self.collection.get(ids=list(wanted), include=[])["ids"]) if wanted else set()
+                ids = [cid for cid in wanted if cid not in present]
+                documents = [wanted[cid] for cid in ids]
+                embeddings = self.store.embed(documents, self.encode) if documents else None
+                if not self._put(self.to_write, (path, chunks_done, last, ids, documents,
+                                                 embeddings, len(chunks))):
+                    return
+        except Exception as e:
+            self._fail("embed", e)
+        finally:
+            self._put(self.to_write, _DONE)
+
+    def write(self, progress):
+        """Runs on the calling thread"""
+        while not self.failed.is_set():
+            try:
+                item = self.to_write.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                break
+            path, chunks_done, last, ids, documents, embeddings, n = item
+            try:
+                if ids:
+                    self.collection.upsert(ids=ids, documents=documents, embeddings=embeddings.tolist())
+            except Exception as e:
+                self._fail("write", e)
+                break
+            self.stats["chunks"] += n
+            self.stats["added"] += len(ids)
+            self.stats["unchanged"] += n - len(ids)
+            self.checkpoint.advance(path, chunks_done, done=last)
+            if last:
+                self.stats["files"] += 1
+            progress.update(n)
+
+    def run(self):
+        stages = [threading.Thread(target=self.read, name="kb-read", daemon=True),
+                  threading.Thread(target=self.embed, name="kb-embed", daemon=True)]
+        for stage in stages:
+            stage.start()
+        with tqdm(desc="Processing", unit="chunk") as progress:
+            self.write(progress)
+        for stage in stages:
+            stage.join(timeout=5)
+        self.checkpoint.save()
+
+
+def prune_stale(collection, seen_ids, page=5000):
+    """Delete chunks no longer produced by any input file"""
+    stale = []
+    offset = 0
+    while True:
+        ids = collection.get(include=[], limit=page, offset=offset)["ids"]
+        if not ids:
+            break
+        stale += [cid for cid in ids if cid not in seen_ids]
+        offset += len(ids)
+    for i in range(0, len(stale), page):
+        collection.delete(ids=stale[i:i + page])
+    return len(stale)
+
+
+# ================================
+# MAIN
+# ================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Load knowledge-base files into ChromaDB")
+    parser.add_argument("paths", nargs="*", default=[DATA_FILE], help="files or directories to load")
+    parser.add_argument("--collection", default="docs")
+    parser.add_argument("--chroma-path", default=CHROMA_PATH)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <chroma-path>/load_<collection>.checkpoint.json)")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint of an interrupted run")
+    parser.add_argument("--no-prune", action="store_true", help="keep chunks that are no longer in the input")
+    parser.add_argument("--skip-test", action="store_true", help="skip the test query at the end")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("📚 LOADING KNOWLEDGE BASE INTO RAG SYSTEM")
+    print("=" * 70)
+
+    files = list_files(args.paths)
+    if not files:
+        print(f"\n❌ ERROR: No data files found in {args.paths}")
+        print("Please ensure your data file exists at this location.")
+        raise SystemExit(1)
+    total_bytes = sum(os.path.getsize(f) for f in files)
+    print(f"\n📖 {len(files)} files, {total_bytes / 1024 / 1024:,.1f} MB")
+
+    # Detect GPU
+    if torch.cuda.is_available():
+        device = 'cuda'
+        print(f"✅ GPU: {torch.cuda.get_device_name(0)}")
+    elif torch.backends.mps.is_available():
+        device = 'mps'
+        print("✅ Apple Silicon GPU detected")
     else:
-        print("❌ Cancelled")
-        exit(0)
-
-# Read data file
-print(f"\n📖 Reading: {DATA_FILE}")
-with open(DATA_FILE, 'r', encoding='utf-8') as f:
-    text = f.read()
-
-print(f"✅ Loaded {len(text):,} characters")
-
-# Chunk the text
-def chunk_text(text, chunk_size=384, overlap=50):
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), chunk_size - overlap):
-        chunk = ' '.join(words[i:i + chunk_size])
-        if chunk.strip():
-            chunks.append(chunk.strip())
-    return chunks
-
-print(f"\n✂️ Chunking text...")
-chunks = chunk_text(text, CHUNK_SIZE)
-print(f"✅ Created {len(chunks):,} chunks")
-
-# Generate embeddings and add to ChromaDB
-print(f"\n🔥 Generating embeddings...")
-import time
-start = time.time()
-
-for i in tqdm(range(0, len(chunks), BATCH_SIZE), desc="Processing"):
-    batch = chunks[i:i + BATCH_SIZE]
-    ids = [f"doc_{i+j}" for j in range(len(batch))]
-    
-    with torch.no_grad():
-        embeddings = embedder.encode(
-            batch,
-            device=device,
-            show_progress_bar=False,
-            convert_to_numpy=True,
-            normalize_embeddings=True,
-            batch_size=BATCH_SIZE
-        )
-    
-    collection.add(
-        ids=ids,
-        documents=batch,
-        embeddings=embeddings.tolist()
+        device = 'cpu'
+        print("⚠️ Using CPU (slower)")
+
+    # Load embedding model
+    print(f"\n📦 Loading embedding model ({EMBED_BACKEND})...")
+    embedder, device, backend = load_embedder(EMBED_MODEL, device, EMBED_BACKEND)
+
+    # Connect to ChromaDB
+    print(f"\n🔗 Connecting to ChromaDB: {args.chroma_path}")
+    chroma_client = chromadb.PersistentClient(path=args.chroma_path)
+    collection = chroma_client.get_or_create_collection(args.collection)
+    print(f"📊 Current documents: {collection.count():,}")
+
+    checkpoint = Checkpoint(
+        args.checkpoint or os.path.join(args.chroma_path, f"load_{args.collection}.checkpoint.json"),
+        restart=args.restart
     )
+    store = EmbeddingStore(model_key(EMBED_MODEL, backend))
+    budget = model_token_budget(embedder)
+    chunker = Chunker(min(CHUNK_TOKENS or budget, budget), CHUNK_OVERLAP_TOKENS, token_counter(embedder))
+    pipeline = Pipeline(files, collection, embedder, device, store, checkpoint, args.batch_size, chunker)
+
+    print(f"\n🔥 Generating embeddings...")
+    start = time.time()
+    try:
+        pipeline.run()
+    except KeyboardInterrupt:
+        pipeline.failed.set()
+        checkpoint.save()
+        print("\n⏸️ Interrupted - run again to resume")
+        raise SystemExit(130)
+    if pipeline.error:
+        print(f"\n❌ Failed in {pipeline.error} - run again to resume")
+        raise SystemExit(1)
+
+    removed = 0
+    if not args.no_prune:
+        if pipeline.resumed:
+            print("⚠️ Resumed run: stale chunks are pruned on the next full run")
+        else:
+            removed = prune_stale(collection, pipeline.seen_ids)
+    checkpoint.clear()
+
+    elapsed = time.time() - start
+    stats = pipeline.stats
+    print(f"\n✅ COMPLETE!")
+    print(f"   Documents: {collection.count():,} ({stats['added']:,} added, {stats['unchanged']:,} unchanged, "
+          f"{stats['skipped']:,} resumed past, {removed:,} removed)")
+    print(f"   Time: {elapsed:.1f}s")
+    if elapsed > 0:
+        print(f"   Speed: {stats['chunks'] / elapsed:.1f} docs/sec ({total_bytes / 1024 / 1024 / elapsed:.1f} MB/s)")
+
+    if args.skip_test:
+        return
+
+    # Test query
+    print(f"\n🧪 Testing...")
+    test = "What services do you provide?"
+    q_emb = pipeline.encode([test])[0].tolist()
+
+    results = collection.query(query_embeddings=[q_emb], n_results=3)
+    print(f"✅ Query test successful - found {len(results['documents'][0])} results")
+
+    print("\n" + "=" * 70)
+    print("✅ KNOWLEDGE BASE IS READY!")
+    print("=" * 70)
+    print("\nYou can now start your server:")
+    print("  uvicorn main:app --host 0.0.0.0 --port 9001")
+
 
-elapsed = time.time() - start
-print(f"\n✅ COMPLETE!")
-print(f"   Documents: {collection.count():,}")
-print(f"   Time: {elapsed:.1f}s")
-print(f"   Speed: {len(chunks)/elapsed:.1f} docs/sec")
-
-# Test query
-print(f"\n🧪 Testing...")
-test = "What services do you provide?"
-with torch.no_grad():
-    q_emb = embedder.encode([test], device=device, convert_to_numpy=True, normalize_embeddings=True)[0].tolist()
-
-results = collection.query(query_embeddings=[q_emb], n_results=3)
-print(f"✅ Query test successful - found {len(results['documents'][0])} results")
-
-print("\n" + "=" * 70)
-print("✅ KNOWLEDGE BASE IS READY!")
-print("=" * 70)
-print("\nYou can now start your server:")
-print("  uvicorn main:app --host 0.0.0.0 --port 9001")
+if __name__ == "__main__":
+    main()
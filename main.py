@@ -7,11 +7,14 @@ Central application setup and API endpoints
 import os
 import asyncio
 import time
-import re
+import threading
 from typing import Dict, Optional, List
 from datetime import datetime as dt
 
-from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, HTTPException, Depends, Security
+from fastapi import (
+    FastAPI, Request, WebSocket, WebSocketDisconnect, HTTPException, Depends, Security,
+    UploadFile, File, Form
+)
 from fastapi.responses import Response, PlainTextResponse
 from fastapi.security import APIKeyHeader
 from fastapi.middleware.cors import CORSMiddleware
@@ -22,27 +25,43 @@ import torch
 
 # Import all submodules
 from models import (
-    Agent, Conversation, WebhookConfig, PhoneNumber, KnowledgeBase, AgentTool,
+    Agent, Conversation, WebhookConfig, PhoneNumber, KnowledgeBase, AgentTool, IngestionJob,
     SessionLocal, get_db
 )
 from schemas import (
     CallRequest, AgentCreate, AgentUpdate, OutboundCallRequest,
-    WebhookCreate, WebhookResponse, ToolCreate
+    WebhookCreate, WebhookResponse, ToolCreate, KnowledgeIndexSettings, KnowledgeSnapshotRequest
 )
 from utils import (
-    _logger, JWT_SECRET, API_KEYS, WEBHOOK_EVENTS, DEVICE, PUBLIC_URL,
-    TWILIO_PHONE_NUMBER, twilio_client, embedder, collection, chroma_client,
-    DEEPGRAM_VOICE, OLLAMA_MODEL, TOP_K, CHUNK_SIZE, SILENCE_THRESHOLD_SEC,
+    _logger, JWT_SECRET, API_KEYS, WEBHOOK_EVENTS, DEVICE, EMBED_BACKEND, RAG_GATE, PUBLIC_URL,
+    TWILIO_PHONE_NUMBER,
+    DEEPGRAM_VOICE, OLLAMA_MODEL, TOP_K, INGEST_MAX_FILE_MB, SILENCE_THRESHOLD_SEC,
     UTTERANCE_END_MS, ENABLE_INTERIM_PROCESSING, INTERIM_MIN_LENGTH,
-    INTERIM_CONFIDENCE_THRESHOLD, generate_agent_id, generate_conversation_id,
-    clean_markdown_for_tts, detect_intent, detect_confirmation_response,
-    parse_llm_response, send_webhook, send_webhook_and_get_response,
-    _chunk_text
+    INTERIM_CONFIDENCE_THRESHOLD, NATIVE_TOOL_CALLING, generate_agent_id, generate_conversation_id,
+    detect_intent, detect_confirmation_response, is_backchannel,
+    parse_llm_response, send_webhook_and_get_response,
+    chunker, chroma_client, EMBED_MODEL_KEY, CHROMA_HNSW_METADATA, KB_SNAPSHOT_DIR
 )
 from voice_pipeline import (
-    manager, stream_tts_worker, setup_streaming_stt, speak_text_streaming,
-    ConnectionManager, audioop
+    manager, stream_tts_worker, setup_streaming_stt, speak_text_streaming, wait_for_playback,
+    take_parked_playback, resume_parked_playback, parked_awaits_answer,
+    resolve_tts_voice, ConnectionManager, audioop
+)
+from tts_normalizer import SentenceStream, normalize_for_tts
+from tool_calls import (
+    StreamingToolCallDetector, build_tool_schemas, native_tool_call_to_tool_data,
+    can_dispatch_early
 )
+from tool_executor import tool_executor
+from webhook_delivery import webhook_dispatcher
+from twilio_control import call_control
+from embeddings import embedding_service
+from ingestion import ingestion_worker, index_chunks, generate_job_id, generate_document_id, parse_stats
+from document_parsing import detect_format, UnsupportedFormat
+import kb_snapshot
+from retrieval import retrieve, collections, agent_collection_name, cache_stats, QUANTIZATION_MODES
+import retrieval_gate
+import metrics
 
 # Global call data storage
 pending_call_data: Dict[str, Dict] = {}
@@ -85,6 +104,21 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def start_background_workers():
+    await webhook_dispatcher.start()
+    await ingestion_worker.start()
+
+
+@app.on_event("shutdown")
+async def close_shared_clients():
+    await webhook_dispatcher.stop()
+    await ingestion_worker.stop()
+    await tool_executor.close()
+    call_control.shutdown()
+    embedding_service.stop()
+
+
 # ================================
 # HELPER FUNCTIONS
 # ================================
@@ -94,8 +128,9 @@ async def end_call_tool(call_sid: str, reason: str = "user_goodbye") -> dict:
     _logger.info(f"📞 END_CALL: call_sid={call_sid}, reason={reason}")
 
     try:
-        await asyncio.sleep(1.5)
-        call = twilio_client.calls(call_sid).update(status="completed")
+        # Hang up as soon as the goodbye has actually been heard
+        await wait_for_playback(call_sid, timeout=10.0)
+        await call_control.update_call(call_sid, status="completed")
         await manager.disconnect(call_sid)
 
         return {
@@ -126,7 +161,7 @@ async def transfer_call_tool(call_sid: str, department: str = "sales") -> dict:
             return {"success": False, "error": "Connection not found"}
 
         _logger.info("⏳ Waiting for transfer message to be spoken...")
-        await asyncio.sleep(3.0)
+        await wait_for_playback(call_sid, timeout=15.0)
 
         conn.interrupt_requested = True
 
@@ -137,21 +172,14 @@ async def transfer_call_tool(call_sid: str, department: str = "sales") -> dict:
             except:
                 break
 
-        try:
-            if conn.stream_sid:
-                await conn.ws.send_json({
-                    "event": "clear",
-                    "streamSid": conn.stream_sid
-                })
-        except:
-            pass
+        await manager.send_clear(call_sid)
 
         twiml = f"""<?xml version="1.0" encoding="UTF-8"?>
 <Response>
     <Dial>{transfer_number}</Dial>
 </Response>"""
 
-        twilio_client.calls(call_sid).update(twiml=twiml)
+        await call_control.update_call(call_sid, twiml=twiml)
 
         _logger.info(f"✅ Transfer completed to {department} ({transfer_number})")
 
@@ -168,57 +196,13 @@ async def transfer_call_tool(call_sid: str, department: str = "sales") -> dict:
 
 
 async def call_webhook_tool(webhook_url: str, tool_name: str, parameters: dict, call_context: dict) -> dict:
-    """Call external webhook tool"""
-    try:
-        payload = {
-            "tool_name": tool_name,
-            "parameters": parameters,
-            "call_context": call_context,
-            "timestamp": dt.utcnow().isoformat()
-        }
-        
-        _logger.info(f"🔧 Calling webhook tool: {tool_name} at {webhook_url}")
-        
-        import httpx
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                webhook_url,
-                json=payload,
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                _logger.info(f"✅ Webhook tool response: {result}")
-                return {
-                    "success": True,
-                    "tool_name": tool_name,
-                    "response": result.get("response", result),
-                    "data": result.get("data", {}),
-                    "message": result.get("message", "")
-                }
-            else:
-                _logger.error(f"❌ Webhook returned status {response.status_code}")
-                return {
-                    "success": False,
-                    "error": f"Webhook returned status {response.status_code}",
-                    "tool_name": tool_name
-                }
-                
-    except asyncio.TimeoutError:
-        _logger.error(f"❌ Webhook timeout for {tool_name}")
-        return {
-            "success": False,
-            "error": "Tool request timed out",
-            "tool_name": tool_name
-        }
-    except Exception as e:
-        _logger.error(f"❌ Webhook error for {tool_name}: {e}")
-        return {
-            "success": False,
-            "error": str(e),
-            "tool_name": tool_name
-        }
+    """Call external webhook tool (pooled, with timeout and circuit breaker)"""
+    return await tool_executor.call(
+        {"tool_name": tool_name, "webhook_url": webhook_url},
+        parameters,
+        call_context,
+        agent_id=call_context.get("agent_id") or ""
+    )
 
 
 async def execute_detected_tool(call_sid: str, tool_data: dict) -> dict:
@@ -237,54 +221,26 @@ async def execute_detected_tool(call_sid: str, tool_data: dict) -> dict:
         if not conn or not conn.agent_id:
             return {"success": False, "error": f"Unknown tool: {tool_name}"}
         
-        db = SessionLocal()
-        try:
-            tool = db.query(AgentTool).filter(
-                AgentTool.agent_id == conn.agent_id,
-                AgentTool.tool_name == tool_name,
-                AgentTool.is_active == True
-            ).first()
-            
-            if not tool or not tool.webhook_url:
-                return {"success": False, "error": f"Unknown or inactive tool: {tool_name}"}
-            
-            call_context = {
+        call_context = {
+            "call_sid": call_sid,
+            "agent_id": conn.agent_id,
+            "conversation_id": conn.conversation_id,
+            "phone_number": None,
+            "dynamic_variables": conn.dynamic_variables or {}
+        }
+
+        result = await tool_executor.execute(conn.agent_id, tool_name, params, call_context)
+
+        # Unknown tools are never sent to a webhook, so there is nothing to report
+        if result.get("tool_name"):
+            webhook_dispatcher.emit("tool.called", conn.agent_id, {
                 "call_sid": call_sid,
                 "agent_id": conn.agent_id,
-                "conversation_id": conn.conversation_id,
-                "phone_number": None,
-                "dynamic_variables": conn.dynamic_variables or {}
-            }
-            
-            result = await call_webhook_tool(
-                webhook_url=tool.webhook_url,
-                tool_name=tool_name,
-                parameters=params,
-                call_context=call_context
-            )
-            
-            webhooks = db.query(WebhookConfig).filter(
-                WebhookConfig.agent_id == conn.agent_id,
-                WebhookConfig.is_active == True
-            ).all()
-            
-            for webhook in webhooks:
-                if "tool.called" in webhook.events:
-                    await send_webhook(
-                        webhook.webhook_url,
-                        "tool.called",
-                        {
-                            "call_sid": call_sid,
-                            "agent_id": conn.agent_id,
-                            "tool_name": tool_name,
-                            "parameters": params,
-                            "result": result,
-                            "timestamp": dt.utcnow().isoformat()
-                        }
-                    )
-            
-        finally:
-            db.close()
+                "tool_name": tool_name,
+                "parameters": params,
+                "result": result,
+                "timestamp": dt.utcnow().isoformat()
+            })
 
     return result
 
@@ -330,32 +286,36 @@ async def query_rag_streaming(
 
     loop = asyncio.get_running_loop()
 
-    def _embed_and_query():
-        with torch.no_grad():
-            query_embedding = embedder.encode(
-                [question],
-                device=DEVICE,
-                show_progress_bar=False,
-                convert_to_numpy=True,
-                normalize_embeddings=True,
-                batch_size=1
-            )[0].tolist()
-
-            return collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k * 2
-            )
-
-    results = await loop.run_in_executor(None, _embed_and_query)
-
-    raw_docs = results.get("documents", [[]])[0] if results else []
-    distances = results.get("distances", [[]])[0] if results else []
+    agent_tools = conn.agent_tools if conn else []
+    tool_schemas = build_tool_schemas(agent_tools) if NATIVE_TOOL_CALLING else []
+    native_tool_names = {schema["function"]["name"] for schema in tool_schemas}
+
+    # Skip retrieval for fillers, confirmations and small talk; reuse it for follow-ups
+    decision, reason = "retrieve", "gate_disabled"
+    if RAG_GATE:
+        decision, reason = retrieval_gate.decide(
+            question, history,
+            pending_action=conn.pending_action if conn else None,
+            agent_id=conn.agent_id if conn else None,
+            has_previous_context=bool(conn and conn.last_rag_chunks)
+        )
 
-    # Simple relevance filtering
-    relevant_chunks = []
-    for doc, dist in zip(raw_docs, distances):
-        if dist <= 1.3:  # Simple threshold
-            relevant_chunks.append(doc)
+    if decision == "retrieve":
+        # Search the agent's own knowledge base (falls back to the shared one)
+        # (reusing the speculative result from the caller's interim transcripts)
+        t_retrieval = time.perf_counter()
+        if conn:
+            relevant_chunks = await loop.run_in_executor(None, conn.speculative_rag.take, question, conn.agent_id, top_k)
+            conn.last_rag_chunks = relevant_chunks
+        else:
+            relevant_chunks = await loop.run_in_executor(None, retrieve, question, None, top_k)
+        retrieval_gate.record(decision, reason, (time.perf_counter() - t_retrieval) * 1000)
+    else:
+        if conn:
+            conn.speculative_rag.reset()
+        relevant_chunks = conn.last_rag_chunks if decision == "reuse" else []
+        retrieval_gate.record(decision, reason)
+        _logger.info(f"🚦 Retrieval {decision} ({reason})")
 
     # Use top 3 most relevant
     context_text = "\n".join(relevant_chunks[:3])
@@ -419,6 +379,19 @@ Today is {current_date}.{vars_section}
 ## User's Current Question:
 {question}"""
     else:
+        if NATIVE_TOOL_CALLING:
+            # Only point the model at tools it was actually given
+            meeting_instruction = "call the meeting_call tool" if "meeting_call" in native_tool_names else None
+            end_call_instruction = "call the end_call tool"
+        else:
+            meeting_instruction = "[TOOL:meeting_call:DATE:TIMEZONE:address]"
+            end_call_instruction = "output: [TOOL:end_call]"
+        if meeting_instruction:
+            meeting_steps = f"""- After getting details: {meeting_instruction}
+- If valid=true: confirm scheduled, else: apologize and reschedule"""
+        else:
+            meeting_steps = "- After getting details: confirm them back and say the team will send an invite"
+
         prompt = f"""You are MILA, a friendly voice assistant for Technology Mindz. Technology Mindz provides key services: Salesforce, AI, Managed IT, Cybersecurity, Microsoft Dynamics 365, Staff Augmentation, CRM Consulting, Web Development, Mobile App Development.
 
 ## Current Date (America/New_York):
@@ -448,11 +421,10 @@ Today is {current_date}.
 ## MEETING SCHEDULING:
 - When relevant, offer to schedule meetings
 - Ask for: date, time, timezone (only FUTURE dates)
-- After getting details: [TOOL:meeting_call:DATE:TIMEZONE:address]
-- If valid=true: confirm scheduled, else: apologize and reschedule
+{meeting_steps}
 
 ## ENDING CALLS:
-- If they want to end ("bye", "that's all", "talk later"), output: [TOOL:end_call]
+- If they want to end ("bye", "that's all", "talk later"), {end_call_instruction}
 
 ## Previous Conversation:
 {history_text if history_text else "This is the start of the call."}
@@ -483,33 +455,72 @@ Respond naturally and briefly:"""
                 except:
                     pass  # If that fails, just drop the item
 
+    llm_options = {
+        "temperature": 0.2,
+        "num_predict": 1200,
+        "top_k": 40,
+        "top_p": 0.9,
+        "num_ctx": 1024,
+        "num_thread": 8,
+        "repeat_penalty": 1.2,
+        "repeat_last_n": 128,
+        "num_gpu": 99,
+        "stop": ["\nUser:", "\nAssistant:", "User:"],
+    }
+    # Set on barge-in (handle_interrupt) or when the consumer stops early
+    cancel = threading.Event()
+    if conn:
+        conn.generation_cancel = cancel
+
     def _producer():
         nonlocal full_response
+        stream = None
         try:
-            for chunk in ollama.generate(
-                model=model_to_use,
-                prompt=prompt,
-                stream=True,
-                options={
-                    "temperature": 0.2,
-                    "num_predict": 1200,
-                    "top_k": 40,
-                    "top_p": 0.9,
-                    "num_ctx": 1024,
-                    "num_thread": 8,
-                    "repeat_penalty": 1.2,
-                    "repeat_last_n": 128,
-                    "num_gpu": 99,
-                    "stop": ["\nUser:", "\nAssistant:", "User:"],
-                }
-            ):
-                token = chunk.get("response")
-                if token:
-                    full_response += token
-                    loop.call_soon_threadsafe(_safe_put, token)
+            if NATIVE_TOOL_CALLING:
+                # Structured tool calls arrive as complete objects in the stream
+                stream = ollama.chat(
+                    model=model_to_use,
+                    messages=[{"role": "user", "content": prompt}],
+                    tools=tool_schemas,
+                    stream=True,
+                    options=llm_options
+                )
+                for chunk in stream:
+                    if cancel.is_set():
+                        break
+                    message = chunk.get("message") or {}
+                    token = message.get("content")
+                    if token:
+                        full_response += token
+                        loop.call_soon_threadsafe(_safe_put, token)
+                    for call in message.get("tool_calls") or []:
+                        tool_data = native_tool_call_to_tool_data(call, agent_tools)
+                        if tool_data:
+                            loop.call_soon_threadsafe(_safe_put, {"__tool_call__": tool_data})
+            else:
+                stream = ollama.generate(
+                    model=model_to_use,
+                    prompt=prompt,
+                    stream=True,
+                    options=llm_options
+                )
+                for chunk in stream:
+                    if cancel.is_set():
+                        break
+                    token = chunk.get("response")
+                    if token:
+                        full_response += token
+                        loop.call_soon_threadsafe(_safe_put, token)
+            if cancel.is_set():
+                _logger.info("🛑 LLM generation cancelled")
+                metrics.counter("llm_generations_cancelled").inc()
             loop.call_soon_threadsafe(_safe_put, None)
         except Exception as e:
             loop.call_soon_threadsafe(_safe_put, {"__error__": str(e)})
+        finally:
+            # Closing the stream generator drops the HTTP response, which stops Ollama generating
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
 
     loop.run_in_executor(None, _producer)
 
@@ -522,11 +533,14 @@ Respond naturally and briefly:"""
                 yield "I'm having trouble responding right now. Could you repeat that?"
                 return
 
-            # Yield tokens immediately (consumer will decide when to speak)
+            # Yield tokens (str) and structured tool calls (dict) immediately;
+            # the consumer decides when to speak and when to dispatch
             yield item
 
     except Exception as e:
         yield "I'm having trouble answering right now. Could you repeat that?"
+    finally:
+        cancel.set()
 
 
 async def save_conversation_transcript(call_sid: str, conn):
@@ -595,31 +609,15 @@ async def handle_call_end(call_sid: str, reason: str):
             
             db.commit()
             
-            webhooks = db.query(WebhookConfig).filter(
-                WebhookConfig.is_active == True
-            ).all()
-            
-            for webhook in webhooks:
-                should_send = False
-                if webhook.agent_id is None:
-                    should_send = True
-                elif conversation.agent_id and webhook.agent_id == conversation.agent_id:
-                    should_send = True
-                
-                if should_send and ("call.ended" in webhook.events or not webhook.events):
-                    await send_webhook(
-                        webhook.webhook_url,
-                        "call.ended",
-                        {
-                            "conversation_id": call_sid,
-                            "agent_id": conversation.agent_id,
-                            "duration_secs": conversation.duration_secs,
-                            "ended_reason": reason,
-                            "transcript": conversation.transcript,
-                            "phone_number": conversation.phone_number,
-                            "status": "completed"
-                        }
-                    )
+            webhook_dispatcher.emit("call.ended", conversation.agent_id, {
+                "conversation_id": call_sid,
+                "agent_id": conversation.agent_id,
+                "duration_secs": conversation.duration_secs,
+                "ended_reason": reason,
+                "transcript": conversation.transcript,
+                "phone_number": conversation.phone_number,
+                "status": "completed"
+            })
             
             _logger.info(f"✅ Call ended: {call_sid} - {reason}")
         else:
@@ -730,6 +728,15 @@ async def process_streaming_transcript(call_sid: str):
     try:
         text = conn.stt_transcript_buffer.strip()
 
+        parked = take_parked_playback(conn)
+        if parked and is_backchannel(text) and not parked_awaits_answer(conn, parked):
+            _logger.info(f"🔁 Backchannel after interrupt ('{text}') - resuming previous reply")
+            conn.stt_transcript_buffer = ""
+            conn.stt_is_final = False
+            conn.last_interim_text = ""
+            await resume_parked_playback(call_sid, parked)
+            return
+
         intent = detect_intent(text)
         conn.last_intent = intent
 
@@ -807,89 +814,138 @@ async def process_streaming_transcript(call_sid: str):
             return
 
         _logger.info(f"📝 USER INPUT: '{text}'")
+        webhook_dispatcher.emit("transcript.final", conn.agent_id, {
+            "call_sid": call_sid,
+            "agent_id": conn.agent_id,
+            "text": text,
+            "timestamp": dt.utcnow().isoformat()
+        })
 
         t_start = time.time()
+        conn.playback.start_turn()
 
         response_buffer = ""
-        sentence_buffer = ""
         sentence_count = 0
         MAX_SENTENCES = 10
+        voice_id, _ = resolve_tts_voice(conn)
+        sentence_stream = SentenceStream(voice_id)
+        tool_detector = StreamingToolCallDetector(conn.agent_tools)
+        deferred_tool: Optional[dict] = None
+        early_tool_tasks: List[asyncio.Task] = []
+        generation_interrupted = False
+
+        async def queue_sentence(sentence: str) -> bool:
+            """Queue one sentence for TTS; False if the turn was interrupted"""
+            nonlocal sentence_count
+            sentence_count += 1
+            _logger.info("🎯 Sentence %d: '%s'", sentence_count, sentence)
+            try:
+                await asyncio.wait_for(conn.tts_queue.put(sentence), timeout=2.0)
+            except asyncio.TimeoutError:
+                if conn.interrupt_requested:
+                    return False
+            except Exception as e:
+                if conn.interrupt_requested:
+                    return False
+            return True
 
-        async for token in query_rag_streaming(text, conn.conversation_history, call_sid=call_sid):
+        async for item in query_rag_streaming(text, conn.conversation_history, call_sid=call_sid):
             if conn.interrupt_requested:
                 _logger.info("⭐ Generation interrupted")
+                generation_interrupted = True
                 break
 
-            token = re.sub(r'\[(?:TOOL|CONFIRM_TOOL):[^\]]+\]', '', token)
-
-            response_buffer += token
-            sentence_buffer += token
-
-            if sentence_buffer.rstrip().endswith(('.', '?', '!')):
-                sentence = sentence_buffer.strip()
+            if isinstance(item, dict):
+                token, tool_calls = "", [item["__tool_call__"]]
+            else:
+                response_buffer += item
+                token, tool_calls = tool_detector.feed(item)
 
-                if sentence:
-                    clean_sentence = clean_markdown_for_tts(sentence)
-                    sentence_count += 1
-                    _logger.info("🎯 Sentence %d: '%s'",
-                                 sentence_count, clean_sentence)
+            for clean_sentence in sentence_stream.feed(token):
+                if not await queue_sentence(clean_sentence):
+                    break
 
-                    try:
-                        await asyncio.wait_for(conn.tts_queue.put(clean_sentence), timeout=2.0)
-                    except asyncio.TimeoutError:
-                        if conn.interrupt_requested:
-                            break
-                    except Exception as e:
-                        if conn.interrupt_requested:
-                            break
+            for tool_data in tool_calls:
+                _logger.info("🧠 Tool detected: %s", tool_data.get('tool'))
+                if can_dispatch_early(tool_data):
+                    # Speak what precedes the call now and run the tool while it plays
+                    preceding = sentence_stream.flush()
+                    if preceding and sentence_count < MAX_SENTENCES:
+                        await queue_sentence(preceding)
+                    _logger.info("⚡ Dispatching tool early: %s", tool_data['tool'])
+                    early_tool_tasks.append(
+                        asyncio.create_task(execute_detected_tool(call_sid, tool_data))
+                    )
+                elif deferred_tool is None:
+                    deferred_tool = tool_data
 
-                sentence_buffer = ""
+            if sentence_count >= MAX_SENTENCES or conn.interrupt_requested:
+                break
 
-                if sentence_count >= MAX_SENTENCES:
-                    break
+        final_sentence = sentence_stream.flush()
+        held_back = tool_detector.flush()
+        if held_back:
+            final_sentence = " ".join(filter(None, [final_sentence, normalize_for_tts(held_back, voice_id)]))
+        if not conn.interrupt_requested and sentence_count < MAX_SENTENCES and final_sentence:
+            _logger.info("🎯 Final: '%s'", final_sentence)
+            try:
+                await asyncio.wait_for(conn.tts_queue.put(final_sentence), timeout=2.0)
+            except asyncio.TimeoutError:
+                _logger.warning("TTS queue full")
+            except Exception as e:
+                _logger.error(f"Error queuing final: {e}")
 
-        if not conn.interrupt_requested and sentence_buffer.strip():
-            final_sentence = sentence_buffer.strip()
-            if final_sentence and not re.match(r'^\s*\[\w+:[^\]]*\]\s*$', final_sentence):
-                clean_final = clean_markdown_for_tts(final_sentence)
-                _logger.info("🎯 Final: '%s'", clean_final)
-                try:
-                    await asyncio.wait_for(conn.tts_queue.put(clean_final), timeout=2.0)
-                except asyncio.TimeoutError:
-                    _logger.warning("TTS queue full")
-                except Exception as e:
-                    _logger.error(f"Error queuing final: {e}")
+        cleaned_response, _ = parse_llm_response(response_buffer)
+        latency_ms = round((time.time() - t_start) * 1000)
 
-        cleaned_response, tool_data = parse_llm_response(response_buffer)
-        
-        if not conn.interrupt_requested and response_buffer.strip():
-            conn.conversation_history.append({
+        # Recorded now so tools see it; corrected to what was heard after playback
+        turn = None
+        if response_buffer.strip():
+            turn = {
                 "user": text,
                 "assistant": cleaned_response,
                 "timestamp": time.time()
-            })
+            }
+            conn.conversation_history.append(turn)
             _logger.info(f"✅ Added to conversation_history")
 
             if len(conn.conversation_history) > 10:
                 conn.conversation_history = conn.conversation_history[-10:]
 
-        if tool_data:
-            _logger.info("🧠 Tool detected: %s", tool_data.get('tool'))
+        if early_tool_tasks:
+            for tool_result in await asyncio.gather(*early_tool_tasks, return_exceptions=True):
+                _logger.info(f"🦾 Tool result: {tool_result}")
 
-            if tool_data.get("requires_confirmation"):
-                conn.pending_action = tool_data
+        if deferred_tool:
+            if deferred_tool.get("requires_confirmation"):
+                conn.pending_action = deferred_tool
             else:
                 _logger.info("⚡ Executing tool immediately...")
-                tool_result = await execute_detected_tool(call_sid, tool_data)
+                tool_result = await execute_detected_tool(call_sid, deferred_tool)
                 _logger.info(f"🦾 Tool result: {tool_result}")
 
         _logger.info("⏳ Waiting for TTS...")
-        max_wait = 30.0
-        wait_start = time.time()
-        while not conn.tts_queue.empty() and (time.time() - wait_start) < max_wait:
-            await asyncio.sleep(0.1)
+        await wait_for_playback(call_sid, timeout=30.0)
         _logger.info("✅ TTS completed")
 
+        if turn is not None:
+            heard = conn.playback.cut_text
+            if heard is None and generation_interrupted:
+                heard = conn.playback.heard_text()
+            if heard is not None:
+                turn["assistant"] = heard
+                turn["interrupted"] = True
+                _logger.info(f"✂️ Assistant turn truncated to heard text: '{heard}'")
+            webhook_dispatcher.emit("agent.response", conn.agent_id, {
+                "call_sid": call_sid,
+                "agent_id": conn.agent_id,
+                "user_text": text,
+                "response": turn["assistant"],
+                "interrupted": turn.get("interrupted", False),
+                "latency_ms": latency_ms,
+                "timestamp": dt.utcnow().isoformat()
+            })
+
         t_end = time.time()
         _logger.info("✅ TOTAL TIME: %.1fms", (t_end - t_start) * 1000)
 
@@ -1059,6 +1115,9 @@ async def initiate_outbound_call(
         
         if not agent:
             raise HTTPException(status_code=404, detail=f"Agent not found: {request.agent_id}")
+
+        # Load the agent's knowledge indexes while the phone rings
+        collections.prefetch(agent_collection_name(request.agent_id))
         
         client_data = request.conversation_initiation_client_data or {}
         dynamic_variables = client_data.get("dynamic_variables", {})
@@ -1083,7 +1142,7 @@ async def initiate_outbound_call(
         webhook_url = f"{PUBLIC_URL.rstrip('/')}/voice/outbound"
         status_callback_url = f"{PUBLIC_URL.rstrip('/')}/voice/status"
         
-        call = twilio_client.calls.create(
+        call = await call_control.create_call(
             to=request.to_number,
             from_=phone_number_to_use,
             url=webhook_url,
@@ -1304,6 +1363,7 @@ async def media_ws(websocket: WebSocket):
                             
                             if agent:
                                 conn.agent_id = agent_id
+                                collections.prefetch(agent_collection_name(agent_id))
                                 conn.agent_config = {
                                     "system_prompt": agent.system_prompt,
                                     "first_message": agent.first_message,
@@ -1317,6 +1377,8 @@ async def media_ws(websocket: WebSocket):
 
                                 if call_data.get("custom_first_message"):
                                     conn.agent_config["first_message"] = call_data["custom_first_message"]
+
+                                conn.agent_tools = list(tool_executor.get_tools(agent_id).values())
                         
                         conversation = db.query(Conversation).filter(
                             Conversation.conversation_id == current_call_sid
@@ -1367,7 +1429,9 @@ async def media_ws(websocket: WebSocket):
                 else:
                     greeting = "Hello! How can I help you today?"
 
-                await speak_text_streaming(current_call_sid, greeting)
+                # Run as a task: playback completion is signalled by mark
+                # events that this receive loop has to keep reading
+                asyncio.create_task(speak_text_streaming(current_call_sid, greeting))
                 
                 if conn and greeting:
                     conn.conversation_history.append({
@@ -1497,6 +1561,11 @@ async def media_ws(websocket: WebSocket):
                     except Exception as e:
                         _logger.error(f"Error processing media: {e}")
 
+            elif event == "mark":
+                conn = manager.get(current_call_sid) if current_call_sid else None
+                if conn:
+                    conn.playback.on_mark(data.get("mark", {}).get("name"))
+
             elif event == "stop":
                 break
 
@@ -1556,6 +1625,7 @@ async def gpu_status():
     """GPU status endpoint"""
     status = {
         "device": str(DEVICE),
+        "embed_backend": EMBED_BACKEND,
         "torch_version": torch.__version__,
         "cuda_available": torch.cuda.is_available(),
     }
@@ -1609,6 +1679,7 @@ async def create_webhook(
     db.add(webhook)
     db.commit()
     db.refresh(webhook)
+    await asyncio.to_thread(webhook_dispatcher.subscriptions.rebuild)
     
     _logger.info(f"✅ Created webhook: {webhook.id}")
     
@@ -1651,6 +1722,12 @@ async def list_webhooks(
     }
 
 
+@app.get("/v1/convai/webhooks/deliveries", tags=["Webhooks"])
+async def webhook_delivery_status(api_key: str = Depends(verify_api_key)):
+    """Outbox counts by status and age of the oldest undelivered event"""
+    return webhook_dispatcher.status()
+
+
 @app.delete("/v1/convai/webhooks/{webhook_id}", tags=["Webhooks"])
 async def delete_webhook(
     webhook_id: int,
@@ -1665,6 +1742,7 @@ async def delete_webhook(
     
     webhook.is_active = False
     db.commit()
+    await asyncio.to_thread(webhook_dispatcher.subscriptions.rebuild)
     
     return {"success": True, "message": "Webhook deleted"}
 
@@ -1793,57 +1871,180 @@ async def add_knowledge(
     agent_id: str,
     content: str,
     metadata: Optional[Dict] = None,
+    document_id: Optional[str] = None,
     db: Session = Depends(get_db),
     api_key: str = Depends(verify_api_key)
 ):
-    """Add knowledge to agent's knowledge base"""
-    import uuid
-    import torch
+    """
+    Add knowledge to agent's knowledge base (small snippets; upload files via /knowledge-base/jobs)
     
+    Passing the document_id of an existing document replaces its content;
+    only chunks that changed are re-embedded.
+    """
     # Verify agent exists
     agent = db.query(Agent).filter(Agent.agent_id == agent_id).first()
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
     
-    doc_id = f"doc_{uuid.uuid4().hex[:16]}"
+    kb = None
+    if document_id:
+        kb = db.query(KnowledgeBase).filter(
+            KnowledgeBase.agent_id == agent_id,
+            KnowledgeBase.document_id == document_id
+        ).first()
+        if not kb:
+            raise HTTPException(status_code=404, detail="Document not found")
+    doc_id = document_id or generate_document_id()
     
     # Add to database
-    kb = KnowledgeBase(
-        agent_id=agent_id,
-        document_id=doc_id,
-        content=content,
-        kb_metadata=metadata
-    )
-    db.add(kb)
+    if kb:
+        kb.content = content
+        if metadata is not None:
+            kb.kb_metadata = metadata
+    else:
+        kb = KnowledgeBase(
+            agent_id=agent_id,
+            document_id=doc_id,
+            content=content,
+            kb_metadata=metadata
+        )
+        db.add(kb)
     db.commit()
     
     # Add to ChromaDB with agent prefix
-    chunks = _chunk_text(content, CHUNK_SIZE, overlap=50)
-    
-    with torch.no_grad():
-        embeddings = embedder.encode(
-            chunks, 
-            device=DEVICE, 
-            convert_to_numpy=True,
-            normalize_embeddings=True
-        ).tolist()
-    
-    # Use agent-specific collection
-    agent_collection = chroma_client.get_or_create_collection(f"agent_{agent_id}")
-    
-    agent_collection.add(
-        documents=chunks,
-        embeddings=embeddings,
-        ids=[f"{doc_id}_{i}" for i in range(len(chunks))],
-        metadatas=[{"agent_id": agent_id, "doc_id": doc_id} for _ in chunks]
-    )
+    chunks = await asyncio.to_thread(chunker.split, content)
+    result = await index_chunks(agent_id, doc_id, chunks)
     
-    _logger.info(f"✅ Added knowledge to agent {agent_id}: {len(chunks)} chunks")
+    _logger.info(f"✅ Added knowledge to agent {agent_id}: {result['chunks']} chunks "
+                 f"({result['added']} new, {result['removed']} removed)")
     
     return {
         "document_id": doc_id,
         "agent_id": agent_id,
-        "chunks_created": len(chunks)
+        "chunks_created": result["added"],
+        "chunks_removed": result["removed"],
+        "chunks_total": result["chunks"]
+    }
+
+
+@app.post("/v1/convai/agents/{agent_id}/knowledge-base/jobs", tags=["Knowledge Base"])
+async def create_ingestion_job(
+    agent_id: str,
+    files: List[UploadFile] = File(...),
+    metadata: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Upload one or more documents for background indexing
+    
+    Accepts PDF, HTML, DOCX, Markdown, CSV and plain text files. Files are
+    streamed to disk, parsed and indexed by the ingestion worker; poll
+    GET /v1/convai/knowledge-base/jobs/{job_id} for progress. `metadata` is
+    an optional JSON object stored with every document. A file with the same
+    name as an earlier upload replaces that document's chunks incrementally.
+    """
+    import json
+    
+    agent = db.query(Agent).filter(Agent.agent_id == agent_id).first()
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    
+    try:
+        doc_metadata = json.loads(metadata) if metadata else None
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="metadata must be a JSON object")
+    if doc_metadata is not None and not isinstance(doc_metadata, dict):
+        raise HTTPException(status_code=400, detail="metadata must be a JSON object")
+    
+    # A file uploaded again under the same name updates that document in place
+    known_files = {
+        (doc.kb_metadata or {}).get("filename"): doc.document_id
+        for doc in db.query(KnowledgeBase.document_id, KnowledgeBase.kb_metadata).filter(
+            KnowledgeBase.agent_id == agent_id
+        ).all()
+        if isinstance(doc.kb_metadata, dict) and doc.kb_metadata.get("filename")
+    }
+    
+    try:
+        formats = [detect_format(upload.filename, upload.content_type) for upload in files]
+    except UnsupportedFormat as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    job_id = generate_job_id()
+    max_bytes = INGEST_MAX_FILE_MB * 1024 * 1024
+    documents = []
+    
+    try:
+        for index, upload in enumerate(files):
+            path = ingestion_worker.spool_path(job_id, index, upload.filename)
+            size = 0
+            with open(path, "wb") as out:
+                while True:
+                    block = await upload.read(1024 * 1024)
+                    if not block:
+                        break
+                    size += len(block)
+                    if size > max_bytes:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"{upload.filename} exceeds {INGEST_MAX_FILE_MB} MB"
+                        )
+                    await asyncio.to_thread(out.write, block)
+            documents.append({
+                "filename": upload.filename,
+                "path": path,
+                "bytes": size,
+                "document_id": known_files.get(upload.filename) or generate_document_id(),
+                "format": formats[index],
+                "metadata": doc_metadata,
+                "chunks": None,
+                "done": False
+            })
+    except HTTPException:
+        for index, upload in enumerate(files):
+            try:
+                os.remove(ingestion_worker.spool_path(job_id, index, upload.filename))
+            except OSError:
+                pass
+        raise
+    
+    job = ingestion_worker.create_job(job_id, agent_id, documents)
+    _logger.info(f"📥 Queued ingestion job {job_id}: {len(documents)} documents for agent {agent_id}")
+    
+    return ingestion_worker.describe(job)
+
+
+@app.get("/v1/convai/knowledge-base/jobs/{job_id}", tags=["Knowledge Base"])
+async def get_ingestion_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """Ingestion job status, progress and throughput"""
+    job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    
+    return ingestion_worker.describe(job)
+
+
+@app.get("/v1/convai/agents/{agent_id}/knowledge-base/jobs", tags=["Knowledge Base"])
+async def list_ingestion_jobs(
+    agent_id: str,
+    limit: int = 20,
+    db: Session = Depends(get_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """Most recent ingestion jobs for an agent"""
+    jobs = db.query(IngestionJob).filter(
+        IngestionJob.agent_id == agent_id
+    ).order_by(IngestionJob.created_at.desc()).limit(limit).all()
+    
+    return {
+        "agent_id": agent_id,
+        "jobs": [ingestion_worker.describe(job) for job in jobs],
+        "total": len(jobs)
     }
 
 
@@ -1899,17 +2100,129 @@ async def delete_agent_knowledge(
     
     # Remove from ChromaDB
     try:
-        agent_collection = chroma_client.get_or_create_collection(f"agent_{agent_id}")
+        agent_collection = collections.get(agent_collection_name(agent_id))
         # Get all IDs that start with this document_id
-        results = agent_collection.get(where={"doc_id": document_id})
+        results = agent_collection.get(where={"doc_id": document_id}) if agent_collection else None
         if results and results.get("ids"):
             agent_collection.delete(ids=results["ids"])
+            collections.modified(agent_collection_name(agent_id), removed=results["ids"])
     except Exception as e:
         _logger.warning(f"⚠️ Could not delete from ChromaDB: {e}")
     
     return {"success": True, "message": "Document deleted"}
 
 
+@app.put("/v1/convai/agents/{agent_id}/knowledge-base/index", tags=["Knowledge Base"])
+async def update_knowledge_index(
+    agent_id: str,
+    settings: KnowledgeIndexSettings,
+    db: Session = Depends(get_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """Choose the in-memory index format for an agent's knowledge base"""
+    agent = db.query(Agent).filter(Agent.agent_id == agent_id).first()
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    if settings.quantization not in QUANTIZATION_MODES:
+        raise HTTPException(status_code=400, detail=f"quantization must be one of {list(QUANTIZATION_MODES)}")
+
+    collections.set_quantization(agent_collection_name(agent_id), settings.quantization)
+    _logger.info(f"📐 Knowledge index for agent {agent_id} set to {settings.quantization}")
+
+    return {"agent_id": agent_id, "quantization": settings.quantization}
+
+
+@app.get("/v1/convai/knowledge-base/indexes", tags=["Knowledge Base"])
+async def list_resident_indexes(api_key: str = Depends(verify_api_key)):
+    """In-memory knowledge indexes per agent, most recently used first"""
+    prefix = agent_collection_name("")
+    indexes = []
+    for name, kinds in collections.resident_usage().items():
+        indexes.append({
+            "agent_id": name[len(prefix):] if name.startswith(prefix) else None,
+            "collection": name,
+            "vector_bytes": kinds.get("vector", 0),
+            "lexical_bytes": kinds.get("lexical", 0),
+            "total_bytes": sum(kinds.values())
+        })
+    stats = collections.stats()
+    return {
+        "indexes": indexes,
+        "resident_bytes": stats["resident_index_bytes"],
+        "limit_bytes": stats["resident_index_limit_bytes"],
+        "evictions": stats["index_evictions"]
+    }
+
+
+@app.get("/v1/convai/knowledge-base/snapshots", tags=["Knowledge Base"])
+async def list_knowledge_snapshots(api_key: str = Depends(verify_api_key)):
+    """Knowledge-base snapshots available in KB_SNAPSHOT_DIR"""
+    snapshots = []
+    for name in kb_snapshot.snapshot_names(KB_SNAPSHOT_DIR):
+        manifest = kb_snapshot.read_manifest(os.path.join(KB_SNAPSHOT_DIR, name))
+        snapshots.append({k: manifest.get(k) for k in ("collection", "agent_id", "model", "chunks", "documents", "exported_at")})
+    return {"snapshot_dir": KB_SNAPSHOT_DIR, "snapshots": snapshots}
+
+
+@app.post("/v1/convai/knowledge-base/snapshots/export", tags=["Knowledge Base"])
+async def export_knowledge_snapshots(
+    request: KnowledgeSnapshotRequest,
+    api_key: str = Depends(verify_api_key)
+):
+    """Write agents' knowledge bases (chunks + stored embeddings) to KB_SNAPSHOT_DIR"""
+    if request.agent_ids:
+        names = [agent_collection_name(a) for a in request.agent_ids]
+    else:
+        names = [n for n in await asyncio.to_thread(kb_snapshot.collection_names, chroma_client)
+                 if n.startswith(kb_snapshot.AGENT_PREFIX)]
+    os.makedirs(KB_SNAPSHOT_DIR, exist_ok=True)
+
+    exported, errors = [], []
+    for name in names:
+        handle = collections.get(name)
+        if handle is None:
+            errors.append({"collection": name, "error": "no knowledge base"})
+            continue
+        try:
+            result = await asyncio.to_thread(kb_snapshot.export_collection, handle, KB_SNAPSHOT_DIR, EMBED_MODEL_KEY)
+        except kb_snapshot.SnapshotError as e:
+            errors.append({"collection": name, "error": str(e)})
+            continue
+        exported.append({k: result[k] for k in ("collection", "agent_id", "chunks", "documents", "bytes", "seconds")})
+
+    _logger.info(f"📦 Exported {len(exported)} knowledge-base snapshots to {KB_SNAPSHOT_DIR}")
+    return {"exported": exported, "errors": errors}
+
+
+@app.post("/v1/convai/knowledge-base/snapshots/import", tags=["Knowledge Base"])
+async def import_knowledge_snapshots(
+    request: KnowledgeSnapshotRequest,
+    api_key: str = Depends(verify_api_key)
+):
+    """Load snapshots from KB_SNAPSHOT_DIR with their stored embeddings (nothing is re-embedded)"""
+    if request.agent_ids:
+        names = [agent_collection_name(a) for a in request.agent_ids]
+    else:
+        names = [n for n in kb_snapshot.snapshot_names(KB_SNAPSHOT_DIR) if n.startswith(kb_snapshot.AGENT_PREFIX)]
+
+    imported, errors = [], []
+    for name in names:
+        try:
+            result = await asyncio.to_thread(
+                kb_snapshot.import_collection, chroma_client, os.path.join(KB_SNAPSHOT_DIR, name),
+                EMBED_MODEL_KEY, force=request.force, hnsw_metadata=CHROMA_HNSW_METADATA
+            )
+        except kb_snapshot.SnapshotError as e:
+            errors.append({"collection": name, "error": str(e)})
+            continue
+        collections.forget(name)
+        collections.modified(name)
+        imported.append(result)
+
+    _logger.info(f"📥 Imported {len(imported)} knowledge-base snapshots from {KB_SNAPSHOT_DIR}")
+    return {"imported": imported, "errors": errors}
+
+
 # ================================
 # CUSTOM TOOLS PER AGENT API
 # ================================
@@ -1950,11 +2263,15 @@ async def add_agent_tool(
         tool_name=tool_data.tool_name,
         description=tool_data.description,
         webhook_url=tool_data.webhook_url,
-        parameters=tool_data.parameters or {}
+        parameters=tool_data.parameters or {},
+        timeout_secs=tool_data.timeout_secs,
+        max_concurrency=tool_data.max_concurrency,
+        cache_ttl_secs=tool_data.cache_ttl_secs
     )
     db.add(tool)
     db.commit()
     db.refresh(tool)
+    tool_executor.invalidate(agent_id)
     
     _logger.info(f"✅ Added tool '{tool_data.tool_name}' to agent {agent_id}")
     
@@ -1987,6 +2304,9 @@ async def list_agent_tools(
                 "description": t.description,
                 "webhook_url": t.webhook_url,
                 "parameters": t.parameters,
+                "timeout_secs": t.timeout_secs,
+                "max_concurrency": t.max_concurrency,
+                "cache_ttl_secs": t.cache_ttl_secs,
                 "created_at": t.created_at.isoformat()
             }
             for t in tools
@@ -2012,6 +2332,7 @@ async def delete_agent_tool(
     
     tool.is_active = False
     db.commit()
+    tool_executor.invalidate(agent_id)
     
     return {"success": True, "message": "Tool deleted"}
 
@@ -2185,10 +2506,18 @@ async def tools_status():
         "transfer_requires_confirmation": True,
         "end_call_requires_confirmation": False,
         "silence_threshold_sec": SILENCE_THRESHOLD_SEC,
-        "utterance_end_ms": UTTERANCE_END_MS
+        "utterance_end_ms": UTTERANCE_END_MS,
+        "webhook_tools": tool_executor.status()
     }
 
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Latency histograms and counters collected in this process"""
+    return {**metrics.snapshot(), "rag": {**cache_stats(), "gate_skip_rate": retrieval_gate.skip_rate()}, "embedding_service": embedding_service.status(),
+            "ingestion_parse": parse_stats()}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
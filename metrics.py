@@ -0,0 +1,128 @@
+"""
+Metrics Module
+
+Lightweight in-process counters and latency histograms, exposed as JSON on
+the /metrics endpoint. Safe to update from worker threads.
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Millisecond buckets covering sub-ms work up to slow network calls
+DEFAULT_BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_lock = threading.Lock()
+_histograms: Dict[Tuple[str, Tuple], "Histogram"] = {}
+_counters: Dict[Tuple[str, Tuple], "Counter"] = {}
+
+
+class Histogram:
+    """Fixed-bucket histogram with count/sum/min/max and bucket-estimated percentiles"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            idx = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    idx = i
+                    break
+            self.counts[idx] += 1
+            self.count += 1
+            self.total += value
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Estimate the q-th percentile (0-100) from bucket upper bounds"""
+        if not self.count:
+            return None
+        target = self.count * q / 100.0
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum": round(self.total, 3),
+                "mean": round(self.total / self.count, 3) if self.count else None,
+                "min": self.min,
+                "max": self.max,
+                "p50": self.percentile(50),
+                "p95": self.percentile(95),
+                "p99": self.percentile(99),
+                "buckets": {
+                    **{str(b): n for b, n in zip(self.buckets, self.counts)},
+                    "+Inf": self.counts[-1]
+                }
+            }
+
+
+class Counter:
+    """Monotonic counter"""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n: int = 1):
+        with self._lock:
+            self.value += n
+
+
+def _key(name: str, labels: Dict) -> Tuple[str, Tuple]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def histogram(name: str, buckets: Optional[Tuple[float, ...]] = None, **labels) -> Histogram:
+    """Get or create the histogram for a metric name + label set"""
+    key = _key(name, labels)
+    h = _histograms.get(key)
+    if h is None:
+        with _lock:
+            h = _histograms.setdefault(key, Histogram(buckets or DEFAULT_BUCKETS_MS))
+    return h
+
+
+def counter(name: str, **labels) -> Counter:
+    """Get or create the counter for a metric name + label set"""
+    key = _key(name, labels)
+    c = _counters.get(key)
+    if c is None:
+        with _lock:
+            c = _counters.setdefault(key, Counter())
+    return c
+
+
+def ratio(hits: str, misses: str, **labels) -> Optional[float]:
+    """hits / (hits + misses) for two counters with the same labels"""
+    h = counter(hits, **labels).value
+    m = counter(misses, **labels).value
+    return round(h / (h + m), 4) if (h + m) else None
+
+
+def _label_str(labels: Tuple) -> str:
+    return ",".join(f"{k}={v}" for k, v in labels) or "_"
+
+
+def snapshot() -> Dict:
+    """All metrics as {"histograms": {name: {labels: stats}}, "counters": {...}}"""
+    result = {"histograms": {}, "counters": {}}
+    for (name, labels), h in list(_histograms.items()):
+        result["histograms"].setdefault(name, {})[_label_str(labels)] = h.snapshot()
+    for (name, labels), c in list(_counters.items()):
+        result["counters"].setdefault(name, {})[_label_str(labels)] = c.value
+    return result
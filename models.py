@@ -6,7 +6,9 @@ Defines SQLAlchemy models for agent management, conversations, webhooks, etc.
 
 import os
 from datetime import datetime as dt
-from sqlalchemy import create_engine, Column, String, Text, Integer, Float, Boolean, DateTime, JSON
+from sqlalchemy import (
+    create_engine, inspect, text, Column, String, Text, Integer, Float, Boolean, DateTime, JSON, LargeBinary
+)
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # Database models
@@ -85,6 +87,56 @@ class WebhookConfig(Base):
     created_at = Column(DateTime, default=dt.utcnow)
 
 
+class WebhookDelivery(Base):
+    """Outbox of webhook events awaiting (or done with) delivery"""
+    __tablename__ = "webhook_deliveries"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    webhook_url = Column(String(500), nullable=False)
+    event = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)  # Full body: {"event", "timestamp", "data"}
+    
+    status = Column(String(20), default="pending", index=True)  # pending, delivering, delivered, failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=dt.utcnow, index=True)
+    last_error = Column(Text, nullable=True)
+    
+    created_at = Column(DateTime, default=dt.utcnow)
+    delivered_at = Column(DateTime, nullable=True)
+
+
+class IngestionJob(Base):
+    """Bulk knowledge-base upload processed by the background ingestion worker"""
+    __tablename__ = "ingestion_jobs"
+    
+    id = Column(String(100), primary_key=True)
+    agent_id = Column(String(100), nullable=False, index=True)
+    status = Column(String(20), default="queued", index=True)  # queued, running, completed, failed
+    # [{"filename", "path", "bytes", "document_id", "metadata", "chunks", "done"}]
+    documents = Column(JSON, nullable=False)
+    
+    documents_total = Column(Integer, default=0)
+    documents_done = Column(Integer, default=0)
+    chunks_total = Column(Integer, default=0)
+    chunks_done = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    
+    created_at = Column(DateTime, default=dt.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class ChunkEmbedding(Base):
+    """Embedding of a chunk's text, shared by every collection that contains it"""
+    __tablename__ = "chunk_embeddings"
+    
+    model = Column(String(255), primary_key=True)  # Embedding model + backend (embedding_backend.model_key)
+    chunk_hash = Column(String(64), primary_key=True)  # sha256 of the chunk text
+    dim = Column(Integer, nullable=False)
+    embedding = Column(LargeBinary, nullable=False)  # float32 bytes
+    created_at = Column(DateTime, default=dt.utcnow)
+
+
 class PhoneNumber(Base):
     """Phone numbers linked to agents"""
     __tablename__ = "phone_numbers"
@@ -120,6 +172,9 @@ class AgentTool(Base):
     description = Column(Text, nullable=False)
     webhook_url = Column(String(500), nullable=True)  # External webhook for tool
     parameters = Column(JSON, default=dict)  # Tool parameters schema
+    timeout_secs = Column(Float, nullable=True)  # None = TOOL_TIMEOUT_SECS
+    max_concurrency = Column(Integer, nullable=True)  # None = TOOL_MAX_CONCURRENCY
+    cache_ttl_secs = Column(Integer, nullable=True)  # >0 caches results for idempotent tools
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=dt.utcnow)
 
@@ -133,6 +188,23 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base.metadata.create_all(bind=engine)
 
 
+def _add_missing_columns():
+    """Add nullable columns introduced after a table was first created (create_all never alters)"""
+    inspector = inspect(engine)
+    with engine.begin() as db_conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    col_type = column.type.compile(dialect=engine.dialect)
+                    db_conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+
+
+_add_missing_columns()
+
+
 def get_db():
     """Dependency for FastAPI"""
     db = SessionLocal()
@@ -0,0 +1,704 @@
+"""
+Retrieval Module
+
+Routes knowledge-base queries to the calling agent's own Chroma collection
+(`agent_{agent_id}`), optionally falling back to the shared "docs"
+collection, and keeps open collection handles cached.
+
+Repeated questions are served from two caches: normalized question →
+embedding (LRU), and (collection, version, quantized embedding) → matching
+chunks (LRU with TTL). A collection's version is bumped whenever it is
+modified, so stale results are never returned after knowledge changes.
+
+Collections up to RAG_EXACT_INDEX_MAX_CHUNKS are searched with an in-memory
+ExactIndex (one matrix-vector product), or an int8 QuantizedIndex when the
+collection's "rag:quantization" metadata (default RAG_QUANTIZATION) is
+"int8"; larger ones use Chroma's HNSW index with the CHROMA_HNSW_* parameters.
+
+With RAG_HYBRID, each collection also has a BM25 index (lexical_index.py)
+kept up to date by add/delete knowledge. It is searched while the question
+is being embedded and fused with the vector ranking by reciprocal rank;
+questions naming a rare identifier (SKU, phone number) are answered from
+BM25 alone without waiting for the embedding.
+
+Exact/int8 and BM25 indexes are loaded on an agent's first query (or
+prefetched when a call is set up) and held in a memory-bounded LRU
+(RAG_INDEX_MEMORY_MB); cold agents' indexes are evicted and rebuilt on
+their next call. Chroma's own HNSW segments are bounded the same way via
+CHROMA_MEMORY_LIMIT_MB (utils.py).
+
+Writes made by other processes (load_knowledge_base.py, kb_snapshot.py
+import) are noticed by re-reading each open collection's chunk ids in the
+background every _REVALIDATE_SECS; a changed collection is treated as
+modified, so its count, indexes and cached results are rebuilt.
+
+SpeculativeRetrieval runs retrieval on interim transcripts while the caller
+is still talking, so the chunks are usually ready when the turn commits.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+from embeddings import embedding_service
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from vector_index import ExactIndex, QuantizedIndex, fingerprint
+from utils import (
+    _logger, RAG_MAX_DISTANCE, RAG_SHARED_FALLBACK, TOP_K,
+    RAG_EMBED_CACHE_SIZE, RAG_RESULT_CACHE_SIZE, RAG_RESULT_CACHE_TTL_SECS,
+    RAG_SPECULATIVE_MIN_WORDS, RAG_SPECULATIVE_NEW_WORDS, RAG_SPECULATIVE_MIN_SIMILARITY,
+    RAG_SPECULATIVE_WORKERS, RAG_EXACT_INDEX_MAX_CHUNKS, RAG_INDEX_DIR, CHROMA_HNSW_METADATA,
+    RAG_QUANTIZATION, RAG_RESCORE_FACTOR, RAG_HYBRID, RAG_LEXICAL_SHORTCUT,
+    RAG_INDEX_MEMORY_MB, RAG_GATE, chroma_client
+)
+
+SHARED_COLLECTION = "docs"
+
+# A missing collection is re-checked after this long (it may be created by another process)
+_MISSING_RECHECK_SECS = 60.0
+
+# An open collection's chunk ids are re-read this often to catch writes by other processes
+_REVALIDATE_SECS = 30.0
+
+
+# Embeddings are rounded to this many steps per unit before keying the result cache
+_QUANTIZE_SCALE = 1000
+
+QUANTIZATION_KEY = "rag:quantization"
+QUANTIZATION_MODES = ("none", "int8")
+
+
+def agent_collection_name(agent_id: str) -> str:
+    return f"agent_{agent_id}"
+
+
+class LRUCache:
+    """Thread-safe LRU map with an optional per-entry TTL and hit/miss counters"""
+
+    def __init__(self, name: str, max_entries: int, ttl_secs: Optional[float] = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_secs = ttl_secs
+        self._data: "OrderedDict[object, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl_secs and time.monotonic() - entry[0] >= self.ttl_secs:
+                del self._data[key]
+                entry = None
+            if entry is None:
+                metrics.counter("rag_cache_misses", cache=self.name).inc()
+                return None
+            self._data.move_to_end(key)
+        metrics.counter("rag_cache_hits", cache=self.name).inc()
+        return entry[1]
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def discard(self, predicate):
+        """Remove every entry whose key matches predicate(key)"""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._data),
+            "hit_rate": metrics.ratio("rag_cache_hits", "rag_cache_misses", cache=self.name)
+        }
+
+
+class ResidentIndexes:
+    """
+    Memory-bounded LRU of in-process indexes keyed by (kind, collection name).
+    Storing past max_bytes evicts the least recently used indexes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Tuple[str, str], Tuple[object, int]]" = OrderedDict()  # -> (value, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, name: str):
+        with self._lock:
+            entry = self._data.get((kind, name))
+            if entry is None:
+                return None
+            self._data.move_to_end((kind, name))
+            return entry[0]
+
+    def put(self, kind: str, name: str, value, nbytes: int):
+        with self._lock:
+            self._set((kind, name), value, nbytes)
+            evicted = self._evict(keep=(kind, name))
+        self._log_evictions(evicted)
+
+    def resize(self, kind: str, name: str, nbytes: int):
+        """Update the size of an index that changed in place"""
+        with self._lock:
+            entry = self._data.get((kind, name))
+            if entry is None:
+                return
+            self._set((kind, name), entry[0], nbytes)
+            evicted = self._evict(keep=(kind, name))
+        self._log_evictions(evicted)
+
+    def pop(self, kind: str, name: str):
+        with self._lock:
+            entry = self._data.pop((kind, name), None)
+            if entry is None:
+                return None
+            self._bytes -= entry[1]
+            return entry[0]
+
+    def _set(self, key, value, nbytes: int):
+        old = self._data.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._data[key] = (value, nbytes)
+        self._bytes += nbytes
+
+    def _evict(self, keep) -> List[Tuple[Tuple[str, str], int]]:
+        # The index just used stays even if it alone exceeds the limit
+        evicted = []
+        while self._bytes > self.max_bytes and len(self._data) > 1:
+            key, (_, nbytes) = next(iter(self._data.items()))
+            if key == keep:
+                self._data.move_to_end(key)
+                continue
+            del self._data[key]
+            self._bytes -= nbytes
+            evicted.append((key, nbytes))
+        return evicted
+
+    @staticmethod
+    def _log_evictions(evicted):
+        for (kind, name), nbytes in evicted:
+            metrics.counter("rag_index_evictions", kind=kind).inc()
+            _logger.info(f"♻️ Evicted {kind} index for '{name}' ({nbytes / 1024:.0f}KB)")
+
+    def count(self, kind: str) -> int:
+        with self._lock:
+            return sum(1 for k, _ in self._data if k == kind)
+
+    def nbytes(self, kind: Optional[str] = None) -> int:
+        if kind is None:
+            return self._bytes
+        with self._lock:
+            return sum(nbytes for (k, _), (_, nbytes) in self._data.items() if k == kind)
+
+    def usage(self) -> Dict[str, Dict[str, int]]:
+        """Resident bytes per collection and index kind, most recently used first"""
+        with self._lock:
+            items = list(self._data.items())
+        usage: Dict[str, Dict[str, int]] = {}
+        for (kind, name), (_, nbytes) in reversed(items):
+            usage.setdefault(name, {})[kind] = nbytes
+        return usage
+
+
+class CollectionRegistry:
+    """Cache of Chroma collection handles, sizes and in-memory indexes, by collection name"""
+
+    def __init__(self, client):
+        self.client = client
+        self._handles: Dict[str, Tuple[object, Optional[int], float]] = {}  # name -> (collection|None, count, checked_at)
+        self._versions: Dict[str, int] = {}
+        self._signatures: Dict[str, Tuple[int, str]] = {}  # name -> (chunk count, digest of chunk ids)
+        # ("vector", name) -> (version built from, Exact/QuantizedIndex); ("lexical", name) -> BM25Index
+        self._resident = ResidentIndexes(RAG_INDEX_MEMORY_MB * 1024 * 1024)
+        self._prefetching = set()
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def get(self, name: str, create: bool = False):
+        """Open collection handle, or None if it does not exist and create is False"""
+        entry = self._handles.get(name)
+        if entry is not None:
+            handle, _, checked_at = entry
+            if handle is not None:
+                if time.monotonic() - checked_at >= _REVALIDATE_SECS:
+                    self._schedule_revalidate(name)
+                return handle
+            if not create and time.monotonic() - checked_at < _MISSING_RECHECK_SECS:
+                return handle
+
+        with self._lock:
+            if create:
+                handle = self.client.get_or_create_collection(name, metadata=CHROMA_HNSW_METADATA)
+            else:
+                try:
+                    handle = self.client.get_collection(name)
+                except Exception:
+                    handle = None
+            self._handles[name] = (handle, None, time.monotonic())
+        if handle is not None:
+            _prefetch_pool.submit(self._revalidate, name, handle)  # Baseline for later checks
+        return handle
+
+    def _schedule_revalidate(self, name: str):
+        with self._lock:
+            entry = self._handles.get(name)
+            if entry is None or entry[0] is None or time.monotonic() - entry[2] < _REVALIDATE_SECS:
+                return  # Another caller already scheduled it
+            self._handles[name] = (entry[0], entry[1], time.monotonic())
+        _prefetch_pool.submit(self._revalidate, name, entry[0])
+
+    def _revalidate(self, name: str, handle):
+        """Treat the collection as modified if its chunk ids changed since the last check"""
+        try:
+            ids = handle.get(include=[])["ids"]
+        except Exception as e:
+            # Most likely deleted by another process: reopen on next use
+            _logger.info(f"🔄 Collection '{name}' is no longer readable ({e}), reopening")
+            self.forget(name)
+            self.modified(name)
+            return
+        signature = (len(ids), hashlib.sha256("\0".join(sorted(ids)).encode("utf-8")).hexdigest())
+        with self._lock:
+            previous = self._signatures.get(name)
+        if previous is not None and previous != signature:
+            _logger.info(f"🔄 Collection '{name}' changed in another process "
+                         f"({previous[0]} -> {signature[0]} chunks), reloading")
+            metrics.counter("rag_external_changes").inc()
+            self.modified(name)
+        with self._lock:
+            self._signatures[name] = signature
+
+    def count(self, name: str) -> int:
+        """Number of chunks in a collection (cached until the collection is modified)"""
+        handle = self.get(name)
+        if handle is None:
+            return 0
+        _, count, checked_at = self._handles.get(name, (handle, None, time.monotonic()))
+        if count is None:
+            count = handle.count()
+            self._handles[name] = (handle, count, checked_at)
+        return count
+
+    def version(self, name: str) -> int:
+        return self._versions.get(name, 0)
+
+    def modified(self, name: str, added: Optional[Tuple[List[str], List[str]]] = None,
+                 removed: Optional[List[str]] = None):
+        """
+        Call after adding or deleting chunks; refreshes the count and drops
+        cached results. Pass added=(ids, documents) / removed=ids to update
+        the BM25 index in place (otherwise it is rebuilt on next use).
+        """
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            self._signatures.pop(name, None)  # Our own write: not a change to report
+            entry = self._handles.get(name)
+            if entry is not None:
+                self._handles[name] = (entry[0], None, entry[2])
+            self._resident.pop("vector", name)
+            lexical = self._resident.get("lexical", name)
+            if lexical is not None and added is None and removed is None:
+                self._resident.pop("lexical", name)
+                lexical = None
+        if lexical is not None:
+            if added is not None:
+                lexical.add(*added)
+            if removed is not None:
+                lexical.remove(removed)
+            self._resident.resize("lexical", name, lexical.nbytes)
+        result_cache.discard(lambda key: key[0] == name)
+        if entry is not None and entry[0] is not None:
+            _prefetch_pool.submit(self._revalidate, name, entry[0])  # New baseline
+
+    def lexical_index(self, name: str) -> Optional[BM25Index]:
+        """BM25 index of the collection's chunks, built from Chroma on first use"""
+        index = self._resident.get("lexical", name)
+        if index is not None:
+            return index
+        handle = self.get(name)
+        if handle is None:
+            return None
+        with self._build_lock:
+            index = self._resident.get("lexical", name)
+            if index is None:
+                data = handle.get(include=["documents"])
+                index = BM25Index()
+                index.add(data["ids"], data["documents"])
+                self._resident.put("lexical", name, index, index.nbytes)
+        return index
+
+    def resident_lexical_index(self, name: str) -> Optional[BM25Index]:
+        """The BM25 index if it is already in memory; never builds or touches Chroma"""
+        return self._resident.get("lexical", name)
+
+    def quantization(self, name: str) -> str:
+        handle = self.get(name)
+        metadata = (getattr(handle, "metadata", None) or {}) if handle is not None else {}
+        return metadata.get(QUANTIZATION_KEY) or RAG_QUANTIZATION
+
+    def set_quantization(self, name: str, mode: str):
+        """Store the index format in the collection metadata and rebuild on next query"""
+        handle = self.get(name, create=True)
+        metadata = {k: v for k, v in (handle.metadata or {}).items() if not k.startswith("hnsw:")}
+        metadata[QUANTIZATION_KEY] = mode
+        handle.modify(metadata=metadata)
+        self.modified(name)
+
+    def local_index(self, name: str):
+        """
+        In-memory index of the collection (ExactIndex, or QuantizedIndex for
+        int8 collections), built or loaded from RAG_INDEX_DIR on first use
+        """
+        version = self.version(name)
+        entry = self._resident.get("vector", name)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        handle = self.get(name)
+        if handle is None:
+            return None
+
+        with self._build_lock:
+            entry = self._resident.get("vector", name)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+
+            start = time.perf_counter()
+            quantization = self.quantization(name)
+            index = None
+            path_prefix = os.path.join(RAG_INDEX_DIR, name) if RAG_INDEX_DIR else None
+            # Files on disk are only trusted until this process modifies the collection, and
+            # only if they hold exactly the collection's current chunks (same count is not enough)
+            if path_prefix and version == 0 and os.path.exists(f"{path_prefix}.npy"):
+                try:
+                    index = ExactIndex.load(path_prefix)
+                    current = handle.get(include=["documents"])
+                    if index.fingerprint != fingerprint(current["ids"], current["documents"]):
+                        _logger.info(f"📐 Index files for '{name}' are stale, rebuilding")
+                        index = None
+                except Exception as e:
+                    _logger.warning(f"⚠️ Could not load index {path_prefix}: {e}")
+                    index = None
+            if index is None:
+                index = ExactIndex.from_collection(handle)
+                if path_prefix:
+                    index.save(path_prefix)
+                    if quantization == "int8":
+                        index = ExactIndex.load(path_prefix)  # Memory-mapped rows for rescoring
+
+            if quantization == "int8":
+                index = QuantizedIndex.from_exact(index, RAG_RESCORE_FACTOR,
+                                                  fetch_full=lambda ids: _fetch_embeddings(handle, ids))
+
+            self._resident.put("vector", name, (version, index), index.nbytes)
+        _logger.info(f"📐 {type(index).__name__} for '{name}': {len(index)} chunks, "
+                     f"{index.nbytes / 1024:.0f}KB in {(time.perf_counter() - start) * 1000:.0f}ms")
+        return index
+
+    def prefetch(self, name: str):
+        """Load the collection's indexes in the background, e.g. when a call is being set up"""
+        with self._lock:
+            if name in self._prefetching:
+                return
+            self._prefetching.add(name)
+        _prefetch_pool.submit(self._prefetch, name)
+
+    def _prefetch(self, name: str):
+        start = time.perf_counter()
+        try:
+            size = self.count(name)
+            if size == 0:
+                return
+            if size <= RAG_EXACT_INDEX_MAX_CHUNKS:
+                self.local_index(name)
+            else:
+                # Any query makes Chroma load the collection's HNSW segment
+                handle = self.get(name)
+                embeddings = handle.peek(1).get("embeddings")
+                if embeddings is not None and len(embeddings) > 0:
+                    handle.query(query_embeddings=[list(embeddings[0])], n_results=1)
+            if RAG_HYBRID or RAG_GATE:  # The gate reads KB vocabulary from the BM25 index
+                self.lexical_index(name)
+            metrics.counter("rag_index_prefetches").inc()
+            _logger.debug(f"📥 Prefetched indexes for '{name}' in {(time.perf_counter() - start) * 1000:.0f}ms")
+        except Exception as e:
+            _logger.warning(f"⚠️ Index prefetch for '{name}' failed: {e}")
+        finally:
+            with self._lock:
+                self._prefetching.discard(name)
+
+    def forget(self, name: str):
+        self._handles.pop(name, None)
+        self._signatures.pop(name, None)
+        self._resident.pop("vector", name)
+        self._resident.pop("lexical", name)
+
+    def resident_usage(self) -> Dict[str, Dict[str, int]]:
+        """Resident in-process index bytes per collection, by kind ("vector", "lexical")"""
+        return self._resident.usage()
+
+    def stats(self) -> Dict:
+        return {
+            "open_collections": sum(1 for h, _, _ in self._handles.values() if h is not None),
+            "known_missing": sum(1 for h, _, _ in self._handles.values() if h is None),
+            "local_indexes": self._resident.count("vector"),
+            "local_index_bytes": self._resident.nbytes("vector"),
+            "lexical_indexes": self._resident.count("lexical"),
+            "lexical_index_bytes": self._resident.nbytes("lexical"),
+            "resident_index_bytes": self._resident.nbytes(),
+            "resident_index_limit_bytes": self._resident.max_bytes,
+            "index_evictions": sum(metrics.counter("rag_index_evictions", kind=k).value for k in ("vector", "lexical"))
+        }
+
+
+def _fetch_embeddings(collection, ids: List[str]) -> np.ndarray:
+    """Full-precision embeddings for ids, in the order given"""
+    data = collection.get(ids=ids, include=["embeddings"])
+    by_id = dict(zip(data["ids"], data["embeddings"]))
+    return np.asarray([by_id[i] for i in ids], dtype=np.float32)
+
+
+_prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rag-prefetch")
+embedding_cache = LRUCache("embedding", RAG_EMBED_CACHE_SIZE)
+result_cache = LRUCache("result", RAG_RESULT_CACHE_SIZE, ttl_secs=RAG_RESULT_CACHE_TTL_SECS)
+collections = CollectionRegistry(chroma_client)
+
+
+def normalize_question(question: str) -> str:
+    """Cache key form of a question: lower-case, single spaces, no trailing punctuation"""
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?!.,").strip()
+
+
+def embed_query(question: str) -> List[float]:
+    """Normalized embedding for a single query"""
+    key = normalize_question(question)
+    cached = embedding_cache.get(key)
+    if cached is not None:
+        return cached
+
+    embedding = embedding_service.encode([question])[0].tolist()
+    embedding_cache.put(key, embedding)
+    return embedding
+
+
+def _embedding_getter(question: str, query_embedding: Optional[List[float]]):
+    """
+    Callable returning the question's embedding. On a cache miss the encode is
+    submitted immediately, so it runs while the caller does other work.
+    """
+    if query_embedding is not None:
+        return lambda: query_embedding
+    key = normalize_question(question)
+    cached = embedding_cache.get(key)
+    if cached is not None:
+        return lambda: cached
+
+    future = embedding_service.submit([question])
+
+    def wait() -> List[float]:
+        embedding = future.result()[0].tolist()
+        embedding_cache.put(key, embedding)
+        return embedding
+    return wait
+
+
+def _quantize(query_embedding: List[float]) -> bytes:
+    return np.round(np.asarray(query_embedding, dtype=np.float32) * _QUANTIZE_SCALE).astype(np.int16).tobytes()
+
+
+def query_collection(name: str, query_embedding: List[float], top_k: int = TOP_K) -> List[Tuple[str, float]]:
+    """(document, distance) pairs within RAG_MAX_DISTANCE, best first"""
+    cache_key = (name, collections.version(name), top_k, _quantize(query_embedding))
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+
+    size = collections.count(name)
+    if size == 0:
+        hits = []
+    else:
+        start = time.perf_counter()
+        n_results = min(top_k * 2, size)
+        if size <= RAG_EXACT_INDEX_MAX_CHUNKS:
+            index = collections.local_index(name)
+            backend = "int8" if isinstance(index, QuantizedIndex) else "exact"
+            pairs = index.search(query_embedding, n_results)
+        else:
+            backend = "hnsw"
+            results = collections.get(name).query(
+                query_embeddings=[query_embedding],
+                n_results=n_results
+            )
+            docs = results.get("documents", [[]])[0] if results else []
+            distances = results.get("distances", [[]])[0] if results else []
+            pairs = zip(docs, distances)
+        hits = [(doc, dist) for doc, dist in pairs if dist <= RAG_MAX_DISTANCE]
+        metrics.histogram("rag_search_ms", backend=backend).observe((time.perf_counter() - start) * 1000)
+
+    result_cache.put(cache_key, tuple(hits))
+    return hits
+
+
+def search_collection(name: str, question: str, get_embedding, top_k: int = TOP_K) -> Tuple[List[Tuple[str, float]], str]:
+    """
+    (hits best first, method) for one collection: vector search fused with
+    BM25 when RAG_HYBRID, or BM25 alone for exact identifier hits.
+    """
+    lexical: List[Tuple[str, float]] = []
+    if RAG_HYBRID and collections.count(name) > 0:
+        start = time.perf_counter()
+        lexical, exact_hit = collections.lexical_index(name).search(question, top_k * 2)
+        metrics.histogram("rag_lexical_ms").observe((time.perf_counter() - start) * 1000)
+        if exact_hit and RAG_LEXICAL_SHORTCUT:
+            metrics.counter("rag_lexical_shortcuts").inc()
+            return lexical, "lexical"
+
+    vector = query_collection(name, get_embedding(), top_k)
+    # BM25 only re-ranks vector hits, so RAG_MAX_DISTANCE still decides relevance
+    passed = {doc for doc, _ in vector}
+    lexical = [(doc, score) for doc, score in lexical if doc in passed]
+    if not lexical:
+        return vector, "vector"
+    return reciprocal_rank_fusion(vector, lexical)[:top_k], "hybrid"
+
+
+_speculation_pool = ThreadPoolExecutor(max_workers=RAG_SPECULATIVE_WORKERS, thread_name_prefix="rag-speculative")
+
+
+def _speculate(text: str, agent_id: Optional[str], top_k: int) -> Tuple[List[float], List[str]]:
+    query_embedding = embed_query(text)
+    return query_embedding, retrieve(text, agent_id, top_k, query_embedding)
+
+
+class SpeculativeRetrieval:
+    """
+    Per-call retrieval started from partial transcripts.
+
+    update() is called from the STT callback thread with the transcript so
+    far; it launches a retrieval once the text has RAG_SPECULATIVE_MIN_WORDS
+    words, and again each time it grows by RAG_SPECULATIVE_NEW_WORDS (finals
+    always re-launch). Only the newest speculation is kept. take() is called
+    with the committed question and reuses the speculation when the text is
+    the same or its embedding is within RAG_SPECULATIVE_MIN_SIMILARITY.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key: Optional[str] = None
+        self._words = 0
+        self._future: Optional[Future] = None
+
+    def update(self, text: str, agent_id: Optional[str], is_final: bool = False, top_k: int = TOP_K):
+        key = normalize_question(text)
+        words = len(key.split())
+        with self._lock:
+            if words < RAG_SPECULATIVE_MIN_WORDS or key == self._key:
+                return
+            if not is_final and self._key is not None and words - self._words < RAG_SPECULATIVE_NEW_WORDS:
+                return
+            if self._future is not None:
+                self._future.cancel()  # Only succeeds if it has not started yet
+            self._key = key
+            self._words = words
+            self._future = _speculation_pool.submit(_speculate, text, agent_id, top_k)
+        metrics.counter("rag_speculative_launches").inc()
+
+    def reset(self):
+        with self._lock:
+            if self._future is not None:
+                self._future.cancel()
+            self._key, self._words, self._future = None, 0, None
+
+    def take(self, question: str, agent_id: Optional[str] = None, top_k: int = TOP_K) -> List[str]:
+        """Chunks for the committed question. Blocking; call from an executor."""
+        with self._lock:
+            key, future = self._key, self._future
+            self._key, self._words, self._future = None, 0, None
+
+        outcome = "none"
+        try:
+            if future is None or future.cancelled():
+                return retrieve(question, agent_id, top_k)
+
+            if key == normalize_question(question) and future.exception() is None:
+                outcome = "hit"
+                return future.result()[1]
+
+            query_embedding = embed_query(question)
+            if future.done() and future.exception() is None:
+                speculative_embedding, hits = future.result()
+                similarity = float(np.dot(query_embedding, speculative_embedding))
+                if similarity >= RAG_SPECULATIVE_MIN_SIMILARITY:
+                    outcome = "near_hit"
+                    return hits
+            else:
+                future.cancel()
+            outcome = "miss"
+            return retrieve(question, agent_id, top_k, query_embedding)
+        finally:
+            metrics.counter("rag_speculative", outcome=outcome).inc()
+            _logger.debug(f"🔮 Speculative retrieval: {outcome}")
+
+
+def speculative_hit_rate() -> Optional[float]:
+    hits = sum(metrics.counter("rag_speculative", outcome=o).value for o in ("hit", "near_hit"))
+    total = hits + sum(metrics.counter("rag_speculative", outcome=o).value for o in ("miss", "none"))
+    return round(hits / total, 4) if total else None
+
+
+def cache_stats() -> Dict:
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "speculative_hit_rate": speculative_hit_rate(),
+        **collections.stats()
+    }
+
+
+def retrieve(question: str, agent_id: Optional[str] = None, top_k: int = TOP_K,
+             query_embedding: Optional[List[float]] = None) -> List[str]:
+    """
+    Relevant chunks for a question. Blocking (embedding + Chroma), so call it
+    from an executor.
+
+    Agents search their own collection; the shared collection is used when
+    the call has no agent, or (with RAG_SHARED_FALLBACK) when the agent's
+    collection is missing, empty or has no relevant chunk.
+    """
+    start = time.perf_counter()
+    get_embedding = _embedding_getter(question, query_embedding)
+
+    source = SHARED_COLLECTION
+    method = "vector"
+    hits: List[Tuple[str, float]] = []
+    if agent_id:
+        source = agent_collection_name(agent_id)
+        hits, method = search_collection(source, question, get_embedding, top_k)
+
+    if not hits and (not agent_id or RAG_SHARED_FALLBACK):
+        if agent_id:
+            metrics.counter("rag_shared_fallbacks").inc()
+        source = SHARED_COLLECTION
+        hits, method = search_collection(SHARED_COLLECTION, question, get_embedding, top_k)
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    metrics.histogram("rag_retrieval_ms", source="agent" if source != SHARED_COLLECTION else "shared",
+                      method=method).observe(elapsed_ms)
+    _logger.debug(f"📚 {len(hits)} relevant chunks from '{source}' ({method}) in {elapsed_ms:.0f}ms")
+
+    return [doc for doc, _ in hits]
@@ -0,0 +1,141 @@
+"""
+Retrieval Gate Module
+
+Decides, before query_rag_streaming embeds anything, whether a turn needs
+the knowledge base at all. Fillers, yes/no answers to a pending action,
+goodbyes and small talk ("who am I speaking with?") skip retrieval; short
+follow-ups ("what about the price of that?") reuse the previous turn's
+chunks. Everything else goes through a tiny logistic classifier over the
+question and the call phase, whose strongest feature is how much of the
+question appears in the agent's own KB vocabulary (from its BM25 index).
+
+The gate runs on the event loop, so it only reads a BM25 index that is
+already resident; a cold or evicted one is prefetched in the background and
+the vocabulary feature falls back to its 0.5 prior for that turn.
+"""
+
+import math
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+from lexical_index import tokenize
+from retrieval import SHARED_COLLECTION, agent_collection_name, collections
+from utils import RAG_GATE_THRESHOLD, detect_confirmation_response, detect_intent, is_backchannel
+
+DECISIONS = ("retrieve", "skip", "reuse")
+
+_QUESTION_START = re.compile(
+    r"^(what|whats|what's|how|why|when|where|which|who|do|does|did|can|could|is|are|will|would|should|tell|explain)\b")
+_SMALL_TALK = re.compile(
+    r"\b(who (am i|are you|is this)|speaking (with|to)|your name|how are you|how's it going|"
+    r"nice to meet|can you hear me|are you (a )?(robot|bot|real|human|ai))\b")
+_SCHEDULING = re.compile(
+    r"\b(monday|tuesday|wednesday|thursday|friday|saturday|sunday|tomorrow|today|tonight|next week|"
+    r"morning|afternoon|evening|\d{1,2}(:\d{2})?\s*(am|pm|a\.m\.|p\.m\.)|o'?clock|works for me|"
+    r"call me back|reschedule)\b")
+_FOLLOW_UP = re.compile(
+    r"\b(that|this|it|those|these|them|more|else|also|another|other one|the same|what about|how about|and the)\b")
+_KB_CUES = re.compile(
+    r"\b(price|pricing|cost|costs|fee|fees|plan|plans|package|service|services|offer|offers|provide|"
+    r"product|products|feature|features|support|policy|warranty|refund|hours|location|located|"
+    r"address|integrat\w*|include|includes|difference|compare|available|requirements?)\b")
+
+# Hand-set weights of the logistic gate: P(needs KB) = sigmoid(w . features + bias)
+_WEIGHTS = {
+    "kb_overlap": 3.0,
+    "kb_cue": 1.5,
+    "question": 1.0,
+    "long": 0.8,
+    "small_talk": -3.0,
+    "scheduling": -1.5,
+    "confirming_phase": -2.0,
+    "opening_phase": -0.5,
+}
+_BIAS = -1.2
+
+_FOLLOW_UP_MAX_WORDS = 8
+
+
+class _LatencyAverage:
+    """EWMA of real retrieval latency, used to estimate what a skip saved"""
+
+    def __init__(self, alpha: float = 0.1):
+        self.alpha = alpha
+        self.value: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def observe(self, ms: float):
+        with self._lock:
+            self.value = ms if self.value is None else self.value + self.alpha * (ms - self.value)
+
+
+retrieval_latency = _LatencyAverage()
+
+
+def features(question: str, history: List[Dict], pending_action: Optional[dict],
+             agent_id: Optional[str]) -> Dict[str, float]:
+    text = question.lower().strip()
+    words = text.split()
+    name = agent_collection_name(agent_id) if agent_id else SHARED_COLLECTION
+    lexical = collections.resident_lexical_index(name)
+    if lexical is None:
+        collections.prefetch(name)
+    return {
+        "kb_overlap": lexical.vocabulary_overlap(text) if lexical is not None and len(lexical) else 0.5,
+        "kb_cue": 1.0 if _KB_CUES.search(text) else 0.0,
+        "question": 1.0 if text.endswith("?") or _QUESTION_START.match(text) else 0.0,
+        "long": 1.0 if len(words) >= 6 else 0.0,
+        "small_talk": 1.0 if _SMALL_TALK.search(text) else 0.0,
+        "scheduling": 1.0 if _SCHEDULING.search(text) else 0.0,
+        "confirming_phase": 1.0 if pending_action else 0.0,
+        "opening_phase": 1.0 if not history else 0.0,
+    }
+
+
+def score(feature_values: Dict[str, float]) -> float:
+    z = _BIAS + sum(_WEIGHTS[name] * value for name, value in feature_values.items())
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+def decide(question: str, history: Optional[List[Dict]] = None, pending_action: Optional[dict] = None,
+           agent_id: Optional[str] = None, has_previous_context: bool = False) -> Tuple[str, str]:
+    """(decision, reason); decision is "retrieve", "skip" or "reuse" (the previous turn's chunks)"""
+    history = history or []
+    text = question.lower().strip()
+    words = text.split()
+
+    if is_backchannel(text):
+        return "skip", "backchannel"
+    if detect_intent(text) == "GOODBYE":
+        return "skip", "goodbye"
+    if len(words) <= 3 and detect_confirmation_response(text) is not None and not _QUESTION_START.match(text):
+        return "skip", "confirmation"
+
+    # "what about the price of that?" - refers back and adds at most one new topic word
+    if has_previous_context and len(words) <= _FOLLOW_UP_MAX_WORDS and _FOLLOW_UP.search(text) \
+            and len(set(tokenize(text)) - {"more", "else", "also", "another", "other", "same"}) <= 1:
+        return "reuse", "follow_up"
+
+    probability = score(features(question, history, pending_action, agent_id))
+    if probability >= RAG_GATE_THRESHOLD:
+        return "retrieve", "classifier"
+    return "skip", "classifier"
+
+
+def record(decision: str, reason: str, retrieval_ms: Optional[float] = None):
+    """Count a gate decision; real retrievals feed the latency estimate, skips record the saving"""
+    metrics.counter("rag_gate", decision=decision, reason=reason).inc()
+    if retrieval_ms is not None:
+        retrieval_latency.observe(retrieval_ms)
+    elif decision != "retrieve" and retrieval_latency.value is not None:
+        metrics.histogram("rag_gate_saved_ms").observe(retrieval_latency.value)
+
+
+def skip_rate() -> Optional[float]:
+    """Share of turns that did not run retrieval (skipped or reused)"""
+    snapshot = metrics.snapshot()["counters"].get("rag_gate", {})
+    total = sum(snapshot.values())
+    retrieved = sum(v for labels, v in snapshot.items() if "decision=retrieve" in labels)
+    return round((total - retrieved) / total, 4) if total else None
@@ -80,3 +80,17 @@ class ToolCreate(BaseModel):
             "param2": {"type": "number", "required": False, "description": "Second parameter"}
         }
     )
+    timeout_secs: Optional[float] = Field(None, gt=0, description="Webhook timeout (defaults to TOOL_TIMEOUT_SECS)")
+    max_concurrency: Optional[int] = Field(None, ge=1, description="Max in-flight calls for this tool (defaults to TOOL_MAX_CONCURRENCY)")
+    cache_ttl_secs: Optional[int] = Field(None, ge=0, description="Cache results by parameters for this many seconds (idempotent tools only)")
+
+
+class KnowledgeSnapshotRequest(BaseModel):
+    """Agents whose knowledge-base snapshots to export or import (all when omitted)"""
+    agent_ids: Optional[List[str]] = None
+    force: bool = Field(False, description="Import even if the snapshot was embedded with a different model")
+
+
+class KnowledgeIndexSettings(BaseModel):
+    """In-memory index format for an agent's knowledge base"""
+    quantization: str = Field("none", description="'none' (float32) or 'int8' (4x smaller, shortlist rescored in float32)")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test Knowledge Chunking
+
+Checks the sentence-aware chunker used by every ingestion path: chunks stay
+under the token budget, end on sentence boundaries, streaming gives the
+same chunks as chunking the whole text, and overlong sentences are split.
+With a file argument it also reports chunk statistics for that file using
+the real embedding tokenizer.
+
+Usage:
+    python3 test_chunking.py [data_file]
+"""
+
+import random
+import statistics
+import sys
+import time
+
+from chunking import Chunker, estimate_tokens, split_sentences
+
+WORDS = ("managed it plan price monitoring router cybersecurity audit salesforce "
+         "consulting migration support office hours team customer").split()
+
+
+def make_text(paragraphs, rng):
+    out = []
+    for _ in range(paragraphs):
+        sentences = []
+        for _ in range(rng.randint(1, 8)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(4, 30))]
+            sentences.append(" ".join(words).capitalize() + rng.choice(".!?"))
+        out.append(" ".join(sentences))
+    return "\n\n".join(out)
+
+
+def chunks_in_time(chunker, text, limit_secs):
+    """Streamed line by line, every chunk within budget and the whole text in under limit_secs"""
+    start = time.perf_counter()
+    chunks = list(chunker.stream(line + "\n" for line in text.split("\n")))
+    elapsed = time.perf_counter() - start
+    return elapsed < limit_secs and all(estimate_tokens(c) <= chunker.max_tokens + 2 for c in chunks) \
+        and sum(len(c.split()) for c in chunks) >= len(text.split())
+
+
+def check(name, condition):
+    print(f"{'✅' if condition else '❌'} {name}")
+    return condition
+
+
+print("=" * 70)
+print("🧪 KNOWLEDGE CHUNKING TEST")
+print("=" * 70)
+
+rng = random.Random(7)
+text = make_text(300, rng)
+chunker = Chunker(max_tokens=120, overlap_tokens=16)
+chunks = chunker.split(text)
+
+results = [
+    check("chunks stay within the token budget",
+          all(estimate_tokens(c) <= 120 + 2 for c in chunks)),
+    check("chunks end on a sentence boundary",
+          all(c.rstrip()[-1] in ".!?" for c in chunks)),
+    check("streaming by line gives the same chunks",
+          list(chunker.stream(line + "\n" for line in text.split("\n"))) == chunks),
+    check("streaming in arbitrary pieces gives the same chunks",
+          list(chunker.stream(text[i:i + 13] for i in range(0, len(text), 13))) == chunks),
+    check("every sentence is in some chunk",
+          all(any(s in c for c in chunks) for s in split_sentences(text.replace("\n\n", " ")))),
+    check("an overlong sentence is split into windows",
+          len(Chunker(max_tokens=50).split("word " * 400)) > 1),
+    check("an overlong word (URL, base64) is split by characters",
+          all(estimate_tokens(c) <= 50 for c in Chunker(max_tokens=50).split("https://x.io/" + "a/" * 400))),
+    check("a long paragraph with no punctuation is chunked in linear time",
+          chunks_in_time(Chunker(max_tokens=120), "\n".join(f"question {i} answer {i} for our plans"
+                                                         for i in range(20000)), 5.0)),
+    check("abbreviations do not end a sentence",
+          split_sentences("Ask Dr. Smith. He is in.") == ["Ask Dr. Smith.", "He is in."]),
+    check("empty text gives no chunks", chunker.split("  \n\n ") == []),
+]
+print(f"\n📊 {len(chunks)} chunks, {statistics.mean(estimate_tokens(c) for c in chunks):.0f} tokens on average")
+
+if len(sys.argv) > 1:
+    from embedding_backend import load_embedder
+    from chunking import model_token_budget, token_counter
+
+    embedder, _, _ = load_embedder("sentence-transformers/all-MiniLM-L6-v2", "cpu")
+    count = token_counter(embedder)
+    real = Chunker(model_token_budget(embedder), 32, count)
+    with open(sys.argv[1], encoding="utf-8") as f:
+        file_chunks = list(real.stream(f))
+    sizes = [count(c) for c in file_chunks]
+    print(f"\n📄 {sys.argv[1]}: {len(file_chunks)} chunks, tokens mean {statistics.mean(sizes):.0f} "
+          f"max {max(sizes)} (budget {model_token_budget(embedder)})")
+    results.append(check("file chunks fit the model", max(sizes) <= model_token_budget(embedder)))
+
+print("\n" + "=" * 70)
+print("✅ ALL PASSED" if all(results) else "❌ SOME CHECKS FAILED")
+print("=" * 70)
+sys.exit(0 if all(results) else 1)
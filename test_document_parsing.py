@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test Document Parsing
+
+Checks the text extraction used for knowledge-base uploads: format
+detection, and that HTML, Markdown, CSV and plain text come out as clean
+prose with words intact and paragraphs separated by blank lines.
+
+Usage:
+    python3 test_document_parsing.py
+"""
+
+import os
+import sys
+import tempfile
+
+from document_parsing import UnsupportedFormat, detect_format, extract_to_file, iter_text
+
+
+def parse(fmt, content, suffix):
+    with tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False, encoding="utf-8") as f:
+        f.write(content)
+    try:
+        return "".join(iter_text(f.name, fmt))
+    finally:
+        os.remove(f.name)
+
+
+def words(text):
+    return " ".join(text.split())
+
+
+def unsupported(filename):
+    try:
+        detect_format(filename)
+    except UnsupportedFormat:
+        return True
+    return False
+
+
+def check(name, condition):
+    print(f"{'✅' if condition else '❌'} {name}")
+    return condition
+
+
+print("=" * 70)
+print("🧪 DOCUMENT PARSING TEST")
+print("=" * 70)
+
+html = parse("html", "<html><head><title>x</title><style>p {}</style></head><body>"
+                     "<p>Our <b>Premium</b> plan costs <a href='/p'>$99</a> per month.</p>"
+                     "<p>Call&nbsp;us <i>today</i>!</p><script>var a = 1;</script></body></html>", ".html")
+markdown = parse("markdown", "# Plans\n\nThe **Premium** plan includes [monitoring](/m) and `backups`.\n"
+                             "- Uses snake_case_names\n", ".md")
+csv_text = parse("csv", "plan,price\nBasic,$49\nPremium,$99\n", ".csv")
+
+with tempfile.TemporaryDirectory() as tmp:
+    source = os.path.join(tmp, "doc.txt")
+    with open(source, "w", encoding="utf-8") as f:
+        f.write("First paragraph.\n\nSecond paragraph.\n")
+    stats = extract_to_file(source, "text", os.path.join(tmp, "doc.txt.out"))
+    with open(os.path.join(tmp, "doc.txt.out"), encoding="utf-8") as f:
+        extracted = f.read()
+
+results = [
+    check("format detected by extension", detect_format("Report.PDF") == "pdf" and detect_format("faq.md") == "markdown"),
+    check("format detected by content type", detect_format("upload", "text/html; charset=utf-8") == "html"),
+    check("unknown formats are rejected", unsupported("archive.zip")),
+    check("HTML inline markup keeps the spaces around words",
+          "Our Premium plan costs $99 per month." in words(html)),
+    check("HTML entities are decoded", "Call us today!" in words(html)),
+    check("HTML scripts, styles and head are dropped",
+          "var a" not in html and "p {}" not in html and "x" not in words(html).split()),
+    check("HTML block tags separate paragraphs", "\n\n" in html.strip()),
+    check("Markdown syntax is removed",
+          "The Premium plan includes monitoring and backups." in words(markdown) and "#" not in markdown),
+    check("Markdown leaves snake_case alone", "snake_case_names" in markdown),
+    check("CSV rows read as facts", "plan: Basic. price: $49." in csv_text and "plan: Premium. price: $99." in csv_text),
+    check("extract_to_file writes the text and reports stats",
+          extracted == "First paragraph.\n\nSecond paragraph.\n" and stats["chars"] == len(extracted)),
+]
+
+print("\n" + "=" * 70)
+print("✅ ALL PASSED" if all(results) else "❌ SOME CHECKS FAILED")
+print("=" * 70)
+sys.exit(0 if all(results) else 1)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test Embedding Backend Parity
+
+Checks that the quantized / ONNX embedding backends produce embeddings
+close enough to the fp32 torch embeddings already stored in ChromaDB:
+per-sentence cosine similarity and top-3 retrieval agreement.
+
+Usage:
+    python3 test_embedding_backend.py [backend ...]   (default: torch-int8 onnx)
+"""
+
+import sys
+
+import numpy as np
+
+from embedding_backend import load_embedder
+
+EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+MIN_COSINE = 0.98
+MIN_TOP3_AGREEMENT = 0.9
+
+CORPUS = [
+    "Technology Mindz provides Salesforce, AI, Managed IT, Cybersecurity, and Microsoft Dynamics 365 services.",
+    "Our managed IT plans start at $1,250 per month with 24/7 monitoring.",
+    "We offer staff augmentation and CRM consulting for mid-size teams.",
+    "Our office hours are Monday to Friday, 9 AM to 6 PM Eastern.",
+    "The cybersecurity audit covers penetration testing and compliance reviews.",
+    "Our AI team builds custom chatbots and voice agents.",
+    "Dynamics 365 migrations usually take six to ten weeks.",
+    "You can reach the sales team at (555) 123-4567.",
+    "We have helped over 1,200 companies since 2015.",
+    "Web and mobile app development projects start with a discovery workshop.",
+]
+QUERIES = [
+    "What services do you provide?",
+    "How much does managed IT cost?",
+    "When are you open?",
+    "Do you do security testing?",
+    "Can you build a chatbot for us?",
+    "How long does a Dynamics migration take?",
+    "What's your phone number?",
+    "Do you do mobile apps?",
+]
+
+
+def encode(model, device, texts):
+    return np.asarray(model.encode(texts, device=device, convert_to_numpy=True,
+                                   normalize_embeddings=True, show_progress_bar=False), dtype=np.float32)
+
+
+def top3(corpus_emb, query_emb):
+    return [set(np.argsort(-(corpus_emb @ q))[:3]) for q in query_emb]
+
+
+print("=" * 70)
+print("🧪 EMBEDDING BACKEND PARITY TEST")
+print("=" * 70)
+
+backends = sys.argv[1:] or ["torch-int8", "onnx"]
+baseline, base_device, _ = load_embedder(EMBED_MODEL, "cpu", "torch")
+base_corpus = encode(baseline, base_device, CORPUS)
+base_queries = encode(baseline, base_device, QUERIES)
+base_top3 = top3(base_corpus, base_queries)
+
+failed = False
+for backend in backends:
+    model, device, loaded = load_embedder(EMBED_MODEL, "cpu", backend)
+    corpus = encode(model, device, CORPUS)
+    queries = encode(model, device, QUERIES)
+
+    cosines = np.concatenate([(corpus * base_corpus).sum(1), (queries * base_queries).sum(1)])
+    agreement = np.mean([len(a & b) / 3 for a, b in zip(base_top3, top3(corpus, queries))])
+    ok = cosines.min() >= MIN_COSINE and agreement >= MIN_TOP3_AGREEMENT
+    failed |= not ok
+
+    print(f"\n{'✅' if ok else '❌'} {backend}" + (f" (unavailable, loaded {loaded})" if loaded != backend else ""))
+    print(f"   cosine vs fp32: min {cosines.min():.4f}  mean {cosines.mean():.4f}  (need >= {MIN_COSINE})")
+    print(f"   top-3 agreement: {agreement:.2%}  (need >= {MIN_TOP3_AGREEMENT:.0%})")
+
+print("\n" + "=" * 70)
+print("❌ PARITY FAILED" if failed else "✅ TEST COMPLETE")
+print("=" * 70)
+sys.exit(1 if failed else 0)
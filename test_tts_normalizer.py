@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Test TTS Normalizer
+
+Checks how numerals are spoken: slashes read as dates only with date
+context, simple fractions, digit-by-digit codes, and negative numbers.
+
+Usage:
+    python3 test_tts_normalizer.py
+"""
+
+import sys
+
+from tts_normalizer import TTSNormalizer
+
+normalize = TTSNormalizer(language="en").normalize
+
+
+def check(name, condition):
+    print(f"{'✅' if condition else '❌'} {name}")
+    return condition
+
+
+print("=" * 70)
+print("🧪 TTS NORMALIZER TEST")
+print("=" * 70)
+
+results = [
+    check("a slash with a year is a date",
+          normalize("Billed on 5/12/2024.") == "Billed on May twelfth, twenty twenty-four."),
+    check("a slash next to a weekday is a date", normalize("See you Monday 5/12.") == "See you Monday May twelfth."),
+    check("a slash without date context is not a date", normalize("It is due 5/12.") == "It is due 5/12."),
+    check("simple fractions are spoken",
+          normalize("Add 1/2 cup and 3/4 spoon.") == "Add one half cup and three quarters spoon."),
+    check("24/7 is left as written", normalize("Support is open 24/7.") == "Support is open 24/7."),
+    check("emergency numbers are read digit by digit", normalize("Call 911 now.") == "Call nine one one now."),
+    check("a number after a name is read digit by digit",
+          normalize("We run Microsoft Dynamics 365.") == "We run Microsoft Dynamics three six five."),
+    check("quantities stay numbers",
+          normalize("Add 250 grams, we have 365 days.") == "Add two hundred fifty grams, we have three hundred sixty-five days."),
+    check("a leading minus is spoken", normalize("It is -5 degrees.") == "It is minus five degrees."),
+    check("a hyphen between numbers is not a minus", "minus" not in normalize("The 2020-21 season.")),
+]
+
+print("\n" + "=" * 70)
+print("✅ ALL PASSED" if all(results) else "❌ SOME CHECKS FAILED")
+print("=" * 70)
+sys.exit(0 if all(results) else 1)
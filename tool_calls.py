@@ -0,0 +1,210 @@
+"""
+Tool Call Detection Module
+
+Builds native tool schemas from agent tools and detects tool calls in the
+LLM stream as soon as they are complete, so they can be dispatched while the
+preceding sentence is still being spoken.
+"""
+
+import json
+from typing import Dict, List, Optional, Tuple
+
+from utils import _logger, parse_llm_response
+
+# Built-in call-control tools, always offered in native tool-calling mode
+BUILTIN_TOOL_SCHEMAS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "end_call",
+            "description": "End the phone call when the caller says goodbye or wants to hang up",
+            "parameters": {"type": "object", "properties": {}, "required": []}
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "transfer_call",
+            "description": "Transfer the caller to a human in the given department (asks the caller to confirm first)",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "department": {
+                        "type": "string",
+                        "enum": ["sales", "support", "technical"],
+                        "description": "Department to transfer to"
+                    }
+                },
+                "required": ["department"]
+            }
+        }
+    }
+]
+
+# Tools that change call state; these run after the response has been queued
+CALL_CONTROL_TOOLS = ("end_call", "transfer_call")
+
+_MARKER_OPENERS = ("[TOOL:", "[CONFIRM_TOOL:")
+_MAX_MARKER_LEN = 200
+
+
+def tool_schema(tool: Dict) -> Dict:
+    """Convert an agent tool (AgentTool row as dict) into a native function schema"""
+    params = tool.get("parameters") or {}
+
+    if "properties" in params:
+        # Already a JSON schema
+        schema = {"type": "object", **params}
+    else:
+        # ToolCreate format: {"name": {"type", "required", "description"}}
+        properties = {}
+        required = []
+        for name, spec in params.items():
+            spec = spec if isinstance(spec, dict) else {"type": str(spec)}
+            properties[name] = {
+                "type": spec.get("type", "string"),
+                "description": spec.get("description", "")
+            }
+            if spec.get("enum"):
+                properties[name]["enum"] = spec["enum"]
+            if spec.get("required"):
+                required.append(name)
+        schema = {"type": "object", "properties": properties, "required": required}
+
+    return {
+        "type": "function",
+        "function": {
+            "name": tool["tool_name"],
+            "description": tool.get("description", ""),
+            "parameters": schema
+        }
+    }
+
+
+def build_tool_schemas(agent_tools: Optional[List[Dict]]) -> List[Dict]:
+    """Native tool list for an agent: built-ins plus its active custom tools"""
+    return BUILTIN_TOOL_SCHEMAS + [tool_schema(t) for t in (agent_tools or [])]
+
+
+def _param_names(tool: Dict) -> List[str]:
+    params = tool.get("parameters") or {}
+    if "properties" in params:
+        params = params["properties"]
+    return list(params.keys())
+
+
+def map_positional_params(tool_data: Dict, agent_tools: Optional[List[Dict]]) -> Dict:
+    """
+    Rename marker params (param1, param2, ...) to the tool's declared names.
+
+    `[TOOL:weather:Paris]` becomes {"location": "Paris"} when the tool declares
+    a `location` parameter. Parts written as `name=value` are kept by name.
+    """
+    tool = next((t for t in (agent_tools or []) if t["tool_name"] == tool_data["tool"]), None)
+    names = _param_names(tool) if tool else []
+
+    mapped = {}
+    for idx, (key, value) in enumerate(tool_data.get("params", {}).items()):
+        if key.startswith("param") and "=" in value:
+            name, _, value = value.partition("=")
+            mapped[name.strip()] = value.strip()
+        elif key.startswith("param") and idx < len(names):
+            mapped[names[idx]] = value
+        else:
+            mapped[key] = value
+
+    return {**tool_data, "params": mapped}
+
+
+def native_tool_call_to_tool_data(call, agent_tools: Optional[List[Dict]] = None) -> Optional[Dict]:
+    """Convert an Ollama `message.tool_calls` entry into the tool_data dict used by execute_detected_tool"""
+    try:
+        function = call["function"]
+        name = function["name"]
+        arguments = function.get("arguments") or {}
+        if isinstance(arguments, str):
+            arguments = json.loads(arguments) if arguments.strip() else {}
+    except Exception as e:
+        _logger.warning(f"⚠️ Malformed tool call from model: {call} ({e})")
+        return None
+
+    if name == "end_call":
+        return {"tool": "end_call", "params": {"reason": "user_requested"}, "requires_confirmation": False}
+
+    if name == "transfer_call":
+        department = str(arguments.get("department", "sales")).strip()
+        if department not in ("sales", "support", "technical"):
+            _logger.warning(f"❌ Invalid department: {department}")
+            return None
+        return {"tool": "transfer_call", "params": {"department": department}, "requires_confirmation": True}
+
+    if agent_tools is not None and not any(t["tool_name"] == name for t in agent_tools):
+        _logger.warning(f"⚠️ Model called unknown tool: {name}")
+        return None
+
+    return {"tool": name, "params": dict(arguments), "requires_confirmation": False}
+
+
+def can_dispatch_early(tool_data: Dict) -> bool:
+    """Custom (webhook) tools can run while speech continues; call control waits for the response"""
+    return tool_data["tool"] not in CALL_CONTROL_TOOLS and not tool_data.get("requires_confirmation")
+
+
+class StreamingToolCallDetector:
+    """
+    Strip `[TOOL:...]` / `[CONFIRM_TOOL:...]` markers from the token stream and
+    report each one the moment its closing bracket arrives.
+
+    Text after an unclosed '[' that may still become a marker is held back so
+    markers split across tokens are never spoken.
+    """
+
+    def __init__(self, agent_tools: Optional[List[Dict]] = None):
+        self.agent_tools = agent_tools
+        self.pending = ""
+
+    def feed(self, token: str) -> Tuple[str, List[Dict]]:
+        """Return (speakable text, completed tool calls) for this token"""
+        text = self.pending + token
+        self.pending = ""
+        spoken = []
+        calls = []
+
+        while text:
+            start = text.find("[")
+            if start < 0:
+                spoken.append(text)
+                break
+
+            spoken.append(text[:start])
+            rest = text[start:]
+            end = rest.find("]")
+
+            if end < 0:
+                if self._may_be_marker(rest):
+                    self.pending = rest
+                else:
+                    spoken.append(rest)
+                break
+
+            marker = rest[:end + 1]
+            if marker.startswith(_MARKER_OPENERS):
+                _, tool_data = parse_llm_response(marker)
+                if tool_data:
+                    calls.append(map_positional_params(tool_data, self.agent_tools))
+            else:
+                spoken.append(marker)
+            text = rest[end + 1:]
+
+        return "".join(spoken), calls
+
+    def flush(self) -> str:
+        """Release held-back text at end of stream (an unterminated marker)"""
+        pending, self.pending = self.pending, ""
+        return "" if pending.startswith(_MARKER_OPENERS) else pending
+
+    @staticmethod
+    def _may_be_marker(text: str) -> bool:
+        if len(text) > _MAX_MARKER_LEN:
+            return False
+        return any(text.startswith(o) or o.startswith(text) for o in _MARKER_OPENERS)
@@ -0,0 +1,275 @@
+"""
+Tool Executor Module
+
+Runs agent webhook tools over a shared connection pool with per-tool
+timeouts and concurrency limits, a circuit breaker per webhook URL, and an
+optional TTL result cache for idempotent tools.
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime as dt
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+import metrics
+from models import AgentTool, SessionLocal
+from utils import (
+    _logger, TOOL_TIMEOUT_SECS, TOOL_MAX_CONCURRENCY, TOOL_POOL_MAX_CONNECTIONS,
+    TOOL_CIRCUIT_FAILURES, TOOL_CIRCUIT_COOLDOWN_SECS
+)
+
+_CACHE_MAX_ENTRIES = 1000
+
+
+class CircuitBreaker:
+    """
+    Closed → open after N consecutive failures; after the cooldown a single
+    half-open probe is let through and its outcome closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = TOOL_CIRCUIT_FAILURES,
+                 cooldown_secs: float = TOOL_CIRCUIT_COOLDOWN_SECS):
+        self.failure_threshold = failure_threshold
+        self.cooldown_secs = cooldown_secs
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.probing or time.monotonic() - self.opened_at >= self.cooldown_secs:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.probing:
+                _logger.warning(f"🔌 Circuit opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+    def release_probe(self):
+        """The probe ended with no outcome (e.g. cancelled by a hang-up); let the next call probe"""
+        self.probing = False
+
+
+class ToolExecutor:
+    """Shared webhook-tool runner; one instance per process (`tool_executor`)"""
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._registry: Dict[str, Dict[str, Dict]] = {}
+        self._semaphores: Dict[Tuple[str, str], asyncio.Semaphore] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._cache: Dict[Tuple[str, str, str], Tuple[float, Dict]] = {}
+
+    # ---------- connection pool ----------
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=TOOL_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=TOOL_POOL_MAX_CONNECTIONS // 2
+                ),
+                headers={"Content-Type": "application/json"}
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ---------- tool registry ----------
+
+    def get_tools(self, agent_id: str) -> Dict[str, Dict]:
+        """Active tools for an agent by name, loaded from the DB once and kept until invalidated"""
+        tools = self._registry.get(agent_id)
+        if tools is None:
+            db = SessionLocal()
+            try:
+                tools = {
+                    t.tool_name: {
+                        "tool_name": t.tool_name,
+                        "description": t.description,
+                        "webhook_url": t.webhook_url,
+                        "parameters": t.parameters or {},
+                        "timeout_secs": t.timeout_secs,
+                        "max_concurrency": t.max_concurrency,
+                        "cache_ttl_secs": t.cache_ttl_secs
+                    }
+                    for t in db.query(AgentTool).filter(
+                        AgentTool.agent_id == agent_id,
+                        AgentTool.is_active == True
+                    ).all()
+                }
+            finally:
+                db.close()
+            self._registry[agent_id] = tools
+        return tools
+
+    def invalidate(self, agent_id: str):
+        """Drop cached tool definitions, results and concurrency limits after an agent's tools change"""
+        self._registry.pop(agent_id, None)
+        for key in [k for k in self._cache if k[0] == agent_id]:
+            del self._cache[key]
+        # Calls already running keep the old semaphore; new calls get the new max_concurrency
+        for key in [k for k in self._semaphores if k[0] == agent_id]:
+            del self._semaphores[key]
+
+    # ---------- execution ----------
+
+    def _semaphore(self, agent_id: str, tool: Dict) -> asyncio.Semaphore:
+        key = (agent_id, tool["tool_name"])
+        sem = self._semaphores.get(key)
+        if sem is None:
+            sem = asyncio.Semaphore(tool.get("max_concurrency") or TOOL_MAX_CONCURRENCY)
+            self._semaphores[key] = sem
+        return sem
+
+    def _breaker(self, url: str) -> CircuitBreaker:
+        breaker = self._breakers.get(url)
+        if breaker is None:
+            breaker = self._breakers[url] = CircuitBreaker()
+        return breaker
+
+    def _cache_get(self, key) -> Optional[Dict]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if time.monotonic() >= expires:
+            del self._cache[key]
+            return None
+        return result
+
+    def _cache_put(self, key, ttl: int, result: Dict):
+        if len(self._cache) >= _CACHE_MAX_ENTRIES:
+            now = time.monotonic()
+            for k in [k for k, (exp, _) in self._cache.items() if exp <= now]:
+                del self._cache[k]
+            if len(self._cache) >= _CACHE_MAX_ENTRIES:
+                del self._cache[next(iter(self._cache))]
+        self._cache[key] = (time.monotonic() + ttl, result)
+
+    async def call(self, tool: Dict, parameters: dict, call_context: dict, agent_id: str = "") -> dict:
+        """POST a tool invocation to its webhook and normalise the response"""
+        tool_name = tool["tool_name"]
+        webhook_url = tool["webhook_url"]
+
+        ttl = tool.get("cache_ttl_secs") or 0
+        cache_key = (agent_id, tool_name, json.dumps(parameters, sort_keys=True, default=str))
+        if ttl > 0:
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                metrics.counter("tool_cache_hits", tool=tool_name).inc()
+                _logger.info(f"♻️ Tool cache hit: {tool_name}")
+                return cached
+            metrics.counter("tool_cache_misses", tool=tool_name).inc()
+
+        breaker = self._breaker(webhook_url)
+        if not breaker.allow():
+            metrics.counter("tool_circuit_rejections", tool=tool_name).inc()
+            _logger.warning(f"🔌 Circuit open for {tool_name}, skipping webhook")
+            return {"success": False, "error": "Tool temporarily unavailable", "tool_name": tool_name}
+        probe = breaker.probing  # This call is the half-open probe
+
+        payload = {
+            "tool_name": tool_name,
+            "parameters": parameters,
+            "call_context": call_context,
+            "timestamp": dt.utcnow().isoformat()
+        }
+        timeout = tool.get("timeout_secs") or TOOL_TIMEOUT_SECS
+
+        _logger.info(f"🔧 Calling webhook tool: {tool_name} at {webhook_url}")
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            async with self._semaphore(agent_id, tool):
+                response = await self.client.post(webhook_url, json=payload, timeout=timeout)
+
+            if response.status_code == 200:
+                outcome = "ok"
+                result = response.json()
+                _logger.info(f"✅ Webhook tool response: {result}")
+                result = {
+                    "success": True,
+                    "tool_name": tool_name,
+                    "response": result.get("response", result),
+                    "data": result.get("data", {}),
+                    "message": result.get("message", "")
+                }
+                breaker.record_success()
+                if ttl > 0:
+                    self._cache_put(cache_key, ttl, result)
+                return result
+
+            _logger.error(f"❌ Webhook returned status {response.status_code}")
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            return {
+                "success": False,
+                "error": f"Webhook returned status {response.status_code}",
+                "tool_name": tool_name
+            }
+
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            if probe:
+                breaker.release_probe()
+            raise
+        except (httpx.TimeoutException, asyncio.TimeoutError):
+            outcome = "timeout"
+            breaker.record_failure()
+            _logger.error(f"❌ Webhook timeout for {tool_name} after {timeout}s")
+            return {"success": False, "error": "Tool request timed out", "tool_name": tool_name}
+        except Exception as e:
+            breaker.record_failure()
+            _logger.error(f"❌ Webhook error for {tool_name}: {e}")
+            return {"success": False, "error": str(e), "tool_name": tool_name}
+        finally:
+            metrics.histogram("tool_latency_ms", tool=tool_name, outcome=outcome).observe(
+                (time.perf_counter() - start) * 1000
+            )
+
+    async def execute(self, agent_id: str, tool_name: str, parameters: dict, call_context: dict) -> dict:
+        """Look up an agent tool by name and run it"""
+        tool = self.get_tools(agent_id).get(tool_name)
+        if not tool or not tool.get("webhook_url"):
+            return {"success": False, "error": f"Unknown or inactive tool: {tool_name}"}
+        return await self.call(tool, parameters, call_context, agent_id=agent_id)
+
+    def status(self) -> Dict:
+        return {
+            "agents_cached": len(self._registry),
+            "cached_results": len(self._cache),
+            "circuits": {url: b.state for url, b in self._breakers.items()}
+        }
+
+
+tool_executor = ToolExecutor()
@@ -0,0 +1,464 @@
+"""
+TTS Text Normalizer Module
+
+Single-pass, precompiled text normalization for speech synthesis: strips
+markdown and expands numbers, currencies, phone numbers, dates, times and
+URLs into words the TTS voice reads naturally.
+"""
+
+import os
+import re
+import logging
+from functools import lru_cache
+from typing import Iterator, List, Optional
+
+_logger = logging.getLogger("new")
+
+TTS_EXPAND_NUMBERS = os.getenv("TTS_EXPAND_NUMBERS", "true").lower() == "true"
+
+
+# ================================
+# NUMBER SPELLING
+# ================================
+
+_ONES = [
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine",
+    "ten", "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen",
+    "seventeen", "eighteen", "nineteen"
+]
+_TENS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+_SCALES = [(10**12, "trillion"), (10**9, "billion"), (10**6, "million"), (1000, "thousand")]
+
+_ORDINAL_IRREGULAR = {
+    "one": "first", "two": "second", "three": "third", "five": "fifth",
+    "eight": "eighth", "nine": "ninth", "twelve": "twelfth"
+}
+
+_MONTHS = [
+    "January", "February", "March", "April", "May", "June", "July",
+    "August", "September", "October", "November", "December"
+]
+
+_WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# A bare "5/12" is only read as a date when a month or weekday is nearby
+_DATE_CONTEXT = re.compile(r"\b(?:" + "|".join(_MONTHS + _WEEKDAYS) + r")\b")
+_DATE_CONTEXT_CHARS = 32
+
+# Short codes are read digit by digit: "Call 911", "Microsoft Dynamics 365"
+_DIAL_BEFORE = re.compile(r"\b(?:call|dial|text|ring)\s+$", re.IGNORECASE)
+_NAME_BEFORE = re.compile(r"[^\s.!?:]\s+([A-Z][A-Za-z]*)\s+$")
+
+_SCALE_WORDS = {
+    "k": "thousand", "thousand": "thousand",
+    "m": "million", "mm": "million", "million": "million",
+    "b": "billion", "bn": "billion", "billion": "billion",
+}
+
+_CURRENCIES = {
+    "$": ("dollar", "dollars", "cent", "cents"),
+    "€": ("euro", "euros", "cent", "cents"),
+    "£": ("pound", "pounds", "penny", "pence"),
+    "₹": ("rupee", "rupees", "paisa", "paise"),
+}
+
+
+def _below_thousand(n: int) -> str:
+    words = []
+    if n >= 100:
+        words.append(f"{_ONES[n // 100]} hundred")
+        n %= 100
+    if n >= 20:
+        words.append(_TENS[n // 10] + (f"-{_ONES[n % 10]}" if n % 10 else ""))
+    elif n or not words:
+        words.append(_ONES[n])
+    return " ".join(words)
+
+
+def number_to_words(n: int) -> str:
+    """Spell an integer in English words"""
+    if n < 0:
+        return "minus " + number_to_words(-n)
+    if n < 1000:
+        return _below_thousand(n)
+
+    words = []
+    for value, name in _SCALES:
+        if n >= value:
+            words.append(f"{number_to_words(n // value)} {name}")
+            n %= value
+    if n:
+        words.append(_below_thousand(n))
+    return " ".join(words)
+
+
+def ordinal_to_words(n: int) -> str:
+    """Spell an integer as an English ordinal (21 -> twenty-first)"""
+    words = number_to_words(n)
+    head, sep, last = words.rpartition("-") if "-" in words.split(" ")[-1] else words.rpartition(" ")
+    if last in _ORDINAL_IRREGULAR:
+        last = _ORDINAL_IRREGULAR[last]
+    elif last.endswith("y"):
+        last = last[:-1] + "ieth"
+    else:
+        last += "th"
+    return f"{head}{sep}{last}"
+
+
+def year_to_words(n: int) -> str:
+    """Spell a year the way people say it (1999 -> nineteen ninety-nine)"""
+    if 2000 <= n <= 2009:
+        return number_to_words(n)
+    high, low = divmod(n, 100)
+    if low == 0:
+        return f"{number_to_words(high)} hundred"
+    if low < 10:
+        return f"{number_to_words(high)} oh {_ONES[low]}"
+    return f"{number_to_words(high)} {number_to_words(low)}"
+
+
+def digits_to_words(digits: str) -> str:
+    """Read a digit string one digit at a time"""
+    return " ".join(_ONES[int(d)] for d in digits if d.isdigit())
+
+
+def fraction_to_words(numerator: int, denominator: int) -> str:
+    """Spell a simple fraction (3/4 -> three quarters)"""
+    plural = numerator != 1
+    if denominator == 2:
+        unit = "halves" if plural else "half"
+    elif denominator == 4:
+        unit = "quarters" if plural else "quarter"
+    else:
+        unit = ordinal_to_words(denominator) + ("s" if plural else "")
+    return f"{number_to_words(numerator)} {unit}"
+
+
+def _decimal_to_words(text: str) -> str:
+    text = text.replace(",", "")
+    if text[:1] in "-−":
+        return "minus " + _decimal_to_words(text[1:])
+    whole, _, frac = text.partition(".")
+    spoken = number_to_words(int(whole or "0"))
+    if frac:
+        spoken += " point " + digits_to_words(frac)
+    return spoken
+
+
+# ================================
+# SINGLE-PASS PATTERN
+# ================================
+
+# Rule branches as (feature, regex). Alternation order matters: at a given
+# position the first branch that matches wins, so structural markdown comes
+# before the numeric rules and the more specific numeric shapes (phone, date,
+# time) come before plain numbers.
+_MINUS = r"(?:(?<![^\s(])[-−](?=\d))?"  # A sign, but not the hyphen in "2020-21"
+
+_RULES = [
+    (None, r"(?P<fence>```[\s\S]*?```)"),
+    (None, r"(?P<marker>\[[A-Z_]+:[^\]\n]*\])"),
+    (None, r"(?P<line>^[ \t]*(?:\#{1,6}[ \t]+|[-*+][ \t]+|\d+[.)][ \t]+))"),
+    (None, r"`(?P<code>[^`\n]+)`"),
+    (None, r"\[(?P<link>[^\]\n]+)\]\([^)\s]+\)"),
+    (None, r"\*\*(?P<bold>.+?)\*\*"),
+    (None, r"(?<!\w)__(?P<bold2>.+?)__(?!\w)"),
+    (None, r"~~(?P<strike>.+?)~~"),
+    (None, r"\*(?P<ital>[^*\n]+?)\*"),
+    (None, r"(?<!\w)_(?P<ital2>[^_\n]+?)_(?!\w)"),
+    (None, r"(?P<url>(?:https?://|www\.)[^\s<>()]+[^\s<>().,!?;:'\"])"),
+    (None, r"(?P<email>[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b)"),
+    ("digit", r"""(?P<money>(?P<cur>[$€£₹])\s?(?P<amount>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)
+        (?:\s?(?P<scale>thousand|million|billion|bn|mm|[kKmMbB])\b)?)"""),
+    ("digit", r"""(?P<phone>(?<![\w.])(?:\+?1[\s.-]?)?(?:\(\d{3}\)\s?|\d{3}[\s.-])\d{3}[\s.-]\d{4}(?!\d)
+        |(?<![\w.])\+\d{1,3}(?:[\s.-]?\d{2,5}){2,4}(?!\d))"""),
+    ("digit", r"(?P<iso>\b(?P<iy>\d{4})-(?P<im>0?[1-9]|1[0-2])-(?P<id>0?[1-9]|[12]\d|3[01])\b)"),
+    ("digit", r"(?P<us>\b(?P<um>0?[1-9]|1[0-2])/(?P<ud>0?[1-9]|[12]\d|3[01])/(?P<uy>\d{4}|\d{2})\b)"),
+    ("digit", r"(?P<slash>\b(?P<sa>\d{1,2})/(?P<sb>\d{1,2})\b)"),
+    ("digit", r"(?P<time>\b(?P<hh>[01]?\d|2[0-3]):(?P<mm>[0-5]\d)(?:\s?(?P<ampm>[AaPp])\.?[Mm]\.?)?(?!\w))"),
+    ("digit", r"(?P<pct>" + _MINUS + r"\b\d+(?:\.\d+)?)\s?%"),
+    ("digit", r"(?P<ord>\b\d+)(?:st|nd|rd|th)\b"),
+    ("digit", r"(?P<num>" + _MINUS + r"(?:\b\d{1,3}(?:,\d{3})+(?:\.\d+)?\b|\b\d+\.\d+\b|\b\d+\b))"),
+    (None, r"(?P<amp>(?<=\s)&(?=\s))"),
+    (None, r"(?P<sym>[*#~|<>{}\[\]])"),
+]
+
+_PATTERN = re.compile("|".join(rx for _, rx in _RULES), re.VERBOSE | re.MULTILINE)
+_PATTERN_NO_DIGITS = re.compile(
+    "|".join(rx for feature, rx in _RULES if feature != "digit"), re.VERBOSE | re.MULTILINE
+)
+
+# The rules are only tried where one of them can start. Finding those positions
+# is a single charset scan, so plain stretches of text cost almost nothing and
+# a sentence without any trigger character skips the regex work entirely.
+_TRIGGER_CHARS = "`*_~#[]<>{}|&$€£₹+(-−0123456789\n"
+_TRIGGERS = frozenset(_TRIGGER_CHARS)
+_CANDIDATE = re.compile("[" + re.escape(_TRIGGER_CHARS) + "]")
+_URL_START = re.compile(r"https?://|www\.")
+_EMAIL_START = re.compile(r"(?<![\w.+-])[\w.+-]+@")
+
+
+def _candidates(text: str) -> List[int]:
+    positions = [0]
+    for m in _CANDIDATE.finditer(text):
+        i = m.start()
+        # Line rules (headers, bullets, numbered lists) start after a newline
+        positions.append(i + 1 if text[i] == "\n" else i)
+    if "://" in text or "www." in text:
+        positions.extend(m.start() for m in _URL_START.finditer(text))
+    if "@" in text:
+        positions.extend(m.start() for m in _EMAIL_START.finditer(text))
+    positions.sort()
+    return positions
+
+
+class TTSNormalizer:
+    """Compiled per-voice normalizer; one regex pass per sentence"""
+
+    def __init__(self, language: str = "en", expand_numbers: bool = True):
+        self.language = language
+        # Spelled-out numerics are English only; other voices get markdown
+        # stripping and URL/whitespace cleanup but keep their digits.
+        self.expand_numbers = expand_numbers and language == "en"
+        self._match = (_PATTERN if self.expand_numbers else _PATTERN_NO_DIGITS).match
+
+    def normalize(self, text: str) -> str:
+        """Return speakable text for one sentence or paragraph"""
+        if not text:
+            return ""
+        if _TRIGGERS.isdisjoint(text) and "://" not in text and "www." not in text and "@" not in text:
+            return " ".join(text.split())
+
+        parts = []
+        pos = 0
+        for i in _candidates(text):
+            if i < pos:
+                continue
+            m = self._match(text, i)
+            if m and m.end() > i:
+                parts.append(text[pos:i])
+                parts.append(self._replace(m))
+                pos = m.end()
+        parts.append(text[pos:])
+        return " ".join("".join(parts).split())
+
+    # Each branch returns the spoken form of its match; nested markdown is
+    # normalized recursively on the (short) inner span only.
+    def _replace(self, m: "re.Match") -> str:
+        kind = m.lastgroup
+        if kind == "amp":
+            return "and"
+        if kind in ("fence", "marker", "line", "sym"):
+            return ""
+        if kind in ("code", "link", "bold", "bold2", "strike", "ital", "ital2"):
+            return self.normalize(m.group(kind))
+        if kind == "url":
+            return self._url(m.group("url"))
+        if kind == "email":
+            user, _, domain = m.group("email").partition("@")
+            return f"{user.replace('.', ' dot ')} at {domain.replace('.', ' dot ')}"
+
+        if kind == "money":
+            return self._currency(m.group("cur"), m.group("amount"), m.group("scale"))
+        if kind == "phone":
+            return self._phone(m.group("phone"))
+        if kind == "iso":
+            return self._date(m.group("im"), m.group("id"), m.group("iy"))
+        if kind == "us":
+            return self._date(m.group("um"), m.group("ud"), m.group("uy"))
+        if kind == "slash":
+            return self._slash(m)
+        if kind == "time":
+            return self._time(m.group("hh"), m.group("mm"), m.group("ampm"))
+        if kind == "pct":
+            return f"{_decimal_to_words(m.group('pct'))} percent"
+        if kind == "ord":
+            return ordinal_to_words(int(m.group("ord")))
+        if kind == "num":
+            num = m.group("num")
+            if self._is_code(m.string, m.start(), num):
+                return digits_to_words(num)
+            return self._number(num)
+        return m.group(0)
+
+    @staticmethod
+    def _url(url: str) -> str:
+        host = re.sub(r"^(?:https?://)?(?:www\.)?", "", url, flags=re.IGNORECASE)
+        host = host.split("/", 1)[0]
+        return host.replace(".", " dot ")
+
+    @staticmethod
+    def _currency(symbol: str, amount: str, scale: Optional[str]) -> str:
+        unit, units, sub, subs = _CURRENCIES[symbol]
+        if scale:
+            return f"{_decimal_to_words(amount)} {_SCALE_WORDS[scale.lower()]} {units}"
+
+        whole, _, frac = amount.replace(",", "").partition(".")
+        whole_n = int(whole or "0")
+        spoken = f"{number_to_words(whole_n)} {unit if whole_n == 1 else units}"
+        if frac:
+            cents = int((frac + "0")[:2])
+            if cents:
+                spoken += f" and {number_to_words(cents)} {sub if cents == 1 else subs}"
+        return spoken
+
+    @staticmethod
+    def _phone(phone: str) -> str:
+        groups = re.findall(r"\d+", phone)
+        spoken = ", ".join(digits_to_words(g) for g in groups)
+        return ("plus " + spoken) if phone.lstrip().startswith("+") else spoken
+
+    @staticmethod
+    def _date(month: str, day: str, year: Optional[str]) -> str:
+        spoken = f"{_MONTHS[int(month) - 1]} {ordinal_to_words(int(day))}"
+        if year:
+            y = int(year)
+            spoken += f", {year_to_words(y + 2000 if y < 100 else y)}"
+        return spoken
+
+    def _slash(self, m: "re.Match") -> str:
+        """A yearless a/b: a date next to a month or weekday, else a simple fraction"""
+        a, b = int(m.group("sa")), int(m.group("sb"))
+        text = m.string
+        context = text[max(0, m.start() - _DATE_CONTEXT_CHARS):m.end() + _DATE_CONTEXT_CHARS]
+        if 1 <= a <= 12 and 1 <= b <= 31 and _DATE_CONTEXT.search(context):
+            return self._date(m.group("sa"), m.group("sb"), None)
+        if 0 < a < b <= 10:
+            return fraction_to_words(a, b)
+        # "24/7", "50/50": the voice reads these fine as written
+        return m.group(0)
+
+    @staticmethod
+    def _is_code(text: str, start: int, num: str) -> bool:
+        """Whether a plain integer is a dialled or product code rather than a quantity"""
+        if not num.isdigit():
+            return False
+        before = text[max(0, start - 24):start]
+        if 3 <= len(num) <= 6 and _DIAL_BEFORE.search(before):
+            return True
+        # A mid-sentence capitalised word right before it is a name ("Boeing 747");
+        # sentence starts are skipped so "Add 250 grams" stays a quantity
+        name = _NAME_BEFORE.search(before)
+        return len(num) == 3 and bool(name) and not _DATE_CONTEXT.fullmatch(name.group(1))
+
+    @staticmethod
+    def _time(hours: str, minutes: str, ampm: Optional[str]) -> str:
+        h, mins = int(hours), int(minutes)
+        if mins == 0:
+            spoken = f"{number_to_words(h)} o'clock" if not ampm else number_to_words(h)
+        elif mins < 10:
+            spoken = f"{number_to_words(h)} oh {_ONES[mins]}"
+        else:
+            spoken = f"{number_to_words(h)} {number_to_words(mins)}"
+        if ampm:
+            spoken += " A M" if ampm.lower() == "a" else " P M"
+        return spoken
+
+    @staticmethod
+    def _number(num: str) -> str:
+        if num[:1] in "-−":
+            return "minus " + TTSNormalizer._number(num[1:])
+        if "." in num or "," in num:
+            return _decimal_to_words(num)
+        if len(num) > 1 and num.startswith("0"):
+            return digits_to_words(num)
+        if len(num) == 4 and 1100 <= int(num) <= 2099:
+            return year_to_words(int(num))
+        if len(num) > 7:
+            # Account numbers, confirmation codes: read digit by digit
+            return digits_to_words(num)
+        return number_to_words(int(num))
+
+
+def voice_language(voice_id: Optional[str]) -> str:
+    """Infer the voice language from a Deepgram model name (aura-2-thalia-en -> en)"""
+    if voice_id:
+        suffix = voice_id.rsplit("-", 1)[-1].lower()
+        if len(suffix) == 2 and suffix.isalpha():
+            return suffix
+    return "en"
+
+
+@lru_cache(maxsize=64)
+def get_normalizer(voice_id: Optional[str] = None) -> TTSNormalizer:
+    """Return the cached normalizer for a TTS voice"""
+    return TTSNormalizer(language=voice_language(voice_id), expand_numbers=TTS_EXPAND_NUMBERS)
+
+
+def normalize_for_tts(text: str, voice_id: Optional[str] = None) -> str:
+    """Strip markdown and expand numerics for the given voice"""
+    return get_normalizer(voice_id).normalize(text)
+
+
+# ================================
+# STREAMING SENTENCE SEGMENTATION
+# ================================
+
+# Abbreviations that practically never end a spoken sentence
+_ABBREVIATIONS = frozenset({
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "e.g", "i.e", "approx"
+})
+
+_LAST_WORD = re.compile(r"([\w.]+)\.$")
+
+
+class SentenceStream:
+    """
+    Accumulate LLM tokens and emit normalized sentences as they complete.
+
+    A sentence ends on '.', '?' or '!'. A '.' right after a digit is held until
+    the next token arrives so "$3." + "50" is not cut in the middle, and a '.'
+    after a title abbreviation ("Dr.") never ends the sentence.
+    """
+
+    def __init__(self, voice_id: Optional[str] = None):
+        self.normalizer = get_normalizer(voice_id)
+        self.buffer = ""
+        self._held = False
+
+    def feed(self, token: str) -> Iterator[str]:
+        """Add a token; yield any sentences it completes"""
+        if self._held:
+            self._held = False
+            if not token[:1].isdigit():
+                sentence = self._emit()
+                if sentence:
+                    yield sentence
+
+        self.buffer += token
+        stripped = self.buffer.rstrip()
+        if not stripped.endswith((".", "?", "!")):
+            return
+
+        if stripped.endswith("."):
+            if stripped[-2:-1].isdigit() and stripped == self.buffer:
+                self._held = True
+                return
+            m = _LAST_WORD.search(stripped)
+            if m and m.group(1).lower() in _ABBREVIATIONS:
+                return
+
+        sentence = self._emit()
+        if sentence:
+            yield sentence
+
+    def flush(self) -> Optional[str]:
+        """Emit whatever is left at the end of the stream"""
+        self._held = False
+        return self._emit() or None
+
+    def _emit(self) -> str:
+        raw, self.buffer = self.buffer.strip(), ""
+        return self.normalizer.normalize(raw) if raw else ""
+
+
+def split_sentences(text: str, voice_id: Optional[str] = None) -> List[str]:
+    """Split complete text into normalized sentences"""
+    stream = SentenceStream(voice_id)
+    sentences = []
+    for word in re.split(r"(\s+)", text):
+        sentences.extend(stream.feed(word))
+    tail = stream.flush()
+    if tail:
+        sentences.append(tail)
+    return sentences
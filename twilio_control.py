@@ -0,0 +1,91 @@
+"""
+Twilio Call Control Module
+
+Non-blocking wrappers for Twilio REST call operations. The twilio client is
+synchronous (requests), so calls run on a dedicated, bounded thread pool and
+never stall the event loop that carries live call audio.
+
+Set TWILIO_BACKEND=local to use an in-process stand-in that records
+operations instead of calling Twilio.
+"""
+
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt
+from functools import partial
+from types import SimpleNamespace
+from typing import Dict, List
+
+import metrics
+from utils import _logger, TWILIO_BACKEND, TWILIO_MAX_CONCURRENCY, twilio_client
+
+
+class TwilioCallControl:
+    """Call create/update on the Twilio REST API via an isolated executor"""
+
+    def __init__(self, client, max_concurrency: int = TWILIO_MAX_CONCURRENCY):
+        self.client = client
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="twilio")
+
+    async def _run(self, op: str, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+            outcome = "ok"
+            return result
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            metrics.histogram("twilio_api_ms", op=op, outcome=outcome).observe(elapsed_ms)
+            _logger.debug(f"☎️ Twilio {op} {outcome} in {elapsed_ms:.0f}ms")
+
+    async def create_call(self, **kwargs):
+        """calls.create(...); returns the Twilio call instance"""
+        return await self._run("create_call", self.client.calls.create, **kwargs)
+
+    async def update_call(self, call_sid: str, **kwargs):
+        """calls(sid).update(...), e.g. status="completed" or twiml=..."""
+        return await self._run("update_call", lambda: self.client.calls(call_sid).update(**kwargs))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class LocalCallControl:
+    """Stand-in with the same interface; every operation is appended to `operations`"""
+
+    def __init__(self):
+        self.operations: List[Dict] = []
+        self.calls: Dict[str, Dict] = {}
+
+    async def create_call(self, **kwargs):
+        call_sid = f"CA{uuid.uuid4().hex}"
+        self.calls[call_sid] = {"status": "queued", **kwargs}
+        self.operations.append({"op": "create_call", "call_sid": call_sid, "params": kwargs, "at": dt.utcnow().isoformat()})
+        metrics.histogram("twilio_api_ms", op="create_call", outcome="local").observe(0)
+        _logger.info(f"☎️ [local] Created call {call_sid} to {kwargs.get('to')}")
+        return SimpleNamespace(sid=call_sid, status="queued", **kwargs)
+
+    async def update_call(self, call_sid: str, **kwargs):
+        call = self.calls.setdefault(call_sid, {"status": "in-progress"})
+        call.update(kwargs)
+        self.operations.append({"op": "update_call", "call_sid": call_sid, "params": kwargs, "at": dt.utcnow().isoformat()})
+        metrics.histogram("twilio_api_ms", op="update_call", outcome="local").observe(0)
+        _logger.info(f"☎️ [local] Updated call {call_sid}: {list(kwargs.keys())}")
+        return SimpleNamespace(sid=call_sid, **call)
+
+    def shutdown(self):
+        pass
+
+
+def build_call_control():
+    if TWILIO_BACKEND == "local":
+        _logger.info("☎️ Using local Twilio stand-in (TWILIO_BACKEND=local)")
+        return LocalCallControl()
+    return TwilioCallControl(twilio_client)
+
+
+call_control = build_call_control()
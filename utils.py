@@ -12,17 +12,20 @@ import time
 import asyncio
 from logging.handlers import RotatingFileHandler
 from datetime import datetime as dt
-from typing import Dict, Optional, List, Tuple
+from typing import Dict, Optional, Tuple
 
 from dotenv import load_dotenv
 import torch
 import httpx
 import ollama
 from deepgram import DeepgramClient, DeepgramClientOptions
-from sentence_transformers import SentenceTransformer
+from embedding_backend import load_embedder, model_key
+from chunking import Chunker, model_token_budget, token_counter
 import chromadb
 from twilio.rest import Client as TwilioClient
 
+from tts_normalizer import normalize_for_tts
+
 # ================================
 # ENVIRONMENT CONFIGURATION
 # ================================
@@ -38,9 +41,41 @@ DEEPGRAM_VOICE = os.getenv("DEEPGRAM_VOICE", "aura-2-thalia-en")
 DATA_FILE = os.getenv("DATA_FILE", "./data/data.json")
 CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
 EMBED_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch").lower()  # "torch", "torch-int8" or "onnx" (see embedding_backend.py)
+EMBED_ONNX_FILE = os.getenv("EMBED_ONNX_FILE", "")  # e.g. onnx/model_qint8_avx2.onnx for the int8 ONNX export
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "3"))  # How long the embedding batcher waits for more requests
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))  # Texts per coalesced forward pass
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen2.5:14b")
-CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "384"))
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "0"))  # Knowledge chunk budget in model tokens; 0 = embedding model max
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
 TOP_K = int(os.getenv("TOP_K", "3"))
+RAG_MAX_DISTANCE = float(os.getenv("RAG_MAX_DISTANCE", "1.3"))  # Chroma L2 distance cut-off for relevant chunks
+RAG_SHARED_FALLBACK = os.getenv("RAG_SHARED_FALLBACK", "true").lower() == "true"  # Use "docs" when the agent KB has no match
+RAG_EMBED_CACHE_SIZE = int(os.getenv("RAG_EMBED_CACHE_SIZE", "2048"))  # Question → embedding LRU entries
+RAG_RESULT_CACHE_SIZE = int(os.getenv("RAG_RESULT_CACHE_SIZE", "1024"))  # Retrieval result LRU entries
+RAG_RESULT_CACHE_TTL_SECS = float(os.getenv("RAG_RESULT_CACHE_TTL_SECS", "300"))
+RAG_SPECULATIVE = os.getenv("RAG_SPECULATIVE", "true").lower() == "true"  # Retrieve on interim transcripts
+RAG_SPECULATIVE_MIN_WORDS = int(os.getenv("RAG_SPECULATIVE_MIN_WORDS", "3"))
+RAG_SPECULATIVE_NEW_WORDS = int(os.getenv("RAG_SPECULATIVE_NEW_WORDS", "2"))  # Growth before re-running an interim
+RAG_SPECULATIVE_MIN_SIMILARITY = float(os.getenv("RAG_SPECULATIVE_MIN_SIMILARITY", "0.95"))  # Cosine to reuse for a different final text
+RAG_SPECULATIVE_WORKERS = int(os.getenv("RAG_SPECULATIVE_WORKERS", "4"))
+RAG_EXACT_INDEX_MAX_CHUNKS = int(os.getenv("RAG_EXACT_INDEX_MAX_CHUNKS", "5000"))  # Brute-force in memory up to this size (0 = always Chroma)
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", "")  # If set, exact indexes are saved here and memory-mapped
+RAG_INDEX_MEMORY_MB = int(os.getenv("RAG_INDEX_MEMORY_MB", "1024"))  # In-process exact/int8/BM25 indexes, LRU-evicted above this
+CHROMA_MEMORY_LIMIT_MB = int(os.getenv("CHROMA_MEMORY_LIMIT_MB", "2048"))  # Chroma's loaded HNSW segments, LRU-evicted (0 = unbounded)
+RAG_QUANTIZATION = os.getenv("RAG_QUANTIZATION", "none")  # Default in-memory index format: "none" (float32) or "int8"
+RAG_RESCORE_FACTOR = int(os.getenv("RAG_RESCORE_FACTOR", "4"))  # int8 shortlist = top_k * factor, rescored in float32
+RAG_HYBRID = os.getenv("RAG_HYBRID", "true").lower() == "true"  # Fuse BM25 with vector search
+RAG_LEXICAL_SHORTCUT = os.getenv("RAG_LEXICAL_SHORTCUT", "true").lower() == "true"  # Skip embedding on exact identifier hits
+RAG_GATE = os.getenv("RAG_GATE", "true").lower() == "true"  # Skip retrieval for turns that don't need the KB
+RAG_GATE_THRESHOLD = float(os.getenv("RAG_GATE_THRESHOLD", "0.5"))  # Min gate probability to retrieve
+# HNSW parameters for new Chroma collections (Chroma defaults: M=16, construction_ef=100, search_ef=10)
+CHROMA_HNSW_METADATA = {
+    "hnsw:space": "l2",
+    "hnsw:M": int(os.getenv("CHROMA_HNSW_M", "16")),
+    "hnsw:construction_ef": int(os.getenv("CHROMA_HNSW_CONSTRUCTION_EF", "200")),
+    "hnsw:search_ef": int(os.getenv("CHROMA_HNSW_SEARCH_EF", "64")),
+}
 
 # 🎯 SMART INTERRUPT SETTINGS - Optimized for fast, natural interruption
 INTERRUPT_ENABLED = os.getenv("INTERRUPT_ENABLED", "true").lower() == "true"
@@ -61,6 +96,48 @@ ENABLE_INTERIM_PROCESSING = os.getenv("ENABLE_INTERIM_PROCESSING", "false").lowe
 INTERIM_MIN_LENGTH = int(os.getenv("INTERIM_MIN_LENGTH", "5"))  # Min chars to process
 INTERIM_CONFIDENCE_THRESHOLD = float(os.getenv("INTERIM_CONFIDENCE_THRESHOLD", "0.7"))  # Min confidence (0-1)
 
+# ✅ RESUME AFTER FALSE INTERRUPT
+# After a barge-in, unheard audio is parked this long; a cough or "uh-huh" resumes it
+RESUME_AFTER_FALSE_INTERRUPT = os.getenv("RESUME_AFTER_FALSE_INTERRUPT", "true").lower() == "true"
+FALSE_INTERRUPT_WINDOW_MS = int(os.getenv("FALSE_INTERRUPT_WINDOW_MS", "2500"))
+
+# ✅ TOOL CALLING
+# false: LLM requests tools with [TOOL:...] text markers
+# true: use the model's native structured tool calling with AgentTool schemas
+NATIVE_TOOL_CALLING = os.getenv("NATIVE_TOOL_CALLING", "false").lower() == "true"
+
+# ✅ TOOL WEBHOOK EXECUTION (defaults; per-tool overrides live on AgentTool)
+TOOL_TIMEOUT_SECS = float(os.getenv("TOOL_TIMEOUT_SECS", "10"))
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "8"))  # Per tool
+TOOL_POOL_MAX_CONNECTIONS = int(os.getenv("TOOL_POOL_MAX_CONNECTIONS", "100"))
+TOOL_CIRCUIT_FAILURES = int(os.getenv("TOOL_CIRCUIT_FAILURES", "5"))  # Consecutive failures to open
+TOOL_CIRCUIT_COOLDOWN_SECS = float(os.getenv("TOOL_CIRCUIT_COOLDOWN_SECS", "30"))
+
+# ✅ WEBHOOK DELIVERY (persistent outbox + background workers)
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_MAX_PER_DESTINATION = int(os.getenv("WEBHOOK_MAX_PER_DESTINATION", "2"))  # In-flight per host
+WEBHOOK_TIMEOUT_SECS = float(os.getenv("WEBHOOK_TIMEOUT_SECS", "10"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_RETRY_BASE_SECS = float(os.getenv("WEBHOOK_RETRY_BASE_SECS", "2"))  # Doubles per attempt
+WEBHOOK_RETRY_MAX_SECS = float(os.getenv("WEBHOOK_RETRY_MAX_SECS", "600"))
+WEBHOOK_RETENTION_HOURS = int(os.getenv("WEBHOOK_RETENTION_HOURS", "72"))  # Keep delivered rows
+# High-rate events are combined per destination and sent every interval
+WEBHOOK_BATCHED_EVENTS = [e.strip() for e in os.getenv("WEBHOOK_BATCHED_EVENTS", "transcript.partial").split(",") if e.strip()]
+WEBHOOK_BATCH_INTERVAL_MS = int(os.getenv("WEBHOOK_BATCH_INTERVAL_MS", "1000"))
+WEBHOOK_BATCH_MAX_EVENTS = int(os.getenv("WEBHOOK_BATCH_MAX_EVENTS", "100"))  # Flush early at this size
+
+# ✅ KNOWLEDGE-BASE INGESTION JOBS
+INGEST_SPOOL_DIR = os.getenv("INGEST_SPOOL_DIR", "./data/ingest")  # Uploaded files wait here until indexed
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))  # Chunks per embedding call / Chroma write
+INGEST_MAX_FILE_MB = int(os.getenv("INGEST_MAX_FILE_MB", "100"))
+INGEST_PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))  # Document parser processes
+KB_SNAPSHOT_DIR = os.getenv("KB_SNAPSHOT_DIR", "./data/snapshots")  # Knowledge-base snapshot export/import (kb_snapshot.py)
+
+# ✅ TWILIO CALL CONTROL
+# twilio: REST API through a bounded thread pool; local: in-process stand-in for tests
+TWILIO_BACKEND = os.getenv("TWILIO_BACKEND", "twilio").lower()
+TWILIO_MAX_CONCURRENCY = int(os.getenv("TWILIO_MAX_CONCURRENCY", "8"))
+
 # Validation
 REQUIRE_ENV = [TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER, PUBLIC_URL, DEEPGRAM_API_KEY]
 if not all(REQUIRE_ENV):
@@ -185,18 +262,19 @@ except Exception as e:
     _logger.error(f"❌ Deepgram initialization failed: {e}")
 
 # 🚀 GPU-ACCELERATED EMBEDDING MODEL
-_logger.info(f"📦 Loading SentenceTransformer on {DEVICE}...")
+_logger.info(f"📦 Loading SentenceTransformer ({EMBED_BACKEND}) on {DEVICE}...")
 start_time = time.time()
 
-embedder = SentenceTransformer(EMBED_MODEL, device=DEVICE)
-embedder.eval()
+# The key follows the backend that actually loaded (a failed ONNX load falls back to torch)
+embedder, EMBED_DEVICE, EMBED_BACKEND = load_embedder(EMBED_MODEL, DEVICE, EMBED_BACKEND, EMBED_ONNX_FILE)
+EMBED_MODEL_KEY = model_key(EMBED_MODEL, EMBED_BACKEND, EMBED_ONNX_FILE)
 
-if DEVICE == 'cuda':
-    try:
-        embedder.half()
-        _logger.info("✅ FP16 precision enabled")
-    except Exception as e:
-        _logger.warning(f"⚠️ Could not enable FP16: {e}")
+# Knowledge chunks never exceed what the model can embed without truncation
+chunker = Chunker(
+    min(CHUNK_TOKENS or model_token_budget(embedder), model_token_budget(embedder)),
+    CHUNK_OVERLAP_TOKENS,
+    count_tokens=token_counter(embedder)
+)
 
 load_time = time.time() - start_time
 _logger.info(f"✅ Model loaded in {load_time:.2f}s")
@@ -205,15 +283,30 @@ _logger.info("🔥 Warming up GPU...")
 with torch.no_grad():
     _ = embedder.encode(
         ["warmup sentence for GPU initialization"],
-        device=DEVICE,
+        device=EMBED_DEVICE,
         show_progress_bar=False,
         convert_to_numpy=True,
         batch_size=1
     )
 _logger.info("✅ GPU warmed up")
 
-chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
-collection = chroma_client.get_or_create_collection("docs")
+def _open_chroma(path: str):
+    """PersistentClient that keeps at most CHROMA_MEMORY_LIMIT_MB of HNSW indexes loaded"""
+    if CHROMA_MEMORY_LIMIT_MB > 0:
+        try:
+            from chromadb.config import Settings
+            settings = Settings(
+                chroma_segment_cache_policy="LRU",
+                chroma_memory_limit_bytes=CHROMA_MEMORY_LIMIT_MB * 1024 * 1024
+            )
+            return chromadb.PersistentClient(path=path, settings=settings)
+        except Exception as e:
+            _logger.warning(f"⚠️ Chroma segment LRU cache unavailable ({e}), indexes stay loaded")
+    return chromadb.PersistentClient(path=path)
+
+
+chroma_client = _open_chroma(CHROMA_PATH)
+collection = chroma_client.get_or_create_collection("docs", metadata=CHROMA_HNSW_METADATA)
 
 response_cache = {}
 
@@ -232,39 +325,9 @@ def generate_conversation_id() -> str:
     return f"conv_{uuid.uuid4().hex[:16]}"
 
 
-def clean_markdown_for_tts(text: str) -> str:
-    """Remove markdown formatting before TTS to prevent reading symbols aloud"""
-    # Remove bold: **text** or __text__
-    text = re.sub(r'\*\*(.+?)\*\*', r'\1', text)
-    text = re.sub(r'__(.+?)__', r'\1', text)
-    
-    # Remove italic: *text* or _text_
-    text = re.sub(r'\*(.+?)\*', r'\1', text)
-    text = re.sub(r'_(.+?)_', r'\1', text)
-    
-    # Remove strikethrough: ~~text~~
-    text = re.sub(r'~~(.+?)~~', r'\1', text)
-    
-    # Remove code blocks: `text` or ```text```
-    text = re.sub(r'```[\s\S]*?```', '', text)
-    text = re.sub(r'`(.+?)`', r'\1', text)
-    
-    # Remove links: [text](url) -> text
-    text = re.sub(r'\[(.+?)\]\(.+?\)', r'\1', text)
-    
-    # Remove headers: # text -> text
-    text = re.sub(r'^#{1,6}\s+', '', text, flags=re.MULTILINE)
-    
-    # Remove bullet points: - text or * text -> text
-    text = re.sub(r'^[\-\*]\s+', '', text, flags=re.MULTILINE)
-    
-    # Remove numbered lists: 1. text -> text
-    text = re.sub(r'^\d+\.\s+', '', text, flags=re.MULTILINE)
-    
-    # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    return text
+def clean_markdown_for_tts(text: str, voice_id: Optional[str] = None) -> str:
+    """Remove markdown and expand numbers/dates/URLs before TTS (single compiled pass)"""
+    return normalize_for_tts(text, voice_id or DEEPGRAM_VOICE)
 
 
 def detect_intent(text: str) -> str:
@@ -277,6 +340,18 @@ def detect_intent(text: str) -> str:
     return "QUESTION"
 
 
+BACKCHANNEL_PHRASES = {
+    "", "uh huh", "uh-huh", "mhm", "mm hmm", "mm-hmm", "mmm", "hmm", "hm", "um", "uh", "ah", "oh",
+    "i see", "got it", "cool", "nice", "wow", "sorry", "go on", "continue"
+}  # No affirmatives ("yes", "okay", "go ahead"): those may answer a question or confirm an action
+
+
+def is_backchannel(text: str) -> bool:
+    """True for empty/filler utterances that don't take the floor ("uh-huh", "mhm", a cough)"""
+    t = re.sub(r"[^\w\s'-]", "", text.lower()).strip()
+    return t in BACKCHANNEL_PHRASES
+
+
 def detect_confirmation_response(text: str) -> Optional[str]:
     """Detect if user is confirming or rejecting a pending action"""
     text_lower = text.lower().strip()
@@ -378,27 +453,6 @@ def parse_llm_response(text: str) -> Tuple[str, Optional[dict]]:
     return clean_text, tool_data
 
 
-async def send_webhook(webhook_url: str, event: str, data: Dict) -> bool:
-    """Send webhook notification (fire-and-forget)"""
-    try:
-        if not webhook_url.startswith(("http://", "https://")):
-            _logger.error(f"❌ Invalid webhook URL: {webhook_url}")
-            return False
-        
-        async with httpx.AsyncClient() as client:
-            payload = {
-                "event": event,
-                "timestamp": dt.utcnow().isoformat(),
-                "data": data
-            }
-            response = await client.post(webhook_url, json=payload, timeout=10)
-            _logger.info(f"📤 Webhook sent: {event} to {webhook_url} (status: {response.status_code})")
-            return response.status_code == 200
-    except Exception as e:
-        _logger.error(f"❌ Webhook failed: {event} to {webhook_url} - {e}")
-        return False
-
-
 async def send_webhook_and_get_response(webhook_url: str, event: str, data: Dict) -> Optional[Dict]:
     """Send webhook and wait for response"""
     try:
@@ -425,16 +479,3 @@ async def send_webhook_and_get_response(webhook_url: str, event: str, data: Dict
     except Exception as e:
         _logger.error(f"❌ Webhook failed: {event} - {e}")
         return None
-
-
-def _chunk_text(text: str, chunk_size: int = 384, overlap: int = 50) -> List[str]:
-    """Simple text chunking for knowledge base"""
-    chunks = []
-    start = 0
-    
-    while start < len(text):
-        end = min(start + chunk_size, len(text))
-        chunks.append(text[start:end])
-        start = end - overlap
-    
-    return chunks
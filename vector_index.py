@@ -0,0 +1,176 @@
+"""
+Vector Index Module
+
+In-process exact nearest-neighbour index for small knowledge bases. The
+chunk embeddings live in one contiguous float32 matrix (optionally
+memory-mapped from disk), and a query is a single matrix-vector product, so
+agent KBs of a few hundred chunks skip Chroma's HNSW query path entirely.
+
+QuantizedIndex stores the same vectors as int8 codes and rescores a small
+shortlist in full precision, trading a little recall for ~4x less memory.
+
+Distances are squared L2, the same metric Chroma uses by default, so the
+RAG_MAX_DISTANCE cut-off applies unchanged.
+"""
+
+import hashlib
+import json
+import os
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def fingerprint(ids: Sequence[str], documents: Sequence[str]) -> str:
+    """Order-independent digest of a collection's (id, document) pairs"""
+    digest = hashlib.sha256()
+    for chunk_id, document in sorted(zip(ids, documents)):
+        digest.update(chunk_id.encode("utf-8") + b"\0" + (document or "").encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+class ExactIndex:
+    """Brute-force top-k over a contiguous float32 matrix"""
+
+    def __init__(self, ids: Sequence[str], documents: Sequence[str], embeddings):
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.fingerprint: Optional[str] = None  # Set for indexes loaded from disk
+        self.matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if self.matrix.ndim != 2:
+            self.matrix = self.matrix.reshape(len(self.ids), -1)
+        self.sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes + self.sq_norms.nbytes
+
+    def search(self, query_embedding, k: int) -> List[Tuple[str, float]]:
+        """(document, squared L2 distance) for the k nearest chunks, best first"""
+        n = len(self.ids)
+        if n == 0 or k <= 0:
+            return []
+        q = np.asarray(query_embedding, dtype=np.float32)
+        distances = self.sq_norms + np.dot(q, q) - 2.0 * (self.matrix @ q)
+
+        if k >= n:
+            order = np.argsort(distances)
+        else:
+            top = np.argpartition(distances, k - 1)[:k]
+            order = top[np.argsort(distances[top])]
+        return [(self.documents[i], float(max(distances[i], 0.0))) for i in order]
+
+    # ---------- persistence ----------
+
+    def save(self, path_prefix: str):
+        """Write <prefix>.npy (matrix) and <prefix>.json (ids + documents + fingerprint)"""
+        os.makedirs(os.path.dirname(path_prefix) or ".", exist_ok=True)
+        np.save(f"{path_prefix}.npy", self.matrix)
+        with open(f"{path_prefix}.json", "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "documents": self.documents,
+                       "fingerprint": fingerprint(self.ids, self.documents)}, f)
+
+    @classmethod
+    def load(cls, path_prefix: str, mmap: bool = True) -> "ExactIndex":
+        matrix = np.load(f"{path_prefix}.npy", mmap_mode="r" if mmap else None)
+        with open(f"{path_prefix}.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls.__new__(cls)
+        index.ids = meta["ids"]
+        index.documents = meta["documents"]
+        index.fingerprint = meta.get("fingerprint")
+        index.matrix = matrix
+        index.sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+        return index
+
+    @classmethod
+    def from_collection(cls, collection) -> "ExactIndex":
+        """Snapshot every chunk of a Chroma collection"""
+        data = collection.get(include=["embeddings", "documents"])
+        embeddings = data.get("embeddings")
+        if embeddings is None or len(embeddings) == 0:
+            return cls([], [], np.zeros((0, 0), dtype=np.float32))
+        return cls(data["ids"], data["documents"], np.asarray(embeddings, dtype=np.float32))
+
+
+class QuantizedIndex:
+    """
+    int8 scalar-quantized index (one scale per dimension, ~4x smaller than
+    float32). The top k * rescore_factor candidates by approximate distance
+    are rescored in full precision, taken from `full` (e.g. a memory-mapped
+    float32 matrix) or fetched by id through `fetch_full`.
+    """
+
+    _BLOCK_ROWS = 8192  # Rows dequantized at a time while scoring
+
+    def __init__(self, ids: Sequence[str], documents: Sequence[str], embeddings,
+                 rescore_factor: int = 4, full=None, fetch_full: Optional[Callable] = None):
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.rescore_factor = max(1, rescore_factor)
+        self.full = full
+        self.fetch_full = fetch_full
+
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(self.ids), -1)
+        scales = np.abs(matrix).max(axis=0) / 127.0 if len(matrix) else np.ones(matrix.shape[1], dtype=np.float32)
+        scales[scales == 0] = 1.0
+        self.scales = scales.astype(np.float32)
+        self.codes = np.ascontiguousarray(np.clip(np.round(matrix / self.scales), -127, 127).astype(np.int8))
+        self.sq_norms = np.concatenate([
+            np.einsum("ij,ij->i", block, block) for block in self._dequantized_blocks()
+        ]) if len(self.ids) else np.zeros(0, dtype=np.float32)
+
+    @classmethod
+    def from_exact(cls, exact: ExactIndex, rescore_factor: int = 4,
+                   fetch_full: Optional[Callable] = None) -> "QuantizedIndex":
+        """Quantize an exact index; a memory-mapped exact matrix is kept for rescoring"""
+        full = exact.matrix if isinstance(exact.matrix, np.memmap) else None
+        return cls(exact.ids, exact.documents, exact.matrix, rescore_factor,
+                   full=full, fetch_full=None if full is not None else fetch_full)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Resident bytes (a memory-mapped full-precision matrix is not counted)"""
+        return self.codes.nbytes + self.scales.nbytes + self.sq_norms.nbytes
+
+    def _dequantized_blocks(self):
+        for start in range(0, len(self.codes), self._BLOCK_ROWS):
+            yield self.codes[start:start + self._BLOCK_ROWS].astype(np.float32) * self.scales
+
+    def _full_rows(self, rows: np.ndarray) -> np.ndarray:
+        if self.full is not None:
+            return np.asarray(self.full[rows], dtype=np.float32)
+        if self.fetch_full is not None:
+            try:
+                return np.asarray(self.fetch_full([self.ids[i] for i in rows]), dtype=np.float32)
+            except Exception:
+                pass
+        return self.codes[rows].astype(np.float32) * self.scales
+
+    def search(self, query_embedding, k: int, rescore: bool = True) -> List[Tuple[str, float]]:
+        """(document, squared L2 distance) for the k nearest chunks, best first"""
+        n = len(self.ids)
+        if n == 0 or k <= 0:
+            return []
+        q = np.asarray(query_embedding, dtype=np.float32)
+        qq = float(np.dot(q, q))
+        dots = np.concatenate([block @ q for block in self._dequantized_blocks()])
+        distances = self.sq_norms + qq - 2.0 * dots
+
+        shortlist = min(n, k * self.rescore_factor) if rescore else min(n, k)
+        candidates = np.argpartition(distances, shortlist - 1)[:shortlist] if shortlist < n else np.arange(n)
+        if rescore:
+            rows = self._full_rows(candidates)
+            distances = np.full(n, np.inf, dtype=np.float32)
+            distances[candidates] = np.einsum("ij,ij->i", rows, rows) + qq - 2.0 * (rows @ q)
+
+        order = candidates[np.argsort(distances[candidates])][:k]
+        return [(self.documents[i], float(max(distances[i], 0.0))) for i in order]
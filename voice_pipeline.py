@@ -6,6 +6,7 @@ Handles speech-to-text, text-to-speech, interrupts, and voice pipeline
 
 import asyncio
 import base64
+import threading
 import time
 import struct
 import io
@@ -17,7 +18,7 @@ except ImportError:
     # audioop might not be available on Windows Python 3.13+
     # We'll implement a fallback in the code
     audioop = None
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 from collections import deque
 from datetime import datetime as dt
 
@@ -31,9 +32,18 @@ from utils import (
     _logger, DEEPGRAM_API_KEY, DEEPGRAM_VOICE, DEVICE, INTERRUPT_ENABLED,
     INTERRUPT_MIN_ENERGY, INTERRUPT_DEBOUNCE_MS, INTERRUPT_BASELINE_FACTOR,
     INTERRUPT_MIN_SPEECH_MS, SILENCE_THRESHOLD_SEC, UTTERANCE_END_MS,
-    OLLAMA_MODEL, TOP_K, deepgram, embedder, collection, clean_markdown_for_tts,
-    parse_llm_response
+    OLLAMA_MODEL, TOP_K, RESUME_AFTER_FALSE_INTERRUPT, FALSE_INTERRUPT_WINDOW_MS, RAG_SPECULATIVE,
+    deepgram, embedder, collection, clean_markdown_for_tts, parse_llm_response, is_backchannel
 )
+from retrieval import SpeculativeRetrieval
+from tts_normalizer import split_sentences
+from webhook_delivery import webhook_dispatcher
+import metrics
+
+# Extra wait beyond the expected audio length before giving up on mark echoes
+PLAYBACK_MARK_GRACE_SECS = 2.0
+# Typical Aura speaking rate, used to place the cut point inside a sentence still streaming
+TTS_CHARS_PER_SEC = 15.0
 
 
 # ================================
@@ -190,6 +200,175 @@ if audioop is None:
 
 
 
+class PlaybackTracker:
+    """
+    Tracks which queued audio the caller has actually heard.
+
+    A Twilio `mark` is sent after each sentence's audio; Twilio echoes it back
+    once playback reaches that point (marks are echoed in order, and also when
+    the buffer is cleared). Waiters resolve on the echo instead of sleeping.
+
+    Sentences of the current turn are kept as segments on a playback
+    timeline so that, on barge-in, the words the caller heard can be
+    recovered from the cut point.
+    """
+
+    def __init__(self):
+        self._seq = 0
+        self._pending: Dict[str, Tuple[asyncio.Future, float]] = {}  # name -> (future, sent_at), in send order
+        self._cleared: Dict[str, float] = {}  # marks dropped by clear() -> barge-in time
+        self.expected_end: float = 0.0  # Monotonic time the sent audio should finish playing
+
+        self.segments: List[Dict] = []  # Current turn: {"text", "start", "audio_ms", "frames", "mark", "heard"}
+        self.cut_text: Optional[str] = None  # Heard text when the current turn was cut off
+        self.unheard: List = []  # What clear() cut off: audio items (dict) and unsent text (str)
+
+    @property
+    def idle(self) -> bool:
+        return not self._pending
+
+    def remaining_secs(self) -> float:
+        return max(0.0, self.expected_end - time.monotonic())
+
+    # ---------- timeline ----------
+
+    def start_turn(self):
+        self.segments = []
+        self.cut_text = None
+        self.unheard = []
+
+    def begin_segment(self, text: str):
+        """A sentence is about to be synthesized and streamed"""
+        self.segments.append({"text": text, "start": None, "audio_ms": 0.0, "frames": [], "mark": None, "heard": False})
+
+    def on_audio_sent(self, frame: bytes):
+        """A 20ms mulaw frame of the current segment was sent; it plays after everything already queued"""
+        now = time.monotonic()
+        audio_ms = len(frame) / 8.0  # 8kHz, 1 byte per sample
+        if self.segments:
+            segment = self.segments[-1]
+            if segment["start"] is None:
+                segment["start"] = max(now, self.expected_end)
+            segment["audio_ms"] += audio_ms
+            segment["frames"].append(frame)  # Kept until heard so a false interrupt can resume
+        self.expected_end = max(self.expected_end, now) + audio_ms / 1000.0
+
+    def heard_text(self, at: Optional[float] = None) -> str:
+        """Text of the current turn the caller has heard by `at` (partial sentences by time)"""
+        at = time.monotonic() if at is None else at
+        heard = []
+        for segment in self.segments:
+            if segment["heard"]:
+                heard.append(segment["text"])
+                continue
+            if segment["start"] is None or at <= segment["start"]:
+                break
+            words = segment["text"].split()
+            # Unfinished sentences: estimate total length from text at the speaking rate
+            duration_ms = max(segment["audio_ms"], len(segment["text"]) * 1000.0 / TTS_CHARS_PER_SEC)
+            fraction = min(1.0, (at - segment["start"]) * 1000.0 / duration_ms)
+            heard.append(" ".join(words[:int(len(words) * fraction)]))
+            if fraction < 1.0:
+                break
+        return " ".join(h for h in heard if h)
+
+    def unheard_after(self, at: float) -> List:
+        """
+        Everything of the current turn not yet heard at `at`: remaining frames
+        of fully sent sentences as {"audio", "text"} items, and the remaining
+        words of a sentence whose synthesis was cut short as plain text.
+        """
+        items = []
+        for segment in self.segments:
+            if segment["heard"]:
+                continue
+            words = segment["text"].split()
+            elapsed_ms = (at - segment["start"]) * 1000.0 if segment["start"] is not None else 0.0
+            elapsed_ms = max(0.0, elapsed_ms)
+
+            if segment["mark"] is not None:
+                # Fully synthesized: resume from the exact frame
+                cut_frame = int(elapsed_ms // 20)
+                frames = segment["frames"][cut_frame:]
+                if frames:
+                    fraction = cut_frame / max(len(segment["frames"]), 1)
+                    items.append({"audio": frames, "text": " ".join(words[int(len(words) * fraction):])})
+            else:
+                duration_ms = max(segment["audio_ms"], len(segment["text"]) * 1000.0 / TTS_CHARS_PER_SEC)
+                fraction = min(1.0, elapsed_ms / duration_ms)
+                rest = " ".join(words[int(len(words) * fraction):])
+                if rest:
+                    items.append(rest)
+        return items
+
+    # ---------- marks ----------
+
+    def add_mark(self) -> str:
+        """Register a mark at the end of the audio sent so far"""
+        self._seq += 1
+        name = f"s{self._seq}"
+        if self.segments and self.segments[-1]["mark"] is None:
+            self.segments[-1]["mark"] = name
+        self._pending[name] = (asyncio.get_running_loop().create_future(), time.monotonic())
+        return name
+
+    def on_mark(self, name: Optional[str]):
+        """Twilio echoed a mark: that audio, and everything before it, has played"""
+        if name in self._cleared:
+            barge_in_at = self._cleared.pop(name)
+            if barge_in_at:
+                metrics.histogram("barge_in_silence_ms").observe((time.monotonic() - barge_in_at) * 1000)
+            return
+        if name not in self._pending:
+            return
+        for pending_name in list(self._pending):
+            future, sent_at = self._pending.pop(pending_name)
+            if not future.done():
+                future.set_result(True)
+            if pending_name == name:
+                metrics.histogram("playback_mark_lag_ms").observe((time.monotonic() - sent_at) * 1000)
+                break
+        for segment in self.segments:
+            segment["heard"] = True
+            segment["frames"] = []
+            if segment["mark"] == name:
+                break
+        if not self._pending:
+            self.expected_end = time.monotonic()
+
+    def clear(self, barge_in_at: Optional[float] = None):
+        """
+        Audio buffer was cleared; nothing pending will be heard. If this cut
+        the current turn short, `cut_text` records what was heard.
+        """
+        now = time.monotonic()
+        if any(not s["heard"] for s in self.segments):
+            self.cut_text = self.heard_text(now)
+            self.unheard = self.unheard_after(now)
+        # Twilio echoes cleared marks once its buffer is empty: that is the moment of silence
+        self._cleared = {name: barge_in_at for name in self._pending} if barge_in_at else {}
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.set_result(False)
+        self._pending.clear()
+        self.segments = [s for s in self.segments if s["heard"]]
+        self.expected_end = now
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """Wait until every sent mark is echoed; False on timeout"""
+        deadline = time.monotonic() + timeout
+        while self._pending:
+            last_future, _ = next(reversed(self._pending.values()))
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(asyncio.shield(last_future), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+
 class WSConn:
     """WebSocket connection state"""
     def __init__(self, ws: WebSocket):
@@ -216,6 +395,7 @@ class WSConn:
         self.custom_voice_id: Optional[str] = None
         self.custom_model: Optional[str] = None
         self.conversation_id: Optional[str] = None
+        self.agent_tools: List[Dict] = []  # Active custom tools, loaded at call start
 
         # Streaming STT
         self.deepgram_live = None
@@ -227,6 +407,10 @@ class WSConn:
         # Streaming TTS
         self.tts_queue: asyncio.Queue = asyncio.Queue(maxsize=50)
         self.tts_task: Optional[asyncio.Task] = None
+        self.playback = PlaybackTracker()
+        self.tts_cancel: asyncio.Event = asyncio.Event()  # Abort the sentence being synthesized
+        self.generation_cancel: Optional[threading.Event] = None  # Stop the LLM producer thread
+        self.parked_playback: Optional[Dict] = None  # Unheard reply kept briefly after a barge-in
 
         # Smart interrupt detection
         self.user_speech_detected: bool = False
@@ -242,6 +426,8 @@ class WSConn:
         self.last_interim_time: float = 0.0
         self.last_interim_conf: float = 0.0
         self.last_tts_send_time: float = 0.0
+        self.speculative_rag = SpeculativeRetrieval()  # Retrieval started before the turn commits
+        self.last_rag_chunks: List[str] = []  # Context of the last retrieval, reused for follow-ups
 
         # Pending action confirmation
         self.pending_action: Optional[dict] = None
@@ -269,6 +455,8 @@ class ConnectionManager:
     async def disconnect(self, call_sid: str):
         conn = self._conns.pop(call_sid, None)
         if conn:
+            conn.playback.clear()
+
             if conn.deepgram_live:
                 try:
                     conn.deepgram_live.finish()
@@ -317,10 +505,79 @@ class ConnectionManager:
         except Exception as e:
             return False
 
+    async def send_mark(self, call_sid: str) -> bool:
+        """Send a mark after the audio sent so far; PlaybackTracker resolves it on echo"""
+        conn = self.get(call_sid)
+        if not conn or not conn.ws or not conn.stream_ready or not conn.stream_sid:
+            return False
+
+        name = conn.playback.add_mark()
+        try:
+            await conn.ws.send_json({
+                "event": "mark",
+                "streamSid": conn.stream_sid,
+                "mark": {"name": name}
+            })
+            return True
+        except Exception:
+            conn.playback.on_mark(name)
+            return False
+
+    async def send_clear(self, call_sid: str, barge_in_at: Optional[float] = None):
+        """Drop audio buffered at Twilio"""
+        conn = self.get(call_sid)
+        if not conn:
+            return
+        conn.playback.clear(barge_in_at)
+        try:
+            if conn.stream_sid:
+                await conn.ws.send_json({
+                    "event": "clear",
+                    "streamSid": conn.stream_sid
+                })
+        except:
+            pass
+
 
 manager = ConnectionManager()
 
 
+async def wait_for_playback(call_sid: str, timeout: float = 30.0) -> bool:
+    """
+    Wait until everything queued for TTS has been synthesized, sent and heard
+    by the caller (all marks echoed). Returns False on timeout.
+    """
+    conn = manager.get(call_sid)
+    if not conn:
+        return True
+
+    start = time.monotonic()
+    try:
+        await asyncio.wait_for(conn.tts_queue.join(), timeout)
+    except asyncio.TimeoutError:
+        metrics.counter("playback_wait_timeouts", stage="synthesis").inc()
+        _logger.warning("⚠️ TTS queue not drained after %.1fs", timeout)
+        return False
+
+    # Mark echoes normally arrive right after the audio ends; don't hang if they never do
+    mark_timeout = min(timeout - (time.monotonic() - start), conn.playback.remaining_secs() + PLAYBACK_MARK_GRACE_SECS)
+    heard = await conn.playback.wait_idle(max(mark_timeout, 0.0))
+    if not heard:
+        metrics.counter("playback_wait_timeouts", stage="marks").inc()
+        _logger.warning("⚠️ Playback marks not echoed in time, continuing")
+    metrics.histogram("playback_wait_ms").observe((time.monotonic() - start) * 1000)
+    return heard
+
+
+def resolve_tts_voice(conn: WSConn) -> Tuple[str, str]:
+    """Pick the TTS voice for a call: API override, then agent default, then env default"""
+    if conn.custom_voice_id and str(conn.custom_voice_id).strip():
+        return conn.custom_voice_id, "api_override"
+    if conn.agent_config and conn.agent_config.get("voice_id"):
+        return conn.agent_config["voice_id"], "agent_config"
+    return DEEPGRAM_VOICE, "env_default"
+
+
 def calculate_audio_energy(mulaw_bytes: bytes) -> int:
     """Calculate RMS energy of audio chunk"""
     if not mulaw_bytes or len(mulaw_bytes) < 160:
@@ -351,27 +608,40 @@ async def handle_interrupt(call_sid: str):
     if not conn:
         return
 
+    barge_in_at = time.monotonic()
     _logger.info("ðŸ›‘ INTERRUPT - Stopping playback and clearing buffers")
 
     conn.interrupt_requested = True
+    # Stop backend work for audio nobody will hear
+    conn.tts_cancel.set()
+    if conn.generation_cancel is not None:
+        conn.generation_cancel.set()
 
     cleared = 0
+    unspoken = []
     while not conn.tts_queue.empty():
         try:
-            conn.tts_queue.get_nowait()
+            item = conn.tts_queue.get_nowait()
             conn.tts_queue.task_done()
+            if item:
+                unspoken.append(item)
             cleared += 1
         except:
             break
 
-    try:
-        if conn.stream_sid:  # ✅ Validate stream_sid exists
-            await conn.ws.send_json({
-                "event": "clear",
-                "streamSid": conn.stream_sid
-            })
-    except:
-        pass
+    await manager.send_clear(call_sid, barge_in_at)
+    metrics.histogram("barge_in_clear_ms").observe((time.monotonic() - barge_in_at) * 1000)
+
+    # Park the rest of the reply in case this was a cough or "uh-huh"
+    conn.parked_playback = None
+    parked_items = conn.playback.unheard + unspoken
+    if RESUME_AFTER_FALSE_INTERRUPT and parked_items:
+        conn.parked_playback = {
+            "items": parked_items,
+            "heard": conn.playback.cut_text or "",
+            "expires_at": time.monotonic() + FALSE_INTERRUPT_WINDOW_MS / 1000.0
+        }
+        asyncio.create_task(_resume_if_no_speech(call_sid, conn.parked_playback))
 
     old_buffer = conn.stt_transcript_buffer
     conn.stt_transcript_buffer = ""
@@ -389,6 +659,14 @@ async def handle_interrupt(call_sid: str):
     conn.last_interim_text = ""
     conn.last_interim_time = 0.0
     conn.last_interim_conf = 0.0
+    conn.speculative_rag.reset()
+
+    webhook_dispatcher.emit("user.interrupted", conn.agent_id, {
+        "call_sid": call_sid,
+        "agent_id": conn.agent_id,
+        "pending_transcript": old_buffer,
+        "timestamp": dt.utcnow().isoformat()
+    })
 
     _logger.info(
         "âœ… Interrupt handled:\n"
@@ -399,6 +677,113 @@ async def handle_interrupt(call_sid: str):
     )
 
 
+def take_parked_playback(conn: WSConn) -> Optional[Dict]:
+    """Pop the parked reply if it is still within the false-interrupt window"""
+    parked, conn.parked_playback = conn.parked_playback, None
+    if parked and time.monotonic() <= parked["expires_at"]:
+        return parked
+    return None
+
+
+def parked_awaits_answer(conn: WSConn, parked: Dict) -> bool:
+    """
+    True when a short reply may be an answer rather than a backchannel: an
+    action is waiting for confirmation, or the cut-off reply asked a question
+    """
+    if conn.pending_action:
+        return True
+    unheard = " ".join(item.get("text", "") if isinstance(item, dict) else item for item in parked["items"])
+    return any(text.rstrip().endswith("?") for text in (parked.get("heard", ""), unheard))
+
+
+async def resume_parked_playback(call_sid: str, parked: Dict):
+    """Continue an interrupted reply from the cut point instead of regenerating it"""
+    conn = manager.get(call_sid)
+    if not conn:
+        return
+
+    _logger.info("▶️ False interrupt - resuming reply (%d parked items)", len(parked["items"]))
+    metrics.counter("false_interrupts_resumed").inc()
+
+    conn.interrupt_requested = False
+    conn.currently_speaking = True
+    conn.speech_energy_buffer.clear()
+    conn.user_speech_detected = False
+    conn.playback.start_turn()
+
+    for item in parked["items"]:
+        try:
+            await asyncio.wait_for(conn.tts_queue.put(item), timeout=0.5)
+        except Exception:
+            break
+
+    await wait_for_playback(call_sid)
+    conn.currently_speaking = False
+
+    # Extend the truncated assistant turn with what was heard this time
+    history = conn.conversation_history
+    if history and history[-1].get("interrupted"):
+        resumed = conn.playback.cut_text if conn.playback.cut_text is not None else conn.playback.heard_text()
+        history[-1]["assistant"] = f"{history[-1]['assistant']} {resumed}".strip()
+        if conn.playback.cut_text is None:
+            history[-1].pop("interrupted", None)
+
+
+async def _resume_if_no_speech(call_sid: str, parked: Dict):
+    """
+    Resume when the window passes with no real utterance: nothing transcribed
+    (noise, cough, breath) or only a backchannel too short for
+    process_streaming_transcript to pick up.
+    """
+    await asyncio.sleep(FALSE_INTERRUPT_WINDOW_MS / 1000.0)
+    conn = manager.get(call_sid)
+    if not conn or conn.parked_playback is not parked or conn.is_responding:
+        return
+    pending = conn.stt_transcript_buffer.strip() or conn.last_interim_text.strip()
+    if not is_backchannel(pending) or (pending and parked_awaits_answer(conn, parked)):
+        return  # process_streaming_transcript handles the utterance once it is final
+    conn.parked_playback = None
+    conn.stt_transcript_buffer = ""
+    conn.stt_is_final = False
+    conn.last_interim_text = ""
+    await resume_parked_playback(call_sid, parked)
+
+
+async def _play_parked_audio(call_sid: str, conn: WSConn, item: Dict) -> bool:
+    """Re-send already synthesized frames kept from an interrupted sentence"""
+    conn.playback.begin_segment(item["text"])
+    conn.currently_speaking = True
+    for frame in item["audio"]:
+        if conn.interrupt_requested:
+            return False
+        if not await manager.send_media_chunk(call_sid, conn.stream_sid, frame):
+            return False
+        conn.playback.on_audio_sent(frame)
+        await asyncio.sleep(0.018)
+    await manager.send_mark(call_sid)
+    return True
+
+
+async def _until_cancelled(chunks, cancel: asyncio.Event):
+    """Iterate an async stream until `cancel` is set, abandoning a pending read immediately"""
+    cancel_wait = asyncio.ensure_future(cancel.wait())
+    iterator = chunks.__aiter__()
+    try:
+        while True:
+            next_chunk = asyncio.ensure_future(iterator.__anext__())
+            done, _ = await asyncio.wait({next_chunk, cancel_wait}, return_when=asyncio.FIRST_COMPLETED)
+            if next_chunk not in done:
+                next_chunk.cancel()
+                return
+            try:
+                chunk = next_chunk.result()
+            except StopAsyncIteration:
+                return
+            yield chunk
+    finally:
+        cancel_wait.cancel()
+
+
 async def stream_tts_worker(call_sid: str):
     """âš¡ OPTIMIZED TTS - Fast first response + smooth playback + no clicks"""
     conn = manager.get(call_sid)
@@ -417,9 +802,16 @@ async def stream_tts_worker(call_sid: str):
                 conn.tts_queue.task_done()
                 break
 
-            conn.tts_queue.task_done()
+            # task_done() is called once the sentence has been sent, so
+            # tts_queue.join() means "all queued audio is at Twilio"
+            if isinstance(text, dict):
+                # Parked audio from a false interrupt: no synthesis needed
+                await _play_parked_audio(call_sid, conn, text)
+                conn.tts_queue.task_done()
+                continue
 
             if not text or not text.strip():
+                conn.tts_queue.task_done()
                 continue
 
             if conn.interrupt_requested:
@@ -432,13 +824,16 @@ async def stream_tts_worker(call_sid: str):
                         break
                 conn.currently_speaking = False
                 conn.interrupt_requested = False
+                conn.tts_queue.task_done()
                 # persistent_resampler_state = None
-                break
+                continue
 
             _logger.info("ðŸŽ¤ TTS sentence (%d chars): '%s...'",
                          len(text), text[:80])
 
             t_start = time.time()
+            conn.tts_cancel.clear()
+            conn.playback.begin_segment(text)
             conn.currently_speaking = True
             conn.speech_energy_buffer.clear()
             conn.speech_start_time = None
@@ -454,19 +849,11 @@ async def stream_tts_worker(call_sid: str):
                 payload = {"text": text}
                 
                 # ✨ Use custom voice if provided, otherwise agent default, otherwise env default
-                voice_to_use = DEEPGRAM_VOICE  # Default from env
-                voice_source = "env_default"
-                
                 # 🔍 DEBUG: Log raw values for debugging
                 _logger.debug(f"🔍 TTS Voice Debug - conn.custom_voice_id: '{conn.custom_voice_id}'")
                 _logger.debug(f"🔍 TTS Voice Debug - conn.agent_config: {conn.agent_config}")
                 
-                if conn.custom_voice_id and str(conn.custom_voice_id).strip():
-                    voice_to_use = conn.custom_voice_id
-                    voice_source = "api_override"
-                elif conn.agent_config and conn.agent_config.get("voice_id"):
-                    voice_to_use = conn.agent_config["voice_id"]
-                    voice_source = "agent_config"
+                voice_to_use, voice_source = resolve_tts_voice(conn)
                 
                 # Log voice selection for EVERY sentence (to debug first message issue)
                 _logger.info(f"🎤 TTS Voice: {voice_to_use} (source: {voice_source}) for text: '{text[:50]}...'")
@@ -485,7 +872,7 @@ async def stream_tts_worker(call_sid: str):
                                              headers=headers, params=params) as response:
                         response.raise_for_status()
 
-                        async for audio_chunk in response.aiter_bytes(chunk_size=3200):
+                        async for audio_chunk in _until_cancelled(response.aiter_bytes(chunk_size=3200), conn.tts_cancel):
                             if conn.interrupt_requested:
                                 _logger.info(
                                     "ðŸ›' TTS interrupted at chunk %d", chunk_count)
@@ -551,6 +938,7 @@ async def stream_tts_worker(call_sid: str):
                                         if not success:
                                             interrupted = True
                                             break
+                                        conn.playback.on_audio_sent(chunk_to_send)
                                         await asyncio.sleep(0.018)
 
                                         conn.last_tts_send_time = time.time()
@@ -605,6 +993,7 @@ async def stream_tts_worker(call_sid: str):
                             if not success:
                                 interrupted = True
                                 break
+                            conn.playback.on_audio_sent(chunk_to_send)
 
                             conn.last_tts_send_time = time.time()
                             chunk_count += 1
@@ -618,8 +1007,14 @@ async def stream_tts_worker(call_sid: str):
 
                 t_end = time.time()
 
+                if conn.tts_cancel.is_set():
+                    interrupted = True
+                    metrics.counter("tts_synthesis_cancelled").inc()
+
                 if interrupted:
-                    await handle_interrupt(call_sid)
+                    # Barge-in already ran handle_interrupt; only a failed send lands here otherwise
+                    if not conn.tts_cancel.is_set():
+                        await handle_interrupt(call_sid)
                     # Keep resampler state - don't reset on interrupt
                     while not conn.tts_queue.empty():
                         try:
@@ -628,6 +1023,7 @@ async def stream_tts_worker(call_sid: str):
                         except:
                             break
                 else:
+                    await manager.send_mark(call_sid)
                     _logger.info("âœ… Sentence completed in %.0fms (%d chunks, %.1f chars/sec)",
                                  (t_end - t_start)*1000, chunk_count,
                                  len(text) / (t_end - t_start) if (t_end - t_start) > 0 else 0)
@@ -646,6 +1042,8 @@ async def stream_tts_worker(call_sid: str):
                 conn.user_speech_detected = False
                 # Keep resampler for next turn
 
+            conn.tts_queue.task_done()
+
     except asyncio.CancelledError:
         pass
     except Exception as e:
@@ -669,25 +1067,20 @@ async def speak_text_streaming(call_sid: str, text: str):
     
     _logger.info(f"🎤 Starting TTS playback - interrupt detection ENABLED")
 
-    try:
-        if conn.stream_sid:  # ✅ Validate stream_sid exists
-            await conn.ws.send_json({
-                "event": "clear",
-                "streamSid": conn.stream_sid
-            })
-    except:
-        pass
+    await manager.send_clear(call_sid)
+    conn.playback.start_turn()
 
-    # âœ… Split into sentences for queue
+    # âœ… Split into normalized sentences for queue (merge very short ones)
+    voice_id, _ = resolve_tts_voice(conn)
     sentences = []
     current = ""
-    for char in text:
-        current += char
-        if char in '.!?' and len(current.strip()) > 10:
-            sentences.append(current.strip())
+    for sentence in split_sentences(text, voice_id):
+        current = f"{current} {sentence}".strip()
+        if len(current) > 10:
+            sentences.append(current)
             current = ""
-    if current.strip():
-        sentences.append(current.strip())
+    if current:
+        sentences.append(current)
 
     # Queue all sentences (worker will batch them automatically)
     for sentence in sentences:
@@ -699,7 +1092,7 @@ async def speak_text_streaming(call_sid: str, text: str):
             except Exception as e:
                 break
 
-    await conn.tts_queue.join()
+    await wait_for_playback(call_sid)
     conn.currently_speaking = False
 
 
@@ -731,6 +1124,14 @@ async def setup_streaming_stt(call_sid: str):
                 # âœ… Always update speech time when we receive text
                 conn.last_speech_time = now
 
+                webhook_dispatcher.emit("transcript.partial", conn.agent_id, {
+                    "call_sid": call_sid,
+                    "text": transcript,
+                    "is_final": bool(is_final),
+                    "confidence": getattr(alt, "confidence", None),
+                    "timestamp": dt.utcnow().isoformat()
+                })
+
                 if is_final:
                     # ========================================
                     # âœ… FINAL RESULT - ALWAYS ACCUMULATE
@@ -759,6 +1160,9 @@ async def setup_streaming_stt(call_sid: str):
                     _logger.info(
                         f"ðŸ“ Complete buffer: '{conn.stt_transcript_buffer.strip()}'")
 
+                    if RAG_SPECULATIVE:
+                        conn.speculative_rag.update(conn.stt_transcript_buffer, conn.agent_id, is_final=True)
+
                 else:
                     # ========================================
                     # âœ… INTERIM RESULT - TRACK BUT DON'T OVERWRITE
@@ -767,6 +1171,11 @@ async def setup_streaming_stt(call_sid: str):
                     # Track interim time for activity detection
                     conn.last_interim_time = now
                     conn.last_interim_text = transcript
+
+                    # Warm retrieval with what the caller has said so far
+                    if RAG_SPECULATIVE:
+                        conn.speculative_rag.update(
+                            f"{conn.stt_transcript_buffer.strip()} {transcript}", conn.agent_id)
                     return 
                     # Only use interim if we have no FINAL content yet
                     # if not conn.stt_transcript_buffer or not conn.stt_is_final:
@@ -0,0 +1,471 @@
+"""
+Webhook Delivery Module
+
+Durable, non-blocking webhook fan-out. Emitted events go on an in-memory
+queue; a writer thread inserts them into the webhook_deliveries outbox
+table, so callers never wait on the database. Background workers deliver
+the rows over a shared HTTP client, with bounded concurrency per destination
+host and exponential backoff retries (4xx responses other than 408/429 fail
+at once). A saturated host's deliveries wait aside without holding a worker,
+so one slow endpoint cannot starve the others. Undelivered rows are picked
+up again after a restart.
+
+Destinations are resolved from an in-memory subscription index, so emitting
+per-turn events costs no database query; high-rate events are combined into
+periodic batch payloads.
+"""
+
+import asyncio
+import queue
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime as dt, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+from sqlalchemy import func
+
+import metrics
+from models import WebhookConfig, WebhookDelivery, SessionLocal
+from utils import (
+    _logger, WEBHOOK_EVENTS, WEBHOOK_WORKERS, WEBHOOK_MAX_PER_DESTINATION, WEBHOOK_TIMEOUT_SECS,
+    WEBHOOK_MAX_ATTEMPTS, WEBHOOK_RETRY_BASE_SECS, WEBHOOK_RETRY_MAX_SECS,
+    WEBHOOK_RETENTION_HOURS, WEBHOOK_BATCHED_EVENTS, WEBHOOK_BATCH_INTERVAL_MS,
+    WEBHOOK_BATCH_MAX_EVENTS
+)
+
+_POLL_INTERVAL_SECS = 1.0
+_BATCH_SIZE = 100
+_PRUNE_INTERVAL_SECS = 3600
+
+_STOP = object()
+
+
+def retry_delay(attempts: int) -> float:
+    """Backoff before the next attempt: base * 2^(attempts-1), capped, with ±20% jitter"""
+    delay = min(WEBHOOK_RETRY_BASE_SECS * (2 ** max(attempts - 1, 0)), WEBHOOK_RETRY_MAX_SECS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class SubscriptionIndex:
+    """
+    (agent_id, event) -> destination URLs for active webhooks. Global webhooks
+    are stored under agent_id None; a webhook with no events gets all of them.
+    Built when the dispatcher starts and rebuilt after webhooks are created or
+    deleted; the emit path only reads it.
+    """
+
+    def __init__(self):
+        self._index: Dict[Tuple[Optional[str], str], Tuple[str, ...]] = {}
+
+    def rebuild(self):
+        db = SessionLocal()
+        try:
+            rows = db.query(WebhookConfig).filter(WebhookConfig.is_active == True).all()
+            index: Dict[Tuple[Optional[str], str], Tuple[str, ...]] = {}
+            for w in rows:
+                for event in (w.events or WEBHOOK_EVENTS):
+                    key = (w.agent_id, event)
+                    if w.webhook_url not in index.get(key, ()):
+                        index[key] = index.get(key, ()) + (w.webhook_url,)
+        finally:
+            db.close()
+
+        # Readers never lock; they see the old or the new index, never a partial one
+        self._index = index
+        _logger.info(f"📇 Webhook subscription index rebuilt: {len(rows)} webhooks, {len(index)} routes")
+
+    def destinations(self, agent_id: Optional[str], event: str) -> Tuple[str, ...]:
+        index = self._index
+        scoped = index.get((agent_id, event), ()) if agent_id else ()
+        shared = index.get((None, event), ())
+        if not scoped:
+            return shared
+        if not shared:
+            return scoped
+        return tuple(dict.fromkeys(scoped + shared))
+
+
+class WebhookDispatcher:
+    """Outbox poller + worker pool; one instance per process (`webhook_dispatcher`)"""
+
+    def __init__(self):
+        self.subscriptions = SubscriptionIndex()
+        self._batches: Dict[Tuple[str, str], List[Dict]] = {}
+        self._batch_lock = threading.Lock()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._in_flight: Dict[str, int] = {}  # host -> deliveries running (event loop only)
+        self._parked: Dict[str, deque] = {}  # host -> items waiting for a free slot on that host
+        self._last_prune = 0.0
+        self._outbox: "queue.Queue" = queue.Queue()  # (url, event, data, emitted_at) awaiting the writer thread
+        self._writer: Optional[threading.Thread] = None
+
+    # ---------- producer side ----------
+
+    def emit(self, event: str, agent_id: Optional[str], data: Dict) -> int:
+        """
+        Send an event to every webhook subscribed to it (for this agent or
+        globally). Returns the number of destinations. Safe to call from any
+        thread and never touches the database; costs two dict lookups when
+        nobody is subscribed.
+        """
+        urls = self.subscriptions.destinations(agent_id, event)
+        if not urls:
+            return 0
+
+        if event in WEBHOOK_BATCHED_EVENTS:
+            full = []
+            with self._batch_lock:
+                for url in urls:
+                    items = self._batches.setdefault((url, event), [])
+                    items.append(data)
+                    if len(items) >= WEBHOOK_BATCH_MAX_EVENTS:
+                        full.append((url, self._batches.pop((url, event))))
+            for url, items in full:
+                self._submit(url, event, self._batch_payload(items))
+            return len(urls)
+
+        for url in urls:
+            self._submit(url, event, data)
+        return len(urls)
+
+    def _submit(self, webhook_url: str, event: str, data: Dict):
+        """Hand an event to the outbox writer thread"""
+        self._outbox.put((webhook_url, event, data, dt.utcnow()))
+
+    @staticmethod
+    def _batch_payload(items: List[Dict]) -> Dict:
+        return {"batch": True, "count": len(items), "events": items}
+
+    def _take_batches(self) -> List[Tuple[str, str, List[Dict]]]:
+        with self._batch_lock:
+            batches, self._batches = self._batches, {}
+        return [(url, event, items) for (url, event), items in batches.items() if items]
+
+    def _flush_batches(self):
+        for url, event, items in self._take_batches():
+            self._submit(url, event, self._batch_payload(items))
+
+    def enqueue(self, webhook_url: str, event: str, data: Dict) -> Optional[int]:
+        """Persist an event for delivery now and wake the workers (blocking; not for the event loop)"""
+        ids = self._insert([(webhook_url, event, data, dt.utcnow())])
+        return ids[0] if ids else None
+
+    def _insert(self, items: List[Tuple[str, str, Dict, dt]]) -> List[int]:
+        """Write emitted events to the outbox in one transaction"""
+        rows = []
+        for webhook_url, event, data, emitted_at in items:
+            if not webhook_url.startswith(("http://", "https://")):
+                _logger.error(f"❌ Invalid webhook URL: {webhook_url}")
+                continue
+            rows.append(WebhookDelivery(
+                webhook_url=webhook_url,
+                event=event,
+                payload={"event": event, "timestamp": emitted_at.isoformat(), "data": data},
+                status="pending",
+                next_attempt_at=emitted_at,
+                created_at=emitted_at
+            ))
+        if not rows:
+            return []
+
+        db = SessionLocal()
+        try:
+            db.add_all(rows)
+            db.commit()
+            ids = [row.id for row in rows]
+        except Exception as e:
+            _logger.error(f"❌ Failed to queue {len(rows)} webhook events: {e}")
+            db.rollback()
+            return []
+        finally:
+            db.close()
+
+        for row in rows:
+            metrics.counter("webhook_enqueued", event=row.event).inc()
+        self._notify()
+        return ids
+
+    def _writer_loop(self):
+        """Drain the in-memory queue into the outbox, up to _BATCH_SIZE rows per commit"""
+        stopping = False
+        while not stopping:
+            item = self._outbox.get()
+            if item is _STOP:
+                break
+            items = [item]
+            while len(items) < _BATCH_SIZE:
+                try:
+                    item = self._outbox.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                items.append(item)
+            self._insert(items)
+
+    def _notify(self):
+        if self._loop is None or self._wake is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wake.set()
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # ---------- lifecycle ----------
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        await asyncio.to_thread(self.subscriptions.rebuild)
+        self._writer = threading.Thread(target=self._writer_loop, name="webhook-outbox", daemon=True)
+        self._writer.start()
+        self._queue = asyncio.Queue()
+        self._wake = asyncio.Event()
+        self._client = httpx.AsyncClient(
+            timeout=WEBHOOK_TIMEOUT_SECS,
+            limits=httpx.Limits(max_connections=WEBHOOK_WORKERS * 4, max_keepalive_connections=WEBHOOK_WORKERS * 2)
+        )
+
+        recovered = await asyncio.to_thread(self._recover_in_flight)
+        if recovered:
+            _logger.info(f"📬 Re-queued {recovered} webhook deliveries interrupted by shutdown")
+
+        self._tasks = [asyncio.create_task(self._poll_loop()), asyncio.create_task(self._batch_loop())]
+        self._tasks += [asyncio.create_task(self._worker(i)) for i in range(WEBHOOK_WORKERS)]
+        _logger.info(f"📬 Webhook dispatcher started ({WEBHOOK_WORKERS} workers)")
+
+    async def stop(self):
+        # Persist buffered batch events and queued emits so they are delivered after restart
+        self._flush_batches()
+        if self._writer is not None:
+            self._outbox.put(_STOP)
+            await asyncio.to_thread(self._writer.join)
+            self._writer = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        # Anything claimed but not finished goes back to pending on next start
+        self._loop = None
+
+    # ---------- outbox access (run in a thread, off the event loop) ----------
+
+    @staticmethod
+    def _recover_in_flight() -> int:
+        db = SessionLocal()
+        try:
+            count = db.query(WebhookDelivery).filter(
+                WebhookDelivery.status == "delivering"
+            ).update({"status": "pending"}, synchronize_session=False)
+            db.commit()
+            return count
+        finally:
+            db.close()
+
+    @staticmethod
+    def _claim_due() -> List[Dict]:
+        """Mark due pending rows as delivering and return them"""
+        db = SessionLocal()
+        try:
+            rows = db.query(WebhookDelivery).filter(
+                WebhookDelivery.status == "pending",
+                WebhookDelivery.next_attempt_at <= dt.utcnow()
+            ).order_by(WebhookDelivery.id).limit(_BATCH_SIZE).all()
+
+            claimed = []
+            for row in rows:
+                row.status = "delivering"
+                claimed.append({
+                    "id": row.id,
+                    "webhook_url": row.webhook_url,
+                    "event": row.event,
+                    "payload": row.payload,
+                    "attempts": row.attempts or 0,
+                    "created_at": row.created_at
+                })
+            db.commit()
+            return claimed
+        finally:
+            db.close()
+
+    @staticmethod
+    def _record_result(delivery_id: int, ok: bool, attempts: int, error: Optional[str], permanent: bool = False):
+        db = SessionLocal()
+        try:
+            row = db.query(WebhookDelivery).filter(WebhookDelivery.id == delivery_id).first()
+            if not row:
+                return
+            row.attempts = attempts
+            if ok:
+                row.status = "delivered"
+                row.delivered_at = dt.utcnow()
+                row.last_error = None
+            elif permanent or attempts >= WEBHOOK_MAX_ATTEMPTS:
+                row.status = "failed"
+                row.last_error = error
+            else:
+                row.status = "pending"
+                row.next_attempt_at = dt.utcnow() + timedelta(seconds=retry_delay(attempts))
+                row.last_error = error
+            db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _prune():
+        cutoff = dt.utcnow() - timedelta(hours=WEBHOOK_RETENTION_HOURS)
+        db = SessionLocal()
+        try:
+            db.query(WebhookDelivery).filter(
+                WebhookDelivery.status == "delivered",
+                WebhookDelivery.delivered_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    # ---------- background tasks ----------
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                self._wake.clear()
+                for item in await asyncio.to_thread(self._claim_due):
+                    self._queue.put_nowait(item)
+
+                if time.monotonic() - self._last_prune > _PRUNE_INTERVAL_SECS:
+                    self._last_prune = time.monotonic()
+                    await asyncio.to_thread(self._prune)
+
+                metrics.histogram("webhook_queue_depth", buckets=(0, 1, 5, 10, 50, 100, 500, 1000)).observe(
+                    self._queue.qsize() + sum(len(waiting) for waiting in self._parked.values())
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                _logger.error(f"❌ Webhook outbox poll failed: {e}")
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=_POLL_INTERVAL_SECS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _batch_loop(self):
+        while True:
+            await asyncio.sleep(WEBHOOK_BATCH_INTERVAL_MS / 1000)
+            try:
+                if self._batches:
+                    self._flush_batches()
+            except Exception as e:
+                _logger.error(f"❌ Webhook batch flush failed: {e}")
+
+    async def _worker(self, worker_id: int):
+        while True:
+            item = await self._queue.get()
+            host = urlparse(item["webhook_url"]).netloc
+            try:
+                if self._in_flight.get(host, 0) >= WEBHOOK_MAX_PER_DESTINATION:
+                    # Host saturated: set the item aside instead of holding this worker
+                    self._parked.setdefault(host, deque()).append(item)
+                    continue
+                self._in_flight[host] = self._in_flight.get(host, 0) + 1
+                try:
+                    await self._deliver(item)
+                finally:
+                    self._release(host)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                _logger.error(f"❌ Webhook worker {worker_id} error: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _release(self, host: str):
+        """A delivery to host finished: hand its next waiting item back to the workers"""
+        self._in_flight[host] -= 1
+        if not self._in_flight[host]:
+            del self._in_flight[host]
+        waiting = self._parked.get(host)
+        if waiting:
+            self._queue.put_nowait(waiting.popleft())
+            if not waiting:
+                del self._parked[host]
+
+    async def _deliver(self, item: Dict):
+        event = item["event"]
+        url = item["webhook_url"]
+        attempts = item["attempts"] + 1
+        error = None
+        ok = False
+
+        permanent = False
+
+        start = time.perf_counter()
+        try:
+            response = await self._client.post(url, json=item["payload"])
+            ok = 200 <= response.status_code < 300
+            if not ok:
+                error = f"HTTP {response.status_code}"
+                # The receiver rejected the request itself; retrying would get the same answer
+                permanent = 400 <= response.status_code < 500 and response.status_code not in (408, 429)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        metrics.histogram("webhook_attempt_ms", event=event).observe((time.perf_counter() - start) * 1000)
+
+        await asyncio.to_thread(self._record_result, item["id"], ok, attempts, error, permanent)
+
+        if ok:
+            lag_ms = (dt.utcnow() - item["created_at"]).total_seconds() * 1000
+            metrics.histogram("webhook_delivery_lag_ms", event=event).observe(lag_ms)
+            metrics.counter("webhook_delivered", event=event).inc()
+            _logger.info(f"📤 Webhook sent: {event} to {url} (attempt {attempts}, lag {lag_ms:.0f}ms)")
+        elif permanent or attempts >= WEBHOOK_MAX_ATTEMPTS:
+            metrics.counter("webhook_failed", event=event).inc()
+            _logger.error(f"❌ Webhook gave up: {event} to {url} after {attempts} attempts - {error}")
+        else:
+            metrics.counter("webhook_retried", event=event).inc()
+            _logger.warning(f"⚠️ Webhook attempt {attempts} failed: {event} to {url} - {error}, will retry")
+
+    # ---------- reporting ----------
+
+    def status(self) -> Dict:
+        db = SessionLocal()
+        try:
+            counts = dict(
+                db.query(WebhookDelivery.status, func.count(WebhookDelivery.id))
+                .group_by(WebhookDelivery.status).all()
+            )
+            oldest = db.query(func.min(WebhookDelivery.created_at)).filter(
+                WebhookDelivery.status.in_(("pending", "delivering"))
+            ).scalar()
+        finally:
+            db.close()
+
+        return {
+            "running": bool(self._tasks),
+            "workers": WEBHOOK_WORKERS,
+            "queued_in_memory": (self._queue.qsize() if self._queue else 0)
+                                + sum(len(waiting) for waiting in self._parked.values()),
+            "by_status": counts,
+            "oldest_undelivered_age_secs": (dt.utcnow() - oldest).total_seconds() if oldest else None
+        }
+
+
+webhook_dispatcher = WebhookDispatcher()